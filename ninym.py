@@ -1,9 +1,11 @@
 import ollama
 import sys
 import os
-import re
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ninym", "prompt"))
+from text_cleaning import clean_text_for_tts
+
 
 class Colors:
     def __init__(self):
@@ -31,33 +33,8 @@ def clean_string(text):
     # Translation table for specific characters
     trans_table = str.maketrans('', '', '?!–\'\n:-')
 
-    
-    # Remove specific characters
-    text = text.translate(trans_table)
-    
-    # Remove emojis using regex
-    emoji_pattern = re.compile("["
-        u"\U0001F600-\U0001F64F"  # emoticons
-        u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-        u"\U0001F680-\U0001F6FF"  # transport & map symbols
-        u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
-        u"\U00002500-\U00002BEF"  # Chinese/Japanese/Korean characters
-        u"\U00002702-\U000027B0"
-        u"\U00002702-\U000027B0"
-        u"\U000024C2-\U0001F251"
-        u"\U0001f926-\U0001f937"
-        u"\U00010000-\U0010ffff"
-        u"\u2640-\u2642" 
-        u"\u2600-\u2B55"
-        u"\u200d"
-        u"\u23cf"
-        u"\u23e9"
-        u"\u231a"
-        u"\ufe0f"  # dingbats
-        u"\u3030"
-                           "]+", flags=re.UNICODE)
-    
-    return emoji_pattern.sub(r'', text)
+    # Strip markdown and emojis, then remove specific characters
+    return clean_text_for_tts(text).translate(trans_table)
 
 
 def main():
@@ -0,0 +1,86 @@
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable
+
+
+class ExecutorSaturated(Exception):
+    pass
+
+
+class Admission:
+    """
+    One request's place in a BoundedExecutor, held until it is released.
+    Releasing is idempotent, so a request can release from every path that
+    may end it.
+    """
+
+    def __init__(self, release: Callable[[], None]):
+        self._release = release
+
+    def release(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __enter__(self) -> "Admission":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class BoundedExecutor(Executor):
+    """
+    A thread pool that admits at most `max_pending` requests at a time.
+
+    Requests take a slot with admit() before submitting any work and keep it
+    until they finish, however many jobs they submit (a streamed request
+    converts many windows). Once every slot is taken, admit() raises
+    ExecutorSaturated so the server can answer 503 straight away instead of
+    queueing work it will not get to in time. `on_wait` is called with the
+    seconds each job spent queued before a worker picked it up.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_pending: int = 8,
+        thread_name_prefix: str = "",
+        on_wait: Callable[[float], None] | None = None,
+    ):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=thread_name_prefix
+        )
+        self._on_wait = on_wait
+        self._lock = threading.Lock()
+        self._admitted = 0
+
+    @property
+    def admitted(self) -> int:
+        return self._admitted
+
+    def admit(self) -> Admission:
+        with self._lock:
+            if self._admitted >= self.max_pending:
+                raise ExecutorSaturated()
+            self._admitted += 1
+        return Admission(self._leave)
+
+    def _leave(self) -> None:
+        with self._lock:
+            self._admitted -= 1
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        queued_at = time.monotonic()
+
+        def run():
+            if self._on_wait is not None:
+                self._on_wait(time.monotonic() - queued_at)
+            return fn(*args, **kwargs)
+
+        return self._executor.submit(run)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
@@ -1,19 +1,73 @@
+import io
 import os
 import uuid
+from contextlib import asynccontextmanager
 import asyncio
+import logging
+import threading
+import time
 import edge_tts
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from rvc_lite.infer import VoiceConverter
+from rvc_lite.config import Config
+from rvc_lite.index_cache import index_cache
+from rvc_lite.predictors.f0 import warm_up as warm_up_f0
+from rvc_lite.pool import VoiceConverterPool
 import torch
+from audio_cache import AudioCache, iter_chunks
+from executor import Admission, BoundedExecutor, ExecutorSaturated
+from disconnect import ClientDisconnected, run_until_disconnected, until_disconnected
+from streaming import (
+    Crossfader,
+    WindowSplitter,
+    decode_mp3_stream,
+    streaming_wav_header,
+    to_pcm16,
+    wav_bytes,
+)
+import metrics
 
-app = FastAPI(title="TTS + RVC API")
+logging.basicConfig(
+    level=os.environ.get("NINYM_LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger("ninym.edge_tts")
 
-# Initialize VoiceConverter
-# We'll load the model lazily or at startup. For this bare stripped version, 
-# we'll provide a way to specify paths.
-v_converter = VoiceConverter()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Every worker loads its indexes and F0 predictors before taking traffic,
+    # rather than while the module is imported
+    await asyncio.to_thread(warm_up)
+    yield
+    rvc_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="TTS + RVC API", lifespan=lifespan)
+app.include_router(metrics.router)
+
+# One converter per voice model, so mixed-voice traffic does not reload
+# weights on every switch
+voice_pool = VoiceConverterPool(
+    max_models=int(os.environ.get("NINYM_RVC_MAX_MODELS", "4")),
+    memory_budget=int(os.environ.get("NINYM_RVC_MODEL_BUDGET_MB", "2048")) * 1024 * 1024,
+)
+metrics.on_scrape(lambda: metrics.observe_voice_pool(voice_pool.stats()))
+
+# Conversions run off the event loop. Each model converts one request at a
+# time, so more than one worker only helps traffic that mixes voices.
+# Requests past NINYM_RVC_MAX_PENDING get a 503 instead of an ever longer
+# wait behind the conversions already queued.
+RVC_WORKERS = int(os.environ.get("NINYM_RVC_WORKERS", "1"))
+RVC_MAX_PENDING = int(os.environ.get("NINYM_RVC_MAX_PENDING", "8"))
+rvc_executor = BoundedExecutor(
+    max_workers=RVC_WORKERS,
+    max_pending=RVC_MAX_PENDING,
+    thread_name_prefix="rvc",
+    on_wait=metrics.rvc_queue_wait.observe,
+)
+metrics.on_scrape(lambda: metrics.rvc_admitted.set(rvc_executor.admitted))
 
 
 # Hardcoded model paths
@@ -21,6 +75,60 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_PTH = os.path.join(BASE_DIR, "models", "emilia", "Emilia_e600_s10200.pth")
 DEFAULT_INDEX = os.path.join(BASE_DIR, "models", "emilia", "added_IVF812_Flat_nprobe_1_Emilia_v2.index")
 
+# Set NINYM_AUDIO_CACHE_DIR to an empty string to disable the output cache
+AUDIO_CACHE_DIR = os.environ.get(
+    "NINYM_AUDIO_CACHE_DIR", os.path.join(BASE_DIR, "output", "cache")
+)
+audio_cache = (
+    AudioCache(
+        AUDIO_CACHE_DIR,
+        memory_bytes=int(os.environ.get("NINYM_AUDIO_CACHE_MB", "64")) * 1024 * 1024,
+        disk_bytes=int(os.environ.get("NINYM_AUDIO_CACHE_DISK_MB", "1024")) * 1024 * 1024,
+    )
+    if AUDIO_CACHE_DIR
+    else None
+)
+if audio_cache is not None:
+    metrics.on_scrape(lambda: metrics.observe_audio_cache(audio_cache.stats()))
+
+# FAISS indexes and their feature matrices stay loaded across requests. The
+# matrices are also written to NINYM_INDEX_CACHE_DIR and memory-mapped from
+# there (set it to an empty string to keep them in memory only).
+index_cache.configure(
+    budget_bytes=int(os.environ.get("NINYM_INDEX_CACHE_MB", "1024")) * 1024 * 1024,
+    directory=os.environ.get("NINYM_INDEX_CACHE_DIR", os.path.join(BASE_DIR, "output", "index_cache")),
+)
+metrics.on_scrape(lambda: metrics.observe_index_cache(index_cache.stats()))
+PRELOAD_INDEXES = [
+    index_path
+    for index_path in os.environ.get("NINYM_RVC_PRELOAD_INDEXES", DEFAULT_INDEX).split(",")
+    if index_path
+]
+
+# F0 predictors are loaded once per device and shared by every conversion.
+# The methods in NINYM_RVC_WARMUP_F0 are loaded and run once at startup; the
+# rest, or all of them if it is empty, load on first use.
+F0_WARMUP = [method for method in os.environ.get("NINYM_RVC_WARMUP_F0", "rmvpe").split(",") if method]
+
+
+def warm_up() -> None:
+    for index_path in PRELOAD_INDEXES:
+        try:
+            index_cache.preload(index_path)
+        except Exception:
+            logger.warning("Could not preload FAISS index %s", index_path, exc_info=True)
+    try:
+        warm_up_f0(F0_WARMUP, Config().device)
+    except Exception:
+        logger.warning("Could not warm up F0 predictors %s", F0_WARMUP, exc_info=True)
+
+# Streaming mode converts the speech in windows of this many seconds, cut at
+# pauses where possible, and crossfades them over the overlap
+STREAM_MIN_WINDOW = float(os.environ.get("NINYM_RVC_MIN_WINDOW", "0.6"))
+STREAM_MAX_WINDOW = float(os.environ.get("NINYM_RVC_MAX_WINDOW", "2.0"))
+STREAM_OVERLAP = float(os.environ.get("NINYM_RVC_OVERLAP", "0.1"))
+RVC_SAMPLE_RATE = 16000
+
 
 class TTSRequest(BaseModel):
     text: str
@@ -33,47 +141,260 @@ class TTSRequest(BaseModel):
     volume_envelope: float = 1.0
     protect: float = 0.33
     f0_method: str = "rmvpe"
+    stream: bool = False  # Stream converted audio window by window
+
+
+def file_mtime(path: str) -> float | None:
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def request_cache_key(request: TTSRequest) -> str:
+    # Retrained models and rebuilt indexes keep their paths, so their mtimes
+    # are part of the key
+    return audio_cache.key(
+        request.text,
+        request.voice,
+        model_mtime=file_mtime(request.pth_path),
+        index_mtime=file_mtime(request.index_path),
+        **request.model_dump(exclude={"text", "voice", "stream"}),
+    )
+
+
+def admit_rvc(endpoint: str) -> Admission:
+    try:
+        return rvc_executor.admit()
+    except ExecutorSaturated:
+        metrics.rvc_rejected.labels(endpoint=endpoint).inc()
+        raise HTTPException(
+            status_code=503, detail="RVC queue is full", headers={"Retry-After": "1"}
+        )
+
+
+def convert_window(request: TTSRequest, window, cancel_event: threading.Event):
+    with voice_pool.acquire(request.pth_path) as converter:
+        output = converter.convert_array(
+            window,
+            model_path=request.pth_path,
+            index_path=request.index_path,
+            pitch=request.pitch,
+            f0_method=request.f0_method,
+            index_rate=request.index_rate,
+            volume_envelope=request.volume_envelope,
+            protect=request.protect,
+            cancel_event=cancel_event,
+        )
+        return output, converter.tgt_sr
+
+
+def convert_full(request: TTSRequest, mp3, cancel_event: threading.Event):
+    with voice_pool.acquire(request.pth_path) as converter:
+        output = converter.convert_audio(
+            audio_input=mp3,
+            return_array=True,
+            model_path=request.pth_path,
+            index_path=request.index_path,
+            pitch=request.pitch,
+            f0_method=request.f0_method,
+            index_rate=request.index_rate,
+            volume_envelope=request.volume_envelope,
+            protect=request.protect,
+            cancel_event=cancel_event,
+        )
+        return output, converter.tgt_sr
+
+
+async def stream_tts_rvc(
+    request: TTSRequest,
+    http_request: Request,
+    cache_key: str | None,
+    admission: Admission,
+):
+    """
+    Decodes the edge-tts MP3 while it downloads, converts it window by
+    window and streams the crossfaded result as 16-bit WAV. The first audio
+    goes out after one window, however long the text is.
+    """
+    start_time = time.time()
+    loop = asyncio.get_running_loop()
+    cancel_event = threading.Event()
+    splitter = WindowSplitter(
+        sample_rate=RVC_SAMPLE_RATE,
+        min_window=STREAM_MIN_WINDOW,
+        max_window=STREAM_MAX_WINDOW,
+        overlap=STREAM_OVERLAP,
+    )
+    crossfader = None
+    sample_rate = None
+    pcm = []
+
+    rates = f"+{request.rate}%" if request.rate >= 0 else f"{request.rate}%"
+    communicate = edge_tts.Communicate(request.text, request.voice, rate=rates)
+
+    async def mp3_chunks():
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+    async def convert(window, context) -> bytes:
+        nonlocal crossfader, sample_rate
+        output, tgt_sr = await loop.run_in_executor(
+            rvc_executor, convert_window, request, window, cancel_event
+        )
+        header = b""
+        if crossfader is None:
+            sample_rate = tgt_sr
+            crossfader = Crossfader(round(splitter.overlap_samples * tgt_sr / RVC_SAMPLE_RATE))
+            metrics.time_to_first_audio.labels(endpoint="tts-rvc-stream").observe(
+                time.time() - start_time
+            )
+            header = streaming_wav_header(tgt_sr)
+        data = to_pcm16(crossfader.push(output, round(context * tgt_sr / RVC_SAMPLE_RATE)))
+        pcm.append(data)
+        return header + data
+
+    async def frames():
+        async for samples in decode_mp3_stream(mp3_chunks(), RVC_SAMPLE_RATE):
+            for window, context in splitter.feed(samples):
+                yield await convert(window, context)
+        for window, context in splitter.flush():
+            yield await convert(window, context)
+        if crossfader is not None:
+            pcm.append(to_pcm16(crossfader.flush()))
+            yield pcm[-1]
+
+    metrics.in_flight.labels(endpoint="tts-rvc-stream").inc()
+    completed = False
+    try:
+        async for data in until_disconnected(http_request, frames()):
+            yield data
+        completed = True
+    except Exception:
+        logger.exception("tts-rvc stream failed")
+        raise
+    finally:
+        cancel_event.set()
+        admission.release()
+        metrics.in_flight.labels(endpoint="tts-rvc-stream").dec()
+
+    if not completed or sample_rate is None:
+        return
+
+    total_time = time.time() - start_time
+    audio = b"".join(pcm)
+    audio_duration = len(audio) / 2 / sample_rate
+    metrics.request_seconds.labels(endpoint="tts-rvc-stream").observe(total_time)
+    if audio_duration > 0:
+        metrics.real_time_factor.observe(total_time / audio_duration)
+
+    if cache_key is not None:
+        await asyncio.to_thread(audio_cache.put, cache_key, wav_bytes(audio, sample_rate))
+
 
 @app.post("/tts-rvc")
-async def tts_rvc_endpoint(request: TTSRequest):
+async def tts_rvc_endpoint(
+    request: TTSRequest, http_request: Request, background_tasks: BackgroundTasks
+):
+    start_time = time.time()
+    metrics.in_flight.labels(endpoint="tts-rvc").inc()
+    admission = None
     try:
-        import io
-        from fastapi.responses import StreamingResponse
+        cache_key = None
+        if audio_cache is not None:
+            cache_key = request_cache_key(request)
+            cached = await asyncio.to_thread(audio_cache.get, cache_key)
+            if cached is not None:
+                metrics.request_seconds.labels(endpoint="tts-rvc").observe(
+                    time.time() - start_time
+                )
+                return StreamingResponse(
+                    iter_chunks(cached),
+                    media_type="audio/wav",
+                    headers={"Content-Disposition": "inline; filename=tts.wav"}
+                )
+
+        if request.stream:
+            stream_admission = admit_rvc("tts-rvc-stream")
+            # The stream gives its slot back when it ends, but if the client
+            # goes away before the body starts its cleanup never runs; the
+            # response's background task releases it either way
+            background_tasks.add_task(stream_admission.release)
+            return StreamingResponse(
+                stream_tts_rvc(request, http_request, cache_key, stream_admission),
+                media_type="audio/wav",
+                headers={"Content-Disposition": "inline; filename=tts.wav"}
+            )
+
+        # Held until the response is ready; full queues are turned away here
+        admission = admit_rvc("tts-rvc")
 
         # 1. TTS Step (In-memory)
         rates = f"+{request.rate}%" if request.rate >= 0 else f"{request.rate}%"
         communicate = edge_tts.Communicate(request.text, request.voice, rate=rates)
         
         tts_buffer = io.BytesIO()
-        async for chunk in communicate.stream():
-            if chunk["type"] == "audio":
-                tts_buffer.write(chunk["data"])
-        
+
+        async def synthesize():
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    tts_buffer.write(chunk["data"])
+
+        await run_until_disconnected(http_request, synthesize())
         tts_buffer.seek(0)
+        tts_done = time.time()
+        metrics.tts_seconds.observe(tts_done - start_time)
 
         # 2. RVC Step (In-memory)
-        output_buffer = v_converter.convert_audio(
-            audio_input=tts_buffer,
-            audio_output_path=None, # Trigger in-memory return
-            model_path=request.pth_path,
-            index_path=request.index_path,
-            pitch=request.pitch,
-            f0_method=request.f0_method,
-            index_rate=request.index_rate,
-            volume_envelope=request.volume_envelope,
-            protect=request.protect,
+        cancel_event = threading.Event()
+        conversion = asyncio.get_running_loop().run_in_executor(
+            rvc_executor, convert_full, request, tts_buffer, cancel_event
+        )
+        try:
+            output, tgt_sr = await run_until_disconnected(http_request, conversion)
+        except ClientDisconnected:
+            # Stops the conversion at its next window
+            cancel_event.set()
+            raise
+        if output is None:
+            raise HTTPException(status_code=500, detail="RVC conversion returned None")
+        rvc_done = time.time()
+        metrics.rvc_seconds.observe(rvc_done - tts_done)
+
+        # The only encode of the response
+        content = wav_bytes(to_pcm16(output), tgt_sr)
+        audio_duration = len(output) / tgt_sr
+        if cache_key is not None:
+            # Written once the response has gone out
+            background_tasks.add_task(audio_cache.put, cache_key, content)
+        total_time = rvc_done - start_time
+        metrics.request_seconds.labels(endpoint="tts-rvc").observe(total_time)
+        metrics.time_to_first_audio.labels(endpoint="tts-rvc").observe(total_time)
+        if audio_duration > 0:
+            metrics.real_time_factor.observe(total_time / audio_duration)
+        logger.debug(
+            "tts-rvc: tts %.3fs, rvc %.3fs, audio %.2fs",
+            tts_done - start_time,
+            rvc_done - tts_done,
+            audio_duration,
         )
 
-        return StreamingResponse(
-            output_buffer,
+        return Response(
+            content=content,
             media_type="audio/wav",
             headers={"Content-Disposition": "inline; filename=tts.wav"}
         )
 
+    except HTTPException:
+        raise
+    except ClientDisconnected:
+        logger.info("tts-rvc client disconnected, conversion cancelled")
+        return Response(status_code=499)
     except Exception as e:
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("tts-rvc request failed")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if admission is not None:
+            admission.release()
+        metrics.in_flight.labels(endpoint="tts-rvc").dec()
 
 if __name__ == "__main__":
     import uvicorn
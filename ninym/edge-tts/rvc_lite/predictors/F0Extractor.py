@@ -1,19 +1,37 @@
 import dataclasses
 import pathlib
+import threading
 import librosa
 import numpy as np
 import resampy
 import torch
 import torchcrepe
 import torchfcpe
-import os
 
-# from tools.anyf0.rmvpe import RMVPE
-from rvc_lite.predictors.RMVPE import RMVPE0Predictor
+from rvc_lite.predictors.f0 import get_predictor
 from rvc_lite.config import Config
 
 config = Config()
 
+# F0Extractor runs FCPE with the weights bundled with torchfcpe, as it always
+# has, rather than the models/predictors/fcpe.pt the conversion pipeline
+# loads, so its contours do not change. Loaded once per device and shared.
+_bundled_fcpe = {}
+_bundled_fcpe_lock = threading.Lock()
+
+
+def bundled_fcpe(device):
+    """
+    Returns the bundled FCPE model for `device` and the lock to hold while
+    it runs.
+    """
+    key = str(device)
+    with _bundled_fcpe_lock:
+        if key not in _bundled_fcpe:
+            model = torchfcpe.spawn_bundled_infer_model(device=device)
+            _bundled_fcpe[key] = (model, threading.Lock())
+        return _bundled_fcpe[key]
+
 
 @dataclasses.dataclass
 class F0Extractor:
@@ -62,26 +80,22 @@ class F0Extractor:
                 .unsqueeze(-1)
                 .to(config.device)
             )
-            model = torchfcpe.spawn_bundled_infer_model(device=config.device)
-
-            f0 = model.infer(
-                audio,
-                sr=self.sample_rate,
-                decoder_mode="local_argmax",
-                threshold=0.006,
-                f0_min=self.f0_min,
-                f0_max=self.f0_max,
-                interp_uv=False,
-                output_interp_target_length=f0_target_length,
-            )
+            model, lock = bundled_fcpe(config.device)
+
+            with lock:
+                f0 = model.infer(
+                    audio,
+                    sr=self.sample_rate,
+                    decoder_mode="local_argmax",
+                    threshold=0.006,
+                    f0_min=self.f0_min,
+                    f0_max=self.f0_max,
+                    interp_uv=False,
+                    output_interp_target_length=f0_target_length,
+                )
             f0 = f0.squeeze().cpu().numpy()
         elif method == "rmvpe":
-            model_rmvpe = RMVPE0Predictor(
-                os.path.join("models", "predictors", "rmvpe.pt"),
-                device=config.device,
-                # hop_length=80
-            )
-            f0 = model_rmvpe.infer_from_audio(self.wav16k, thred=0.03)
+            f0 = get_predictor("rmvpe", config.device).get_f0(self.wav16k, filter_radius=0.03)
 
         else:
             raise ValueError(f"Unknown method: {self.method}")
@@ -1,4 +1,5 @@
 import os
+import threading
 import torch
 
 from rvc_lite.predictors.RMVPE import RMVPE0Predictor
@@ -12,17 +13,24 @@ class RMVPE:
         self.device = device
         self.sample_rate = sample_rate
         self.hop_size = hop_size
+        # The predictor is shared between threads (see get_predictor)
+        self.lock = threading.Lock()
         self.model = RMVPE0Predictor(
             os.path.join("models", "predictors", model_name),
             device=self.device,
         )
 
     def get_f0(self, x, filter_radius=0.03):
-        f0 = self.model.infer_from_audio(x, thred=filter_radius)
+        with self.lock:
+            f0 = self.model.infer_from_audio(x, thred=filter_radius)
         return f0
 
 
 class CREPE:
+    # torchcrepe keeps one global model and moves or reloads it on each
+    # predict call, so every instance, on any device, shares this lock
+    lock = threading.Lock()
+
     def __init__(self, device, sample_rate=16000, hop_size=160):
         self.device = device
         self.sample_rate = sample_rate
@@ -37,17 +45,18 @@ class CREPE:
 
         batch_size = 512
 
-        f0, pd = torchcrepe.predict(
-            x.float().to(self.device).unsqueeze(dim=0),
-            self.sample_rate,
-            self.hop_size,
-            f0_min,
-            f0_max,
-            model=model,
-            batch_size=batch_size,
-            device=self.device,
-            return_periodicity=True,
-        )
+        with self.lock:
+            f0, pd = torchcrepe.predict(
+                x.float().to(self.device).unsqueeze(dim=0),
+                self.sample_rate,
+                self.hop_size,
+                f0_min,
+                f0_max,
+                model=model,
+                batch_size=batch_size,
+                device=self.device,
+                return_periodicity=True,
+            )
         pd = torchcrepe.filter.median(pd, 3)
         f0 = torchcrepe.filter.mean(f0, 3)
         f0[pd < 0.1] = 0
@@ -61,6 +70,7 @@ class FCPE:
         self.device = device
         self.sample_rate = sample_rate
         self.hop_size = hop_size
+        self.lock = threading.Lock()
         self.model = spawn_infer_model_from_pt(
             os.path.join("models", "predictors", "fcpe.pt"),
             self.device,
@@ -74,16 +84,46 @@ class FCPE:
         if not torch.is_tensor(x):
             x = torch.from_numpy(x)
 
-        f0 = (
-            self.model.infer(
-                x.float().to(self.device).unsqueeze(0),
-                sr=self.sample_rate,
-                decoder_mode="local_argmax",
-                threshold=filter_radius,
+        with self.lock:
+            f0 = (
+                self.model.infer(
+                    x.float().to(self.device).unsqueeze(0),
+                    sr=self.sample_rate,
+                    decoder_mode="local_argmax",
+                    threshold=filter_radius,
+                )
+                .squeeze()
+                .cpu()
+                .numpy()
             )
-            .squeeze()
-            .cpu()
-            .numpy()
-        )
 
         return f0
+
+
+PREDICTORS = {"rmvpe": RMVPE, "fcpe": FCPE, "crepe": CREPE}
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_predictor(method, device):
+    """
+    Returns the predictor for `method` ("rmvpe", "fcpe" or "crepe") on
+    `device`, loading it the first time it is asked for. Every Pipeline,
+    F0Extractor and thread in the process shares the same instance.
+    """
+    key = (method, str(device))
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = PREDICTORS[method](device=device)
+        return _shared[key]
+
+
+def warm_up(methods, device, sample_rate=16000):
+    """
+    Loads the given predictors and runs each once on a second of silence, so
+    the first request does not pay for loading weights or CUDA kernels.
+    """
+    silence = np.zeros(sample_rate, dtype=np.float32)
+    for method in methods:
+        get_predictor(method, device).get_f0(silence)
@@ -0,0 +1,210 @@
+import asyncio
+import struct
+from contextlib import suppress
+from typing import AsyncIterator
+
+import numpy as np
+
+# RIFF and data chunk sizes are unknown while streaming; 0xFFFFFFFF is the
+# conventional "until end of stream" value that browsers and ffmpeg accept.
+STREAMING_SIZE = 0xFFFFFFFF
+
+DECODE_READ_SIZE = 16 * 1024
+
+
+def wav_header(
+    sample_rate: int, data_size: int, channels: int = 1, sample_width: int = 2
+) -> bytes:
+    byte_rate = sample_rate * channels * sample_width
+    riff_size = STREAMING_SIZE if data_size == STREAMING_SIZE else 36 + data_size
+    return (
+        b"RIFF"
+        + struct.pack("<I", riff_size)
+        + b"WAVEfmt "
+        + struct.pack(
+            "<IHHIIHH",
+            16,
+            1,  # PCM
+            channels,
+            sample_rate,
+            byte_rate,
+            channels * sample_width,
+            sample_width * 8,
+        )
+        + b"data"
+        + struct.pack("<I", data_size)
+    )
+
+
+def streaming_wav_header(sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    return wav_header(sample_rate, STREAMING_SIZE, channels, sample_width)
+
+
+def to_pcm16(audio: np.ndarray) -> bytes:
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def wav_bytes(pcm: bytes, sample_rate: int) -> bytes:
+    return wav_header(sample_rate, len(pcm)) + pcm
+
+
+async def decode_mp3_stream(
+    chunks: AsyncIterator[bytes], sample_rate: int = 16000
+) -> AsyncIterator[np.ndarray]:
+    """
+    Decodes an MP3 byte stream as it arrives, yielding mono float32 samples
+    at `sample_rate`. ffmpeg does the decoding and resampling in a
+    subprocess, fed and drained concurrently so neither side stalls.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-loglevel", "error",
+        "-f", "mp3",
+        "-i", "pipe:0",
+        "-f", "f32le",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+    )
+
+    async def feed():
+        try:
+            async for chunk in chunks:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        finally:
+            process.stdin.close()
+
+    feeder = asyncio.create_task(feed())
+    remainder = b""
+    try:
+        while True:
+            data = await process.stdout.read(DECODE_READ_SIZE)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % 4
+            remainder = data[usable:]
+            if usable:
+                yield np.frombuffer(data[:usable], dtype="<f4")
+        # Surfaces errors from the TTS stream
+        await feeder
+        if await process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {process.returncode}")
+    finally:
+        feeder.cancel()
+        with suppress(asyncio.CancelledError, Exception):
+            await feeder
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+
+class WindowSplitter:
+    """
+    Cuts a growing stream of samples into windows for RVC.
+
+    A window ends at the quietest frame after `min_window` seconds, as soon
+    as one falls below `silence_db`, or at the quietest frame found once
+    `max_window` seconds are buffered. Each window is returned with up to
+    `overlap` seconds of the audio before it as context; the converted
+    context is what gets crossfaded with the previous window's output.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        min_window: float = 0.6,
+        max_window: float = 2.0,
+        overlap: float = 0.1,
+        silence_db: float = -45.0,
+        frame: float = 0.01,
+    ):
+        self.sample_rate = sample_rate
+        self.min_samples = int(min_window * sample_rate)
+        self.max_samples = int(max_window * sample_rate)
+        self.overlap_samples = int(overlap * sample_rate)
+        self.frame_samples = int(frame * sample_rate)
+        self.silence_rms = 10 ** (silence_db / 20)
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._context = np.zeros(0, dtype=np.float32)
+
+    def feed(self, samples: np.ndarray) -> list[tuple[np.ndarray, int]]:
+        """
+        Returns the completed windows as (samples, context_length) pairs.
+        """
+        self._buffer = np.concatenate([self._buffer, samples])
+        windows = []
+        while len(self._buffer) >= self.min_samples:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            windows.append(self._take(cut))
+        return windows
+
+    def flush(self) -> list[tuple[np.ndarray, int]]:
+        if not len(self._buffer):
+            return []
+        return [self._take(len(self._buffer))]
+
+    def _find_cut(self) -> int | None:
+        search = self._buffer[self.min_samples : self.max_samples]
+        frames = len(search) // self.frame_samples
+        if frames == 0:
+            return self.max_samples if len(self._buffer) >= self.max_samples else None
+
+        energy = np.sqrt(
+            np.mean(
+                search[: frames * self.frame_samples].reshape(frames, self.frame_samples) ** 2,
+                axis=1,
+            )
+        )
+        quietest = int(np.argmin(energy))
+        if energy[quietest] < self.silence_rms or len(self._buffer) >= self.max_samples:
+            # Cut in the middle of the quietest frame
+            return self.min_samples + quietest * self.frame_samples + self.frame_samples // 2
+        return None
+
+    def _take(self, cut: int) -> tuple[np.ndarray, int]:
+        window = self._buffer[:cut]
+        self._buffer = self._buffer[cut:]
+        context = self._context
+        self._context = window[-self.overlap_samples :] if self.overlap_samples else window[:0]
+        return np.concatenate([context, window]), len(context)
+
+
+class Crossfader:
+    """
+    Joins converted windows. The last `overlap_samples` of every output are
+    held back; when the next window arrives, its converted context is
+    blended into them with a linear crossfade (both sides render the same
+    audio, so their gains sum to one), which hides the seams RVC leaves at
+    window edges.
+    """
+
+    def __init__(self, overlap_samples: int):
+        self.overlap_samples = overlap_samples
+        self._tail = np.zeros(0, dtype=np.float32)
+
+    def push(self, audio: np.ndarray, context: int) -> np.ndarray:
+        audio = np.asarray(audio, dtype=np.float32)
+        context = min(context, len(audio))
+        fade = min(len(self._tail), context)
+
+        head = self._tail[: len(self._tail) - fade]
+        ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+        blended = (
+            self._tail[len(self._tail) - fade :] * (1.0 - ramp)
+            + audio[context - fade : context] * ramp
+        )
+
+        body = audio[context:]
+        hold = min(self.overlap_samples, len(body))
+        self._tail = body[len(body) - hold :]
+        return np.concatenate([head, blended, body[: len(body) - hold]])
+
+    def flush(self) -> np.ndarray:
+        tail, self._tail = self._tail, np.zeros(0, dtype=np.float32)
+        return tail
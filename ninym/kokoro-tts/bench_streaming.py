@@ -0,0 +1,131 @@
+"""
+Time to first audio and total latency of /tts-rvc, streamed and buffered.
+
+    python bench_streaming.py
+    python bench_streaming.py --repeat 10 --f0-method rmvpe
+    python bench_streaming.py --url http://127.0.0.1:8801
+
+Run from this directory with the Kokoro and RVC requirements and models
+installed. Unless `--url` is given, the server is started on `--port` with
+the audio cache switched off, so every request runs Kokoro and RVC; an
+existing server needs NINYM_AUDIO_CACHE_DIR="" for the same reason.
+
+Each text is sent `--repeat` times with "stream": false and "stream": true,
+one request at a time after a warm-up request per mode. Time to first audio
+is measured from sending the request to receiving the first PCM bytes after
+the 44-byte WAV header; for the buffered path that is when the whole body
+arrives. Total is the time to the last byte. The median of each is printed,
+along with the seconds of audio returned.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WAV_HEADER_BYTES = 44
+
+TEXTS = {
+    "sentence": "The voice model is loaded and ready to talk.",
+    "paragraph": (
+        "The voice model runs on a small GPU. It streams audio back while the "
+        "reply is still being written, so the listener hears the first words "
+        "early. Every sentence goes through Kokoro first and then through the "
+        "voice conversion model, which gives it the character's voice."
+    ),
+    "long": " ".join(
+        [
+            "Once the first segment is converted it can be played straight away.",
+            "Kokoro keeps generating the next segments on its own thread.",
+            "The conversion model takes them one at a time, in order.",
+            "A buffered request waits for all of them before sending anything.",
+            "That is fine for a short sentence, but a long answer takes a while.",
+            "Streaming turns that wait into the time for a single segment.",
+        ]
+        * 3
+    ),
+}
+
+
+def measure(url: str, body: dict) -> tuple[float, float, float]:
+    """Returns time to first audio, total seconds and seconds of audio."""
+    start = time.perf_counter()
+    first = None
+    header = b""
+    received = 0
+    with requests.post(f"{url}/tts-rvc", json=body, stream=True, timeout=600) as response:
+        response.raise_for_status()
+        for data in response.iter_content(chunk_size=None):
+            if len(header) < WAV_HEADER_BYTES:
+                header += data[: WAV_HEADER_BYTES - len(header)]
+            received += len(data)
+            if first is None and received > WAV_HEADER_BYTES:
+                first = time.perf_counter() - start
+    total = time.perf_counter() - start
+    # 16-bit mono at the voice model's rate, which the header carries
+    sample_rate = int.from_bytes(header[24:28], "little")
+    return first, total, (received - WAV_HEADER_BYTES) / 2 / sample_rate
+
+
+def start_server(port: int, timeout: float) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BASE_DIR,
+        env=dict(os.environ, NINYM_AUDIO_CACHE_DIR="", NINYM_LOG_LEVEL="WARNING"),
+    )
+    deadline = time.monotonic() + timeout
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited during startup with code {server.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/metrics", timeout=1).raise_for_status()
+            return server
+        except requests.RequestException:
+            pass
+        if time.monotonic() > deadline:
+            server.terminate()
+            raise RuntimeError("Timed out waiting for the server to start")
+        time.sleep(0.5)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark streamed and buffered /tts-rvc")
+    parser.add_argument("--url", help="Use a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8811)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pitch", type=int, default=12)
+    parser.add_argument("--f0-method", default="rmvpe")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = start_server(args.port, args.startup_timeout)
+        url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        print(f"{'text':<11}{'mode':<10}{'audio (s)':>10}{'ttfa p50 (ms)':>15}{'total p50 (ms)':>16}")
+        for name, text in TEXTS.items():
+            for stream in (False, True):
+                body = {"text": text, "pitch": args.pitch, "f0_method": args.f0_method, "stream": stream}
+                measure(url, body)
+                runs = [measure(url, body) for _ in range(args.repeat)]
+                print(
+                    f"{name:<11}{'streamed' if stream else 'buffered':<10}{runs[-1][2]:>10.1f}"
+                    f"{statistics.median(r[0] for r in runs) * 1000:>15.0f}"
+                    f"{statistics.median(r[1] for r in runs) * 1000:>16.0f}"
+                )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,129 @@
 import io
 import wave
 import os
+import logging
+import threading
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import numpy as np
-import soundfile as sf
-from fastapi import FastAPI, Query, HTTPException, Response
+from fastapi import BackgroundTasks, FastAPI, Query, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from kokoro import KPipeline
-from rvc_lite.infer import VoiceConverter
+from rvc_lite.config import Config
+from rvc_lite.index_cache import index_cache
+from rvc_lite.predictors.f0 import warm_up as warm_up_f0
+from rvc_lite.pool import VoiceConverterPool
+from rvc_lite.pipeline import ConversionCancelled
+from audio_cache import AudioCache, iter_chunks
+from executor import Admission, BoundedExecutor, ExecutorSaturated
+from disconnect import ClientDisconnected, run_until_disconnected, until_disconnected
+from streaming import streaming_wav_header, to_pcm16, wav_bytes
+import metrics
 
-app = FastAPI(title="Kokoro TTS + RVC API (Compatible)")
+logging.basicConfig(
+    level=os.environ.get("NINYM_LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger("ninym.kokoro_tts")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Every worker loads its indexes and F0 predictors before taking traffic,
+    # rather than while the module is imported
+    await asyncio.to_thread(warm_up)
+    yield
+    rvc_executor.shutdown(wait=False, cancel_futures=True)
+    kokoro_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="Kokoro TTS + RVC API (Compatible)", lifespan=lifespan)
+app.include_router(metrics.router)
 
 # Hardcoded model paths (pointing back to the original models directory)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODELS_DIR = os.path.join(os.path.dirname(BASE_DIR), "ninym", "tts", "models")
 DEFAULT_PTH = os.path.join(MODELS_DIR, "emilia", "Emilia_e600_s10200.pth")
 DEFAULT_INDEX = os.path.join(MODELS_DIR, "emilia", "added_IVF812_Flat_nprobe_1_Emilia_v2.index")
+KOKORO_VOICE = 'af_heart'
+
+# Set NINYM_AUDIO_CACHE_DIR to an empty string to disable the output cache
+AUDIO_CACHE_DIR = os.environ.get("NINYM_AUDIO_CACHE_DIR", os.path.join(BASE_DIR, "audio_cache"))
+audio_cache = (
+    AudioCache(
+        AUDIO_CACHE_DIR,
+        memory_bytes=int(os.environ.get("NINYM_AUDIO_CACHE_MB", "64")) * 1024 * 1024,
+        disk_bytes=int(os.environ.get("NINYM_AUDIO_CACHE_DISK_MB", "1024")) * 1024 * 1024,
+    )
+    if AUDIO_CACHE_DIR
+    else None
+)
+if audio_cache is not None:
+    metrics.on_scrape(lambda: metrics.observe_audio_cache(audio_cache.stats()))
+
+# FAISS indexes and their feature matrices stay loaded across requests. The
+# matrices are also written to NINYM_INDEX_CACHE_DIR and memory-mapped from
+# there (set it to an empty string to keep them in memory only).
+index_cache.configure(
+    budget_bytes=int(os.environ.get("NINYM_INDEX_CACHE_MB", "1024")) * 1024 * 1024,
+    directory=os.environ.get("NINYM_INDEX_CACHE_DIR", os.path.join(BASE_DIR, "index_cache")),
+)
+metrics.on_scrape(lambda: metrics.observe_index_cache(index_cache.stats()))
+PRELOAD_INDEXES = [
+    index_path
+    for index_path in os.environ.get("NINYM_RVC_PRELOAD_INDEXES", DEFAULT_INDEX).split(",")
+    if index_path
+]
+
+# F0 predictors are loaded once per device and shared by every conversion.
+# The methods in NINYM_RVC_WARMUP_F0 are loaded and run once at startup; the
+# rest, or all of them if it is empty, load on first use.
+F0_WARMUP = [method for method in os.environ.get("NINYM_RVC_WARMUP_F0", "rmvpe").split(",") if method]
+
+
+def warm_up() -> None:
+    for index_path in PRELOAD_INDEXES:
+        try:
+            index_cache.preload(index_path)
+        except Exception:
+            logger.warning("Could not preload FAISS index %s", index_path, exc_info=True)
+    try:
+        warm_up_f0(F0_WARMUP, Config().device)
+    except Exception:
+        logger.warning("Could not warm up F0 predictors %s", F0_WARMUP, exc_info=True)
 
 # Initialize Pipelines
 pipeline = KPipeline(lang_code='a')
-v_converter = VoiceConverter()
+# One converter per voice model, so mixed-voice traffic does not reload
+# weights on every switch
+voice_pool = VoiceConverterPool(
+    max_models=int(os.environ.get("NINYM_RVC_MAX_MODELS", "4")),
+    memory_budget=int(os.environ.get("NINYM_RVC_MODEL_BUDGET_MB", "2048")) * 1024 * 1024,
+)
+metrics.on_scrape(lambda: metrics.observe_voice_pool(voice_pool.stats()))
+
+# Kokoro and RVC run off the event loop on their own threads, so RVC can
+# convert one segment while Kokoro generates the next. The Kokoro pipeline
+# is shared, and each voice model converts one request at a time, so more
+# RVC workers only help traffic that mixes voices.
+kokoro_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kokoro")
+
+# Requests past NINYM_RVC_MAX_PENDING get a 503 instead of an ever longer
+# wait behind the conversions already queued
+RVC_WORKERS = int(os.environ.get("NINYM_RVC_WORKERS", "1"))
+RVC_MAX_PENDING = int(os.environ.get("NINYM_RVC_MAX_PENDING", "8"))
+rvc_executor = BoundedExecutor(
+    max_workers=RVC_WORKERS,
+    max_pending=RVC_MAX_PENDING,
+    thread_name_prefix="rvc",
+    on_wait=metrics.rvc_queue_wait.observe,
+)
+metrics.on_scrape(lambda: metrics.rvc_admitted.set(rvc_executor.admitted))
+
+KOKORO_SAMPLE_RATE = 24000
 
 class TTSRequest(BaseModel):
     text: str
@@ -27,74 +131,312 @@ class TTSRequest(BaseModel):
     index_path: str = DEFAULT_INDEX
     pitch: int = 12
     f0_method: str = "rmvpe"
+    stream: bool = False  # Stream converted audio segment by segment
+
+
+def file_mtime(path: str) -> float | None:
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def request_cache_key(request: TTSRequest) -> str:
+    # Retrained models and rebuilt indexes keep their paths, so their mtimes
+    # are part of the key
+    return audio_cache.key(
+        request.text,
+        KOKORO_VOICE,
+        model_mtime=file_mtime(request.pth_path),
+        index_mtime=file_mtime(request.index_path),
+        **request.model_dump(exclude={"text", "stream"}),
+    )
 
 @app.get("/stream")
 @app.post("/stream")
 async def stream_audio(text: str = Query(..., description="Text to convert to speech")):
     """Basic Kokoro Streaming (GET/POST)"""
     def generate_audio():
-        generator = pipeline(text, voice='af_heart', speed=1.0)
-        for i, (gs, ps, audio) in enumerate(generator):
-            audio_int16 = (audio * 32767).astype(np.int16)
-            buffer = io.BytesIO()
-            if i == 0:
-                with wave.open(buffer, 'wb') as wf:
-                    wf.setnchannels(1)
-                    wf.setsampwidth(2)
-                    wf.setframerate(24000)
-                    wf.writeframes(audio_int16.tobytes())
-            else:
-                buffer.write(audio_int16.tobytes())
-            yield buffer.getvalue()
+        start_time = time.time()
+        audio_samples = 0
+        metrics.in_flight.labels(endpoint="stream").inc()
+        try:
+            generator = pipeline(text, voice='af_heart', speed=1.0)
+            for i, (gs, ps, audio) in enumerate(generator):
+                audio_int16 = (audio * 32767).astype(np.int16)
+                buffer = io.BytesIO()
+                if i == 0:
+                    with wave.open(buffer, 'wb') as wf:
+                        wf.setnchannels(1)
+                        wf.setsampwidth(2)
+                        wf.setframerate(24000)
+                        wf.writeframes(audio_int16.tobytes())
+                    metrics.time_to_first_audio.labels(endpoint="stream").observe(
+                        time.time() - start_time
+                    )
+                else:
+                    buffer.write(audio_int16.tobytes())
+                audio_samples += len(audio_int16)
+                logger.debug("Yielding chunk %d (%d samples)", i, len(audio_int16))
+                yield buffer.getvalue()
+
+            total_time = time.time() - start_time
+            metrics.request_seconds.labels(endpoint="stream").observe(total_time)
+            metrics.tts_seconds.observe(total_time)
+            if audio_samples:
+                metrics.real_time_factor.observe(total_time / (audio_samples / 24000))
+        finally:
+            metrics.in_flight.labels(endpoint="stream").dec()
     return StreamingResponse(generate_audio(), media_type="audio/wav")
 
+def synthesize_kokoro(text: str, cancel_event: threading.Event) -> list[np.ndarray]:
+    audio_chunks = []
+    generator = pipeline(text, voice=KOKORO_VOICE, speed=1.0)
+    for gs, ps, audio in generator:
+        if cancel_event.is_set():
+            raise ConversionCancelled()
+        audio_chunks.append(audio)
+    return audio_chunks
+
+
+def admit_rvc(endpoint: str) -> Admission:
+    try:
+        return rvc_executor.admit()
+    except ExecutorSaturated:
+        metrics.rvc_rejected.labels(endpoint=endpoint).inc()
+        raise HTTPException(
+            status_code=503, detail="RVC queue is full", headers={"Retry-After": "1"}
+        )
+
+
+def convert_segment(request: TTSRequest, audio, cancel_event: threading.Event):
+    if cancel_event.is_set():
+        raise ConversionCancelled()
+    with voice_pool.acquire(request.pth_path) as converter:
+        output = converter.convert_array(
+            audio,
+            model_path=request.pth_path,
+            index_path=request.index_path,
+            pitch=request.pitch,
+            f0_method=request.f0_method,
+            cancel_event=cancel_event,
+            sample_rate=KOKORO_SAMPLE_RATE,
+        )
+        return output, converter.tgt_sr
+
+
+def convert_full(request: TTSRequest, audio: np.ndarray, cancel_event: threading.Event):
+    with voice_pool.acquire(request.pth_path) as converter:
+        output = converter.convert_audio(
+            audio_input=audio,
+            sample_rate=KOKORO_SAMPLE_RATE,
+            model_path=request.pth_path,
+            index_path=request.index_path,
+            pitch=request.pitch,
+            f0_method=request.f0_method,
+            cancel_event=cancel_event,
+        )
+        return output, converter.tgt_sr
+
+
+async def stream_tts_rvc(
+    request: TTSRequest,
+    http_request: Request,
+    cache_key: str | None,
+    admission: Admission,
+):
+    """
+    Streams Kokoro through RVC segment by segment, in order, as 16-bit WAV.
+    The first audio goes out after one segment instead of after the whole
+    text. Kokoro keeps generating ahead on its own thread, but each segment
+    goes to RVC only once the previous one is converted, so a request holds
+    one RVC thread at a time instead of parking the rest on its model's lock.
+    """
+    start_time = time.time()
+    loop = asyncio.get_running_loop()
+    cancel_event = threading.Event()
+    # Kokoro segments in order, then None
+    generated: asyncio.Queue = asyncio.Queue()
+    # Converted segments in order, then None
+    converted: asyncio.Queue = asyncio.Queue()
+
+    def produce():
+        try:
+            for gs, ps, audio in pipeline(request.text, voice=KOKORO_VOICE, speed=1.0):
+                if cancel_event.is_set():
+                    return
+                loop.call_soon_threadsafe(generated.put_nowait, audio)
+        finally:
+            loop.call_soon_threadsafe(generated.put_nowait, None)
+
+    async def convert_in_order():
+        try:
+            while (audio := await generated.get()) is not None:
+                conversion = rvc_executor.submit(convert_segment, request, audio, cancel_event)
+                converted.put_nowait(await asyncio.wrap_future(conversion))
+        finally:
+            converted.put_nowait(None)
+
+    sample_rate = None
+
+    async def segments():
+        nonlocal sample_rate
+        producer = loop.run_in_executor(kokoro_executor, produce)
+        converter = asyncio.ensure_future(convert_in_order())
+        try:
+            while (result := await converted.get()) is not None:
+                output, tgt_sr = result
+                sample_rate = sample_rate or tgt_sr
+                yield to_pcm16(output)
+            # Surfaces RVC and Kokoro errors
+            await converter
+            await producer
+        finally:
+            converter.cancel()
+
+    metrics.in_flight.labels(endpoint="tts-rvc-stream").inc()
+    pcm = []
+    completed = False
+    try:
+        async for data in until_disconnected(http_request, segments()):
+            if not pcm:
+                metrics.time_to_first_audio.labels(endpoint="tts-rvc-stream").observe(
+                    time.time() - start_time
+                )
+                yield streaming_wav_header(sample_rate)
+            pcm.append(data)
+            yield data
+        completed = True
+    except Exception:
+        logger.exception("tts-rvc stream failed")
+        raise
+    finally:
+        # Stops Kokoro and drops segments that are still waiting for RVC
+        cancel_event.set()
+        admission.release()
+        metrics.in_flight.labels(endpoint="tts-rvc-stream").dec()
+
+    if not completed or sample_rate is None:
+        return
+
+    total_time = time.time() - start_time
+    audio = b"".join(pcm)
+    audio_duration = len(audio) / 2 / sample_rate
+    metrics.request_seconds.labels(endpoint="tts-rvc-stream").observe(total_time)
+    if audio_duration > 0:
+        metrics.real_time_factor.observe(total_time / audio_duration)
+    if cache_key is not None:
+        await asyncio.to_thread(audio_cache.put, cache_key, wav_bytes(audio, sample_rate))
+
+
 @app.post("/tts-rvc")
-async def tts_rvc_endpoint(request: TTSRequest):
+async def tts_rvc_endpoint(
+    request: TTSRequest, http_request: Request, background_tasks: BackgroundTasks
+):
     """
     Drop-in replacement for the original TTS-RVC API.
     Uses Kokoro + RVC in-memory.
     """
+    start_time = time.time()
+    metrics.in_flight.labels(endpoint="tts-rvc").inc()
+    admission = None
     try:
+        cache_key = None
+        if audio_cache is not None:
+            cache_key = request_cache_key(request)
+            cached = await asyncio.to_thread(audio_cache.get, cache_key)
+            if cached is not None:
+                metrics.request_seconds.labels(endpoint="tts-rvc").observe(
+                    time.time() - start_time
+                )
+                return StreamingResponse(
+                    iter_chunks(cached),
+                    media_type="audio/wav",
+                    headers={"Content-Disposition": "inline; filename=converted.wav"}
+                )
+
+        if request.stream:
+            stream_admission = admit_rvc("tts-rvc-stream")
+            # The stream gives its slot back when it ends, but if the client
+            # goes away before the body starts its cleanup never runs; the
+            # response's background task releases it either way
+            background_tasks.add_task(stream_admission.release)
+            return StreamingResponse(
+                stream_tts_rvc(request, http_request, cache_key, stream_admission),
+                media_type="audio/wav",
+                headers={"Content-Disposition": "inline; filename=converted.wav"}
+            )
+
+        # Held until the response is ready; full queues are turned away here
+        admission = admit_rvc("tts-rvc")
+
+        # Set on disconnect; Kokoro and RVC stop at their next chunk
+        cancel_event = threading.Event()
+        loop = asyncio.get_running_loop()
+
         # 1. Generate Kokoro audio in memory
-        audio_chunks = []
-        generator = pipeline(request.text, voice='af_heart', speed=1.0)
-        for gs, ps, audio in generator:
-            audio_chunks.append(audio)
+        audio_chunks = await run_until_disconnected(
+            http_request,
+            loop.run_in_executor(
+                kokoro_executor, synthesize_kokoro, request.text, cancel_event
+            ),
+        )
         
         if not audio_chunks:
             raise HTTPException(status_code=500, detail="Kokoro generated no audio")
 
         full_audio = np.concatenate(audio_chunks)
+        tts_done = time.time()
+        metrics.tts_seconds.observe(tts_done - start_time)
         
-        # Convert to BytesIO buffer for RVC engine
-        source_buffer = io.BytesIO()
-        sf.write(source_buffer, full_audio, 24000, format='WAV')
-        source_buffer.seek(0)
-
-        # 2. RVC Conversion
-        output_buffer = v_converter.convert_audio(
-            audio_input=source_buffer,
-            audio_output_path=None, # In-memory
-            model_path=request.pth_path,
-            index_path=request.index_path,
-            pitch=request.pitch,
-            f0_method=request.f0_method
+        # 2. RVC Conversion, handing over the samples as they are
+        output, tgt_sr = await run_until_disconnected(
+            http_request,
+            loop.run_in_executor(
+                rvc_executor, convert_full, request, full_audio, cancel_event
+            ),
         )
 
-        if output_buffer is None:
+        if output is None:
              raise HTTPException(status_code=500, detail="RVC conversion returned None")
 
+        # The only encode of the response
+        content = wav_bytes(to_pcm16(output), tgt_sr)
+
+        rvc_done = time.time()
+        metrics.rvc_seconds.observe(rvc_done - tts_done)
+        total_time = rvc_done - start_time
+        metrics.request_seconds.labels(endpoint="tts-rvc").observe(total_time)
+        metrics.time_to_first_audio.labels(endpoint="tts-rvc").observe(total_time)
+        metrics.real_time_factor.observe(total_time / (len(full_audio) / 24000))
+        logger.debug(
+            "tts-rvc: tts %.3fs, rvc %.3fs, audio %.2fs",
+            tts_done - start_time,
+            rvc_done - tts_done,
+            len(full_audio) / 24000,
+        )
+
+        if cache_key is not None:
+            # Written once the response has gone out
+            background_tasks.add_task(audio_cache.put, cache_key, content)
+
         return Response(
-            content=output_buffer.getvalue(),
+            content=content,
             media_type="audio/wav",
             headers={"Content-Disposition": "inline; filename=converted.wav"}
         )
+    except HTTPException:
+        raise
+    except ClientDisconnected:
+        cancel_event.set()
+        logger.info("tts-rvc client disconnected, synthesis cancelled")
+        return Response(status_code=499)
     except Exception as e:
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("tts-rvc request failed")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if admission is not None:
+            admission.release()
+        metrics.in_flight.labels(endpoint="tts-rvc").dec()
 
 if __name__ == "__main__":
     import uvicorn
-    print(f"Kokoro Models Directory: {MODELS_DIR}")
+    logger.info("Kokoro Models Directory: %s", MODELS_DIR)
     uvicorn.run(app, host="0.0.0.0", port=8801)
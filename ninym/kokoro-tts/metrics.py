@@ -0,0 +1,118 @@
+from typing import Callable
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 13, 20, 30)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025) + LATENCY_BUCKETS
+
+request_seconds = Histogram(
+    "ninym_tts_request_seconds",
+    "Total time to serve a TTS request",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+time_to_first_audio = Histogram(
+    "ninym_tts_time_to_first_audio_byte_seconds",
+    "Time from request to the first audio byte sent",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+tts_seconds = Histogram(
+    "ninym_tts_synthesis_seconds",
+    "Base TTS synthesis time per request",
+    buckets=LATENCY_BUCKETS,
+)
+rvc_seconds = Histogram(
+    "ninym_rvc_conversion_seconds",
+    "RVC voice conversion time per request",
+    buckets=LATENCY_BUCKETS,
+)
+real_time_factor = Histogram(
+    "ninym_tts_real_time_factor",
+    "Wall time divided by audio duration per request",
+    buckets=RTF_BUCKETS,
+)
+rvc_queue_wait = Histogram(
+    "ninym_rvc_queue_wait_seconds",
+    "Time an RVC job waited for a free worker",
+    buckets=WAIT_BUCKETS,
+)
+rvc_admitted = Gauge(
+    "ninym_rvc_requests_admitted", "Requests holding a slot in the RVC queue"
+)
+rvc_rejected = Counter(
+    "ninym_rvc_requests_rejected_total",
+    "Requests answered with 503 because the RVC queue was full",
+    ["endpoint"],
+)
+in_flight = Gauge(
+    "ninym_tts_requests_in_flight",
+    "Requests currently being synthesized or converted",
+    ["endpoint"],
+)
+voice_models_loaded = Gauge(
+    "ninym_rvc_voice_models_loaded", "Voice models held by the converter pool"
+)
+voice_model_bytes = Gauge(
+    "ninym_rvc_voice_model_bytes", "Weights of the voice models held by the converter pool"
+)
+index_cache_indexes = Gauge(
+    "ninym_rvc_index_cache_indexes", "FAISS indexes held by the index cache"
+)
+index_cache_bytes = Gauge(
+    "ninym_rvc_index_cache_bytes", "Indexes and feature matrices held by the index cache"
+)
+audio_cache_lookups = Gauge(
+    "ninym_audio_cache_lookups",
+    "Audio cache lookups since start by result",
+    ["result"],
+)
+audio_cache_hit_ratio = Gauge(
+    "ninym_audio_cache_hit_ratio", "Fraction of audio cache lookups served from the cache"
+)
+audio_cache_bytes = Gauge(
+    "ninym_audio_cache_bytes", "Audio held by the cache", ["tier"]
+)
+
+router = APIRouter()
+
+# Callbacks that refresh pull-style gauges right before a scrape
+_scrape_hooks: list[Callable[[], None]] = []
+
+
+def on_scrape(hook: Callable[[], None]) -> None:
+    _scrape_hooks.append(hook)
+
+
+def observe_audio_cache(stats: dict) -> None:
+    audio_cache_lookups.labels(result="memory_hit").set(stats["memory_hits"])
+    audio_cache_lookups.labels(result="disk_hit").set(stats["disk_hits"])
+    audio_cache_lookups.labels(result="miss").set(stats["misses"])
+    audio_cache_hit_ratio.set(stats["hit_ratio"])
+    audio_cache_bytes.labels(tier="memory").set(stats["memory_bytes"])
+    audio_cache_bytes.labels(tier="disk").set(stats["disk_bytes"])
+
+
+def observe_voice_pool(stats: dict) -> None:
+    voice_models_loaded.set(stats["models"])
+    voice_model_bytes.set(stats["bytes"])
+
+
+def observe_index_cache(stats: dict) -> None:
+    index_cache_indexes.set(stats["indexes"])
+    index_cache_bytes.set(stats["bytes"])
+
+
+@router.get("/metrics")
+async def metrics():
+    for hook in _scrape_hooks:
+        hook()
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+import torch
+
+
+class _CachedIndex:
+    def __init__(self, key: tuple):
+        self.key = key
+        self.index = None
+        self.big_npy = None
+        # Squared L2 norm of every row of big_npy, which every search needs
+        self.big_sq = None
+        self.size = 0
+        # big_npy and big_sq copied to each device they have been asked for
+        self.tensors = {}
+        self.norms = {}
+        # Held while the index loads or is copied to a device, so concurrent
+        # first uses do it once
+        self.lock = threading.Lock()
+
+
+class IndexCache:
+    """
+    Process-wide cache of FAISS indexes and their reconstructed feature
+    matrices (`big_npy`), keyed by index path and modification time.
+
+    Reading an IVF index and reconstructing every vector out of it is the
+    slowest part of a short conversion, and the result is the same for every
+    call. Entries stay loaded across requests and voice models until the
+    cached indexes take more than `budget_bytes`, when the least recently
+    used ones are dropped. With a `directory`, the reconstructed matrix is
+    also written there as a float32 .npy file and memory-mapped, so it is
+    shared through the page cache and survives restarts. On GPU hosts the
+    matrix is also kept on the device (device_matrix) for on-device
+    retrieval. The squared norms of its rows are computed once per entry
+    (squared_norms), so a search only has to compute those of its queries.
+    """
+
+    def __init__(self, budget_bytes: int = 1024 * 1024 * 1024, directory: str | None = None):
+        self.budget_bytes = budget_bytes
+        self.directory = directory
+        self._entries: OrderedDict[tuple, _CachedIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, budget_bytes: int | None = None, directory: str | None = None) -> None:
+        if budget_bytes is not None:
+            self.budget_bytes = budget_bytes
+        if directory is not None:
+            self.directory = directory or None
+
+    def get(self, file_index: str):
+        """
+        Returns (index, big_npy) for `file_index`, loading them on first use.
+        """
+        entry = self._loaded(file_index)
+        return entry.index, entry.big_npy
+
+    def device_matrix(self, file_index: str, device) -> torch.Tensor:
+        """
+        Returns big_npy for `file_index` as a float32 tensor on `device`. It
+        is copied there once and counts against the budget from then on.
+        """
+        return self._on_device(self._loaded(file_index), device)[0]
+
+    def squared_norms(self, file_index: str, device=None):
+        """
+        Returns the squared L2 norm of every row of big_npy for `file_index`,
+        as a NumPy array, or with a `device` as a tensor next to
+        device_matrix on that device.
+        """
+        entry = self._loaded(file_index)
+        if device is None:
+            return entry.big_sq
+        return self._on_device(entry, device)[1]
+
+    def _on_device(self, entry: _CachedIndex, device) -> tuple[torch.Tensor, torch.Tensor]:
+        key = str(device)
+        with entry.lock:
+            if key not in entry.tensors:
+                tensor = torch.from_numpy(np.array(entry.big_npy)).to(device)
+                norms = torch.from_numpy(entry.big_sq).to(device)
+                entry.tensors[key] = tensor
+                entry.norms[key] = norms
+                with self._lock:
+                    entry.size += (tensor.numel() + norms.numel()) * tensor.element_size()
+                self._evict(keep=entry.key)
+            return entry.tensors[key], entry.norms[key]
+
+    def _loaded(self, file_index: str) -> _CachedIndex:
+        path = os.path.abspath(file_index)
+        key = (path, os.stat(path).st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _CachedIndex(key)
+                self._entries[key] = entry
+                # A rewritten index replaces the entries for its old versions
+                for stale in [k for k in self._entries if k[0] == path and k != key]:
+                    del self._entries[stale]
+            self._entries.move_to_end(key)
+
+        with entry.lock:
+            if entry.index is None:
+                try:
+                    self._load(key, entry)
+                except Exception:
+                    with self._lock:
+                        if self._entries.get(key) is entry:
+                            del self._entries[key]
+                    raise
+        return entry
+
+    def preload(self, file_index: str) -> None:
+        self.get(file_index)
+
+    def _load(self, key: tuple, entry: _CachedIndex) -> None:
+        path, mtime = key
+        index = faiss.read_index(path)
+        big_npy = None
+        npy_path = None
+        if self.directory:
+            prefix = hashlib.sha1(path.encode("utf-8")).hexdigest()[:16]
+            version = hashlib.sha1(f"{mtime}:{index.ntotal}".encode("utf-8")).hexdigest()[:16]
+            npy_path = os.path.join(self.directory, f"{prefix}-{version}.npy")
+            if os.path.exists(npy_path):
+                big_npy = np.load(npy_path, mmap_mode="r")
+
+        if big_npy is None:
+            big_npy = np.ascontiguousarray(index.reconstruct_n(0, index.ntotal), dtype=np.float32)
+            if npy_path is not None:
+                big_npy = self._store(npy_path, prefix, big_npy)
+
+        entry.index = index
+        entry.big_npy = big_npy
+        entry.big_sq = np.einsum("ij,ij->i", big_npy, big_npy)
+        # The index file is a close estimate of what FAISS holds in memory
+        entry.size = os.path.getsize(path) + big_npy.nbytes + entry.big_sq.nbytes
+        self._evict(keep=key)
+
+    def _store(self, npy_path: str, prefix: str, big_npy: np.ndarray) -> np.ndarray:
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix + "-") and name.endswith(".npy"):
+                os.remove(os.path.join(self.directory, name))
+        temp_path = f"{npy_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, big_npy)
+        os.replace(temp_path, npy_path)
+        return np.load(npy_path, mmap_mode="r")
+
+    def _evict(self, keep: tuple) -> None:
+        with self._lock:
+            total = sum(entry.size for entry in self._entries.values())
+            while total > self.budget_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                if oldest == keep:
+                    break
+                # A conversion still searching the index keeps it alive
+                total -= self._entries.pop(oldest).size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "indexes": len(self._entries),
+                "bytes": sum(entry.size for entry in self._entries.values()),
+            }
+
+
+index_cache = IndexCache()
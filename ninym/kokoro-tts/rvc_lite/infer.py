@@ -26,8 +26,8 @@ from pedalboard import (
 now_dir = os.path.dirname(os.path.dirname(__file__)) # This should point to the 'Stripped' folder
 sys.path.append(now_dir)
 
-from rvc_lite.pipeline import Pipeline as VC
-from rvc_lite.utils import load_audio_infer, load_embedding
+from rvc_lite.pipeline import Pipeline as VC, ConversionCancelled
+from rvc_lite.utils import load_audio_infer, load_embedding, to_audio_array
 from rvc_lite.split_audio import process_audio, merge_audio
 from rvc_lite.algorithm.synthesizers import Synthesizer
 from rvc_lite.config import Config
@@ -43,11 +43,17 @@ class VoiceConverter:
     A class for performing voice conversion using the Retrieval-Based Voice Conversion (RVC) method.
     """
 
-    def __init__(self):
+    def __init__(self, embedder_loader=None):
         """
         Initializes the VoiceConverter with default configuration, and sets up models and parameters.
+
+        Args:
+            embedder_loader (callable, optional): Returns the HuBERT model for
+                (embedder_model, embedder_model_custom), so several converters
+                can share one instead of each loading their own.
         """
         self.config = Config()  # Load configuration
+        self.embedder_loader = embedder_loader
         self.hubert_model = (
             None  # Initialize the Hubert model (for embedding extraction)
         )
@@ -69,6 +75,9 @@ class VoiceConverter:
             embedder_model (str): Path to the pre-trained HuBERT model.
             embedder_model_custom (str): Path to the custom HuBERT model.
         """
+        if self.embedder_loader is not None:
+            self.hubert_model = self.embedder_loader(embedder_model, embedder_model_custom)
+            return
         self.hubert_model = load_embedding(embedder_model, embedder_model_custom)
         self.hubert_model = self.hubert_model.to(self.config.device).float()
         self.hubert_model.eval()
@@ -192,7 +201,7 @@ class VoiceConverter:
 
     def convert_audio(
         self,
-        audio_input, # Can be path or buffer
+        audio_input, # Can be path, buffer, or numpy/torch array
         audio_output_path: str = None, # Optional, if None returns in-memory
         model_path: str = None,
         index_path: str = None,
@@ -205,6 +214,7 @@ class VoiceConverter:
         split_audio: bool = False,
         f0_autotune: bool = False,
         f0_autotune_strength: float = 1,
+        f0_autotune_scale=None,
         embedder_model: str = "contentvec",
         embedder_model_custom: str = None,
         clean_audio: bool = False,
@@ -215,10 +225,21 @@ class VoiceConverter:
         sid: int = 0,
         proposed_pitch: bool = False,
         proposed_pitch_threshold: float = 155.0,
+        cancel_event=None,
+        sample_rate: int = None,
+        return_array: bool = None,
         **kwargs,
     ):
         """
         Performs voice conversion on the input audio.
+
+        Setting `cancel_event` (a threading.Event) from another thread stops
+        the conversion early with ConversionCancelled.
+
+        Arrays are taken as they are, at `sample_rate`, without being encoded
+        and decoded again. With `return_array` (the default for array input)
+        and no output path, the converted samples are returned as an array
+        at `self.tgt_sr` instead of an encoded buffer.
         """
         if not model_path:
             print("No model path provided. Aborting conversion.")
@@ -228,31 +249,28 @@ class VoiceConverter:
 
         try:
             start_time = time.time()
-            input_name = audio_input if isinstance(audio_input, str) else "In-memory buffer"
+            input_name = audio_input if isinstance(audio_input, str) else "In-memory audio"
+            if return_array is None:
+                return_array = sample_rate is not None
             print(f"Converting audio '{input_name}'...")
 
             audio = load_audio_infer(
                 audio_input,
                 16000,
+                input_sample_rate=sample_rate,
                 **kwargs,
             )
             audio_max = np.abs(audio).max() / 0.95
 
             if audio_max > 1:
-                audio /= audio_max
+                # Not in place, the array may still belong to the caller
+                audio = audio / audio_max
 
             if not self.hubert_model or embedder_model != self.last_embedder_model:
                 self.load_hubert(embedder_model, embedder_model_custom)
                 self.last_embedder_model = embedder_model
 
-            file_index = (
-                (index_path or "").strip()
-                .strip('"')
-                .strip("\n")
-                .strip('"')
-                .strip()
-                .replace("trained", "added")
-            )
+            file_index = self.resolve_index(index_path)
 
             if self.tgt_sr != resample_sr >= 16000:
                 self.tgt_sr = resample_sr
@@ -266,6 +284,8 @@ class VoiceConverter:
 
             converted_chunks = []
             for c in chunks:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ConversionCancelled()
                 audio_opt = self.vc.pipeline(
                     model=self.hubert_model,
                     net_g=self.net_g,
@@ -281,8 +301,10 @@ class VoiceConverter:
                     protect=protect,
                     f0_autotune=f0_autotune,
                     f0_autotune_strength=f0_autotune_strength,
+                    f0_autotune_scale=f0_autotune_scale,
                     proposed_pitch=proposed_pitch,
                     proposed_pitch_threshold=proposed_pitch_threshold,
+                    cancel_event=cancel_event,
                 )
                 converted_chunks.append(audio_opt)
                 if split_audio:
@@ -321,6 +343,8 @@ class VoiceConverter:
                     audio_output_path, output_path_format, export_format
                 )
                 return audio_output_path
+            elif return_array:
+                return audio_opt
             else:
                 # Return in-memory buffer
                 import io
@@ -328,11 +352,85 @@ class VoiceConverter:
                 sf.write(buffer, audio_opt, self.tgt_sr, format=export_format)
                 buffer.seek(0)
                 return buffer
+        except ConversionCancelled:
+            raise
         except Exception as error:
             print(f"An error occurred during audio conversion: {error}")
             print(traceback.format_exc())
             raise error
 
+    @staticmethod
+    def resolve_index(index_path: str = None) -> str:
+        """
+        Cleans up a user-supplied index path and points it at the added index.
+        """
+        return (
+            (index_path or "").strip()
+            .strip('"')
+            .strip("\n")
+            .strip('"')
+            .strip()
+            .replace("trained", "added")
+        )
+
+    def convert_array(
+        self,
+        audio: np.ndarray,
+        model_path: str,
+        index_path: str = None,
+        pitch: int = 0,
+        f0_method: str = "rmvpe",
+        index_rate: float = 0.75,
+        volume_envelope: float = 1.0,
+        protect: float = 0.5,
+        f0_autotune: bool = False,
+        f0_autotune_strength: float = 1,
+        f0_autotune_scale=None,
+        embedder_model: str = "contentvec",
+        embedder_model_custom: str = None,
+        sid: int = 0,
+        proposed_pitch: bool = False,
+        proposed_pitch_threshold: float = 155.0,
+        cancel_event=None,
+        sample_rate: int = 16000,
+    ) -> np.ndarray:
+        """
+        Converts mono audio that is already in memory, resampling it to
+        16 kHz first if `sample_rate` differs.
+
+        Unlike convert_audio, nothing is decoded, normalized or encoded, so
+        consecutive windows of one stream keep the same level. Returns the
+        converted samples at `self.tgt_sr`; errors propagate to the caller.
+        """
+        self.get_vc(model_path, sid)
+        if self.vc is None:
+            raise RuntimeError(f"Could not load voice model: {model_path}")
+
+        if not self.hubert_model or embedder_model != self.last_embedder_model:
+            self.load_hubert(embedder_model, embedder_model_custom)
+            self.last_embedder_model = embedder_model
+
+        return self.vc.pipeline(
+            model=self.hubert_model,
+            net_g=self.net_g,
+            sid=sid,
+            audio=np.asarray(to_audio_array(audio, sample_rate, 16000), dtype=np.float64),
+            pitch=pitch,
+            f0_method=f0_method,
+            file_index=self.resolve_index(index_path),
+            index_rate=index_rate,
+            pitch_guidance=self.use_f0,
+            volume_envelope=volume_envelope,
+            version=self.version,
+            protect=protect,
+            f0_autotune=f0_autotune,
+            f0_autotune_strength=f0_autotune_strength,
+            f0_autotune_scale=f0_autotune_scale,
+            proposed_pitch=proposed_pitch,
+            proposed_pitch_threshold=proposed_pitch_threshold,
+            cancel_event=cancel_event,
+        )
+
     def convert_audio_batch(
         self,
         audio_input_paths: str,
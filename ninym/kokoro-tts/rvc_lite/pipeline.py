@@ -4,7 +4,6 @@ import sys
 import torch
 import torch.nn.functional as F
 import torchcrepe
-import faiss
 import librosa
 import numpy as np
 from scipy import signal
@@ -13,7 +12,8 @@ from torch import Tensor
 now_dir = os.getcwd()
 sys.path.append(now_dir)
 
-from rvc_lite.predictors.f0 import CREPE, FCPE, RMVPE
+from rvc_lite.predictors.f0 import get_predictor
+from rvc_lite.index_cache import index_cache
 
 import logging
 
@@ -27,6 +27,30 @@ bh, ah = signal.butter(
 )
 
 
+# Largest distance tile _numpy_search builds at once, and the most query
+# rows it puts in one tile
+SEARCH_BLOCK_BYTES = 64 * 1024 * 1024
+SEARCH_TILE_ROWS = 1024
+
+
+def _blend_neighbours(weight, big, ix):
+    """
+    Sums each row's neighbours in `big` (ids `ix`, [N, k]) scaled by `weight`,
+    with one [N, D] gather per neighbour rather than a single [N, k, D] one.
+    Works on NumPy arrays and tensors alike.
+    """
+    blended = weight[:, :1] * big[ix[:, 0]]
+    for j in range(1, ix.shape[1]):
+        blended += weight[:, j : j + 1] * big[ix[:, j]]
+    return blended
+
+
+class ConversionCancelled(Exception):
+    """
+    Raised when a conversion is stopped through its cancel event.
+    """
+
+
 class AudioProcessor:
     """
     A class for processing audio signals, specifically for adjusting RMS levels.
@@ -82,6 +106,13 @@ class AudioProcessor:
         return adjusted_audio
 
 
+NOTE_PITCH_CLASSES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+SCALE_INTERVALS = {
+    "major": (0, 2, 4, 5, 7, 9, 11),
+    "minor": (0, 2, 3, 5, 7, 8, 10),
+}
+
+
 class Autotune:
     """
     A class for applying autotune to a given fundamental frequency (F0) contour.
@@ -147,19 +178,97 @@ class Autotune:
             987.77,  # B5
             1046.50,  # C6
         ]
+        self._tables = {}
 
-    def autotune_f0(self, f0, f0_autotune_strength):
+    def note_table(self, scale=None):
         """
-        Autotunes a given F0 contour by snapping each frequency to the closest reference frequency.
+        Returns the reference frequencies allowed by `scale`, ascending, with
+        their base-2 logarithms.
 
         Args:
-            f0: The input F0 contour as a NumPy array.
+            scale: None for every note, a key such as "C major", "A minor" or
+                "chromatic", or a list of note names ("C", "Eb", "G") or
+                pitch classes (0 for C up to 11 for B).
         """
-        autotuned_f0 = np.zeros_like(f0)
-        for i, freq in enumerate(f0):
-            closest_note = min(self.note_dict, key=lambda x: abs(x - freq))
-            autotuned_f0[i] = freq + (closest_note - freq) * f0_autotune_strength
-        return autotuned_f0
+        key = scale if scale is None or isinstance(scale, str) else tuple(scale)
+        if key not in self._tables:
+            pitch_classes = self._pitch_classes(scale)
+            notes = np.array(
+                [
+                    note
+                    for note in self.note_dict
+                    # Semitones from A4, shifted so that C is pitch class 0
+                    if (int(round(12 * np.log2(note / 440.0))) + 9) % 12 in pitch_classes
+                ]
+            )
+            if len(notes) == 0:
+                raise ValueError(f"Scale {scale!r} leaves no notes to tune to")
+            if len(notes) == 1:
+                # The search below always needs a pair of neighbours
+                notes = np.repeat(notes, 2)
+            self._tables[key] = (notes, np.log2(notes))
+        return self._tables[key]
+
+    @staticmethod
+    def _pitch_classes(scale):
+        if scale is None:
+            return set(range(12))
+        if isinstance(scale, str):
+            parts = scale.split()
+            if parts == ["chromatic"]:
+                return set(range(12))
+            if len(parts) != 2 or parts[1].lower() not in SCALE_INTERVALS:
+                raise ValueError(f"Unknown scale: {scale!r}")
+            tonic = Autotune._pitch_class(parts[0])
+            return {(tonic + step) % 12 for step in SCALE_INTERVALS[parts[1].lower()]}
+        return {Autotune._pitch_class(note) for note in scale}
+
+    @staticmethod
+    def _pitch_class(note):
+        if isinstance(note, (int, np.integer)):
+            return int(note) % 12
+        name = note.strip()
+        if name[:1].upper() not in NOTE_PITCH_CLASSES:
+            raise ValueError(f"Unknown note: {note!r}")
+        pitch_class = NOTE_PITCH_CLASSES[name[:1].upper()]
+        for accidental in name[1:]:
+            pitch_class += {"#": 1, "b": -1}.get(accidental, 0)
+        return pitch_class % 12
+
+    def autotune_f0(self, f0, f0_autotune_strength, scale=None):
+        """
+        Autotunes a given F0 contour by pulling each frequency towards the
+        closest reference frequency, measured in log-frequency (pitch) space.
+        Unvoiced frames (0 Hz) are left alone.
+
+        Args:
+            f0: The input F0 contour as a NumPy array or torch tensor. Tensors
+                are tuned on their own device.
+            f0_autotune_strength: How far to pull, from 0 (not at all) to 1
+                (onto the note).
+            scale: Restricts the notes to tune to; see note_table.
+        """
+        notes, log_notes = self.note_table(scale)
+        if torch.is_tensor(f0):
+            notes_t = torch.as_tensor(notes, dtype=f0.dtype, device=f0.device)
+            log_notes_t = torch.as_tensor(log_notes, dtype=f0.dtype, device=f0.device)
+            log_f0 = torch.log2(f0.clamp(min=1e-5))
+            upper = torch.searchsorted(log_notes_t, log_f0.contiguous())
+            upper = upper.clamp(1, len(notes) - 1)
+            lower = upper - 1
+            nearer_lower = (log_f0 - log_notes_t[lower]) < (log_notes_t[upper] - log_f0)
+            closest = notes_t[torch.where(nearer_lower, lower, upper)]
+            autotuned_f0 = f0 + (closest - f0) * f0_autotune_strength
+            return torch.where(f0 > 0, autotuned_f0, f0)
+
+        f0 = np.asarray(f0)
+        log_f0 = np.log2(np.maximum(f0, 1e-5))
+        upper = np.searchsorted(log_notes, log_f0).clip(1, len(notes) - 1)
+        lower = upper - 1
+        nearer_lower = (log_f0 - log_notes[lower]) < (log_notes[upper] - log_f0)
+        closest = notes[np.where(nearer_lower, lower, upper)]
+        autotuned_f0 = f0 + (closest - f0) * f0_autotune_strength
+        return np.where(f0 > 0, autotuned_f0, f0).astype(f0.dtype, copy=False)
 
 
 class Pipeline:
@@ -207,6 +316,7 @@ class Pipeline:
         f0_autotune_strength: float = 1.0,
         proposed_pitch: bool = False,
         proposed_pitch_threshold: float = 155.0,
+        f0_autotune_scale=None,
     ):
         """
         Estimates the fundamental frequency (F0) of a given audio signal using various methods.
@@ -219,35 +329,26 @@ class Pipeline:
             f0_autotune: Whether to apply autotune to the F0 contour.
             proposed_pitch: whether to apply proposed pitch adjustment
             proposed_pitch_threshold: target frequency, 155.0 for male, 255.0 for female
+            f0_autotune_scale: Notes autotune may snap to; see Autotune.note_table.
         """
+        # The predictors are loaded once per device and shared; their
+        # defaults match this pipeline's 16 kHz input and 160-sample hop
         if f0_method == "crepe":
-            model = CREPE(
-                device=self.device, sample_rate=self.sample_rate, hop_size=self.window
-            )
+            model = get_predictor("crepe", self.device)
             f0 = model.get_f0(x, self.f0_min, self.f0_max, p_len, "full")
-            del model
         elif f0_method == "crepe-tiny":
-            model = CREPE(
-                device=self.device, sample_rate=self.sample_rate, hop_size=self.window
-            )
+            model = get_predictor("crepe", self.device)
             f0 = model.get_f0(x, self.f0_min, self.f0_max, p_len, "tiny")
-            del model
         elif f0_method == "rmvpe":
-            model = RMVPE(
-                device=self.device, sample_rate=self.sample_rate, hop_size=self.window
-            )
+            model = get_predictor("rmvpe", self.device)
             f0 = model.get_f0(x, filter_radius=0.03)
-            del model
         elif f0_method == "fcpe":
-            model = FCPE(
-                device=self.device, sample_rate=self.sample_rate, hop_size=self.window
-            )
+            model = get_predictor("fcpe", self.device)
             f0 = model.get_f0(x, p_len, filter_radius=0.006)
-            del model
 
         # f0 adjustments
         if f0_autotune is True:
-            f0 = self.autotune.autotune_f0(f0, f0_autotune_strength)
+            f0 = self.autotune.autotune_f0(f0, f0_autotune_strength, f0_autotune_scale)
         elif proposed_pitch is True:
             limit = 12
             # calculate median f0 of the audio
@@ -290,20 +391,64 @@ class Pipeline:
 
         return f0_coarse, f0bak
 
-    def _numpy_search(self, npy, big_npy, k=8):
+    def _numpy_search(self, npy, big_npy, k=8, block_bytes=SEARCH_BLOCK_BYTES, big_sq=None):
         """
         Fallback for index.search using NumPy for stability on systems where FAISS crashes.
+
+        Returns the k smallest squared L2 distances per row, ascending, like
+        FAISS. The distance matrix is built one tile at a time, with tiles
+        sized so that one takes at most `block_bytes`, and each tile is cut
+        down to its k best with argpartition, so memory stays bounded
+        however long the utterance or large the index. As with FAISS, an
+        index of fewer than k vectors leaves the last columns at distance
+        inf and id -1. `big_sq` holds the squared norms of big_npy's rows,
+        as cached by the index cache; they are computed when it is None.
         """
         # npy: [N, D], big_npy: [M, D]
-        npy_sq = np.sum(npy**2, axis=1, keepdims=True)
-        big_sq = np.sum(big_npy**2, axis=1, keepdims=True).T
-
-        # L2 distance: (a-b)^2 = a^2 + b^2 - 2ab
-        dists = npy_sq + big_sq - 2 * np.dot(npy, big_npy.T)
-        dists = np.maximum(dists, 0)  # Precision safety
-
-        ix = np.argsort(dists, axis=1)[:, :k]
-        score = np.take_along_axis(dists, ix, axis=1)
+        n, m = npy.shape[0], big_npy.shape[0]
+        dtype = np.result_type(npy, big_npy)
+        score = np.full((n, k), np.inf, dtype=dtype)
+        ix = np.full((n, k), -1, dtype=np.int64)
+        k = min(k, m)
+        if n == 0 or k == 0:
+            return score, ix
+        npy_sq = np.einsum("ij,ij->i", npy, npy)[:, None]
+        if big_sq is None:
+            big_sq = np.einsum("ij,ij->i", big_npy, big_npy)
+        big_sq = big_sq[None, :]
+
+        cols = min(m, max(k, block_bytes // (dtype.itemsize * min(n, SEARCH_TILE_ROWS))))
+        rows = min(n, max(1, block_bytes // (dtype.itemsize * cols)))
+
+        for r0 in range(0, n, rows):
+            query = npy[r0 : r0 + rows]
+            best_d = best_i = None
+            for c0 in range(0, m, cols):
+                # L2 distance: (a-b)^2 = a^2 + b^2 - 2ab
+                dists = (
+                    npy_sq[r0 : r0 + rows]
+                    + big_sq[:, c0 : c0 + cols]
+                    - 2 * np.dot(query, big_npy[c0 : c0 + cols].T)
+                )
+                dists = np.maximum(dists, 0)  # Precision safety
+                if dists.shape[1] > k:
+                    part = np.argpartition(dists, k - 1, axis=1)[:, :k]
+                    cand_d = np.take_along_axis(dists, part, axis=1)
+                    cand_i = part + c0
+                else:
+                    cand_d = dists
+                    cand_i = np.broadcast_to(np.arange(c0, c0 + dists.shape[1]), dists.shape)
+                if best_d is not None:
+                    cand_d = np.concatenate([best_d, cand_d], axis=1)
+                    cand_i = np.concatenate([best_i, cand_i], axis=1)
+                    keep = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+                    cand_d = np.take_along_axis(cand_d, keep, axis=1)
+                    cand_i = np.take_along_axis(cand_i, keep, axis=1)
+                best_d, best_i = cand_d, cand_i
+
+            order = np.argsort(best_d, axis=1)
+            score[r0 : r0 + rows, :k] = np.take_along_axis(best_d, order, axis=1)
+            ix[r0 : r0 + rows, :k] = np.take_along_axis(best_i, order, axis=1)
         return score, ix
 
     def voice_conversion(
@@ -316,6 +461,7 @@ class Pipeline:
         pitchf,
         index,
         big_npy,
+        big_sq,
         index_rate,
         version,
         protect,
@@ -338,7 +484,7 @@ class Pipeline:
                 index
             ):  # set by parent function, only true if index is available, loaded, and index rate > 0
                 feats = self._retrieve_speaker_embeddings(
-                    feats, index, big_npy, index_rate
+                    feats, index, big_npy, big_sq, index_rate
                 )
             # feature upsampling
             feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(
@@ -375,19 +521,65 @@ class Pipeline:
                 torch.cuda.empty_cache()
         return audio1
 
-    def _retrieve_speaker_embeddings(self, feats, index, big_npy, index_rate):
+    def _torch_search(self, query, big, k=8, block_bytes=SEARCH_BLOCK_BYTES, big_sq=None):
+        """
+        Exact k-NN on the device holding `query` and `big`, in column tiles
+        of at most `block_bytes`. Returns squared L2 distances, ascending,
+        and their ids, padded like _numpy_search, as index.search does.
+        `big_sq` holds the squared norms of big's rows, as cached by the
+        index cache; they are computed when it is None.
+        """
+        # query: [N, D], big: [M, D]
+        n, m = query.shape[0], big.shape[0]
+        score = torch.full((n, k), float("inf"), dtype=query.dtype, device=query.device)
+        ix = torch.full((n, k), -1, dtype=torch.long, device=query.device)
+        k = min(k, m)
+        if n == 0 or k == 0:
+            return score, ix
+        if big_sq is None:
+            big_sq = (big * big).sum(dim=1)
+        cols = min(m, max(k, block_bytes // (big.element_size() * n)))
+        query_sq = (query * query).sum(dim=1, keepdim=True)
+
+        best_d = best_i = None
+        for c0 in range(0, m, cols):
+            block = big[c0 : c0 + cols]
+            dists = query_sq + big_sq[c0 : c0 + cols] - 2 * query @ block.T
+            dists = dists.clamp_(min=0)  # Precision safety
+            cand_d, cand_i = dists.topk(min(k, dists.shape[1]), dim=1, largest=False)
+            cand_i += c0
+            if best_d is not None:
+                cand_d = torch.cat([best_d, cand_d], dim=1)
+                cand_i = torch.cat([best_i, cand_i], dim=1)
+                cand_d, keep = cand_d.topk(k, dim=1, largest=False)
+                cand_i = cand_i.gather(1, keep)
+            best_d, best_i = cand_d, cand_i
+        score[:, :k] = best_d
+        ix[:, :k] = best_i
+        return score, ix
+
+    def _retrieve_speaker_embeddings(self, feats, index, big_npy, big_sq, index_rate):
+        if torch.is_tensor(big_npy):
+            # big_npy lives on the device: search, weight and blend there
+            # without copying the features to the host and back
+            score, ix = self._torch_search(feats[0], big_npy, k=8, big_sq=big_sq)
+            weight = score.clamp(min=1e-12).reciprocal().square()
+            weight /= weight.sum(dim=1, keepdim=True)
+            npy = _blend_neighbours(weight.to(big_npy.dtype), big_npy, ix)
+            return npy.unsqueeze(0) * index_rate + (1 - index_rate) * feats
+
         npy = feats[0].cpu().numpy()
         if sys.platform == "darwin":  # FAISS index.search spesso causa SIGSEGV su macOS
-            score, ix = self._numpy_search(npy, big_npy, k=8)
+            score, ix = self._numpy_search(npy, big_npy, k=8, big_sq=big_sq)
         else:
             try:
                 score, ix = index.search(npy, k=8)
             except Exception:
-                score, ix = self._numpy_search(npy, big_npy, k=8)
+                score, ix = self._numpy_search(npy, big_npy, k=8, big_sq=big_sq)
 
         weight = np.square(1 / score)
         weight /= weight.sum(axis=1, keepdims=True)
-        npy = np.sum(big_npy[ix] * np.expand_dims(weight, axis=2), axis=1)
+        npy = _blend_neighbours(weight.astype(big_npy.dtype), big_npy, ix)
         feats = (
             torch.from_numpy(npy).unsqueeze(0).to(self.device) * index_rate
             + (1 - index_rate) * feats
@@ -412,6 +604,8 @@ class Pipeline:
         f0_autotune_strength,
         proposed_pitch,
         proposed_pitch_threshold,
+        cancel_event=None,
+        f0_autotune_scale=None,
     ):
         """
         The main pipeline function for performing voice conversion.
@@ -433,16 +627,23 @@ class Pipeline:
             protect: Protection level for preserving the original pitch.
             hop_length: Hop length for F0 estimation methods.
             f0_autotune: Whether to apply autotune to the F0 contour.
+            f0_autotune_scale: Notes autotune may snap to; see Autotune.note_table.
+            cancel_event: Optional threading.Event; once set, conversion stops
+                before the next window with ConversionCancelled.
         """
         if file_index != "" and os.path.exists(file_index) and index_rate > 0:
             try:
-                index = faiss.read_index(file_index)
-                big_npy = index.reconstruct_n(0, index.ntotal)
+                index, big_npy = index_cache.get(file_index)
+                big_sq = index_cache.squared_norms(file_index)
+                if self.device != "cpu":
+                    # Kept on the device by the cache, see _retrieve_speaker_embeddings
+                    big_npy = index_cache.device_matrix(file_index, self.device)
+                    big_sq = index_cache.squared_norms(file_index, self.device)
             except Exception as error:
                 print(f"An error occurred reading the FAISS index: {error}")
-                index = big_npy = None
+                index = big_npy = big_sq = None
         else:
-            index = big_npy = None
+            index = big_npy = big_sq = None
         audio = signal.filtfilt(bh, ah, audio)
         audio_pad = np.pad(audio, (self.window // 2, self.window // 2), mode="reflect")
         opt_ts = []
@@ -475,6 +676,7 @@ class Pipeline:
                 f0_autotune_strength,
                 proposed_pitch,
                 proposed_pitch_threshold,
+                f0_autotune_scale,
             )
             pitch = pitch[:p_len]
             pitchf = pitchf[:p_len]
@@ -483,6 +685,8 @@ class Pipeline:
             pitch = torch.tensor(pitch, device=self.device).unsqueeze(0).long()
             pitchf = torch.tensor(pitchf, device=self.device).unsqueeze(0).float()
         for t in opt_ts:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ConversionCancelled()
             t = t // self.window * self.window
             if pitch_guidance:
                 audio_opt.append(
@@ -495,6 +699,7 @@ class Pipeline:
                         pitchf[:, s // self.window : (t + self.t_pad2) // self.window],
                         index,
                         big_npy,
+                        big_sq,
                         index_rate,
                         version,
                         protect,
@@ -511,6 +716,7 @@ class Pipeline:
                         None,
                         index,
                         big_npy,
+                        big_sq,
                         index_rate,
                         version,
                         protect,
@@ -528,6 +734,7 @@ class Pipeline:
                     pitchf[:, t // self.window :] if t is not None else pitchf,
                     index,
                     big_npy,
+                    big_sq,
                     index_rate,
                     version,
                     protect,
@@ -544,6 +751,7 @@ class Pipeline:
                     None,
                     index,
                     big_npy,
+                    big_sq,
                     index_rate,
                     version,
                     protect,
@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import torch
+
+from rvc_lite.config import Config
+from rvc_lite.infer import VoiceConverter
+from rvc_lite.utils import load_embedding
+
+
+class _PooledModel:
+    def __init__(self, converter: VoiceConverter):
+        self.converter = converter
+        # Held for the whole of a conversion; a model's pipeline and network
+        # are not safe to share between threads
+        self.lock = threading.Lock()
+        self.size = 0
+
+
+class VoiceConverterPool:
+    """
+    Keeps several voice models loaded, one VoiceConverter (and so one
+    Synthesizer and Pipeline) per model file, all sharing the same HuBERT
+    embedder.
+
+    Requests for different voices no longer reload the model on every
+    switch, and each model is locked only while it converts, so two voices
+    can be converted at the same time. Least recently used models are
+    unloaded once there are more than `max_models` or their weights take
+    more than `memory_budget` bytes.
+    """
+
+    def __init__(self, max_models: int = 4, memory_budget: int | None = None):
+        self.config = Config()
+        self.max_models = max_models
+        self.memory_budget = memory_budget
+        self._models: OrderedDict[str, _PooledModel] = OrderedDict()
+        self._lock = threading.Lock()
+        self._embedders: dict[tuple, torch.nn.Module] = {}
+        self._embedder_lock = threading.Lock()
+
+    def load_embedder(self, embedder_model: str, embedder_model_custom: str = None):
+        key = (embedder_model, embedder_model_custom)
+        with self._embedder_lock:
+            if key not in self._embedders:
+                model = load_embedding(embedder_model, embedder_model_custom)
+                model = model.to(self.config.device).float()
+                model.eval()
+                self._embedders[key] = model
+            return self._embedders[key]
+
+    @contextmanager
+    def acquire(self, model_path: str):
+        """
+        Yields the converter for `model_path`, loading it if needed, with the
+        model locked against other threads until the block exits.
+        """
+        with self._lock:
+            entry = self._models.get(model_path)
+            if entry is None:
+                entry = _PooledModel(VoiceConverter(embedder_loader=self.load_embedder))
+                self._models[model_path] = entry
+            self._models.move_to_end(model_path)
+
+        with entry.lock:
+            if entry.converter.loaded_model != model_path:
+                self._load(model_path, entry)
+            yield entry.converter
+
+    def preload(self, model_path: str) -> None:
+        with self.acquire(model_path):
+            pass
+
+    def _load(self, model_path: str, entry: _PooledModel) -> None:
+        converter = entry.converter
+        converter.get_vc(model_path, 0)
+        if converter.vc is None:
+            with self._lock:
+                if self._models.get(model_path) is entry:
+                    del self._models[model_path]
+            raise RuntimeError(f"Could not load voice model: {model_path}")
+
+        # The network holds its own copy of the weights
+        converter.cpt = None
+        entry.size = sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in converter.net_g.state_dict().values()
+        )
+        print(f"Loaded voice model '{model_path}' ({entry.size / 1024 / 1024:.0f} MB).")
+        self._evict(keep=model_path)
+
+    def _evict(self, keep: str) -> None:
+        evicted = []
+        with self._lock:
+            while len(self._models) > 1 and (
+                len(self._models) > self.max_models
+                or (
+                    self.memory_budget is not None
+                    and sum(entry.size for entry in self._models.values()) > self.memory_budget
+                )
+            ):
+                oldest = next(iter(self._models))
+                if oldest == keep:
+                    break
+                del self._models[oldest]
+                evicted.append(oldest)
+
+        for model_path in evicted:
+            # A conversion still using the model keeps it alive until it ends
+            print(f"Unloaded voice model '{model_path}'.")
+        if evicted and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "models": len(self._models),
+                "bytes": sum(entry.size for entry in self._models.values()),
+            }
@@ -64,9 +64,28 @@ def load_audio(file, sample_rate):
     return audio.flatten()
 
 
+def to_audio_array(audio, sample_rate, target_sample_rate):
+    """
+    Converts in-memory samples (a numpy array or torch tensor, shaped
+    (samples,) or (samples, channels)) to a mono array at
+    `target_sample_rate`. The input is only copied when it has to be.
+    """
+    if hasattr(audio, "detach"):
+        audio = audio.detach().cpu().numpy()
+    audio = np.asarray(audio)
+    if audio.ndim > 1:
+        audio = librosa.to_mono(audio.T)
+    if sample_rate != target_sample_rate:
+        audio = librosa.resample(
+            audio, orig_sr=sample_rate, target_sr=target_sample_rate, res_type="soxr_vhq"
+        )
+    return audio.reshape(-1)
+
+
 def load_audio_infer(
     file,
     sample_rate,
+    input_sample_rate=None,
     **kwargs,
 ):
     formant_shifting = kwargs.get("formant_shifting", False)
@@ -75,14 +94,12 @@ def load_audio_infer(
             file = file.strip(" ").strip('"').strip("\n").strip('"').strip(" ")
             if not os.path.isfile(file):
                 raise FileNotFoundError(f"File not found: {file}")
-        
-        audio, sr = sf.read(file)
-        if len(audio.shape) > 1:
-            audio = librosa.to_mono(audio.T)
-        if sr != sample_rate:
-            audio = librosa.resample(
-                audio, orig_sr=sr, target_sr=sample_rate, res_type="soxr_vhq"
-            )
+
+        if isinstance(file, (str, os.PathLike)) or hasattr(file, "read"):
+            file, input_sample_rate = sf.read(file)
+        elif input_sample_rate is None:
+            raise ValueError("A sample rate is required for in-memory audio")
+        audio = to_audio_array(file, input_sample_rate, sample_rate)
         if formant_shifting:
             formant_qfrency = kwargs.get("formant_qfrency", 0.8)
             formant_timbre = kwargs.get("formant_timbre", 0.8)
@@ -98,7 +115,7 @@ def load_audio_infer(
             )
     except Exception as error:
         raise RuntimeError(f"An error occurred loading the audio: {error}")
-    return np.array(audio).flatten()
+    return np.asarray(audio).reshape(-1)
 
 
 def format_title(title):
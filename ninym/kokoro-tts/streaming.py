@@ -0,0 +1,43 @@
+import struct
+
+import numpy as np
+
+# RIFF and data chunk sizes are unknown while streaming; 0xFFFFFFFF is the
+# conventional "until end of stream" value that browsers and ffmpeg accept.
+STREAMING_SIZE = 0xFFFFFFFF
+
+
+def wav_header(
+    sample_rate: int, data_size: int, channels: int = 1, sample_width: int = 2
+) -> bytes:
+    byte_rate = sample_rate * channels * sample_width
+    riff_size = STREAMING_SIZE if data_size == STREAMING_SIZE else 36 + data_size
+    return (
+        b"RIFF"
+        + struct.pack("<I", riff_size)
+        + b"WAVEfmt "
+        + struct.pack(
+            "<IHHIIHH",
+            16,
+            1,  # PCM
+            channels,
+            sample_rate,
+            byte_rate,
+            channels * sample_width,
+            sample_width * 8,
+        )
+        + b"data"
+        + struct.pack("<I", data_size)
+    )
+
+
+def streaming_wav_header(sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    return wav_header(sample_rate, STREAMING_SIZE, channels, sample_width)
+
+
+def to_pcm16(audio: np.ndarray) -> bytes:
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def wav_bytes(pcm: bytes, sample_rate: int) -> bytes:
+    return wav_header(sample_rate, len(pcm)) + pcm
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+pipeline = pytest.importorskip("rvc_lite.pipeline")
+torch = pytest.importorskip("torch")
+
+
+def brute_force(query: np.ndarray, big: np.ndarray, k: int):
+    dists = ((query[:, None, :].astype(np.float64) - big[None, :, :]) ** 2).sum(axis=-1)
+    ix = np.argsort(dists, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(dists, ix, axis=1), ix
+
+
+def search(query: np.ndarray, big: np.ndarray, k: int = 8, **kwargs):
+    # The searches do not touch the pipeline's state
+    return pipeline.Pipeline._numpy_search(None, query, big, k=k, **kwargs)
+
+
+def torch_search(query: np.ndarray, big: np.ndarray, k: int = 8, **kwargs):
+    score, ix = pipeline.Pipeline._torch_search(
+        None, torch.from_numpy(query), torch.from_numpy(big), k=k, **kwargs
+    )
+    assert score.dtype == torch.float32 and ix.dtype == torch.long
+    return score.numpy(), ix.numpy()
+
+
+class BruteForceIndex:
+    """Stands in for the FAISS index, so both blends see the same neighbours."""
+
+    def __init__(self, big: np.ndarray):
+        self.big = big
+
+    def search(self, query: np.ndarray, k: int):
+        score, ix = brute_force(query, self.big, k)
+        return score.astype(np.float32), ix
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.mark.parametrize("block_bytes", [pipeline.SEARCH_BLOCK_BYTES, 4096, 1])
+@pytest.mark.parametrize("n, m", [(1, 50), (37, 500), (300, 64)])
+def test_numpy_search_matches_brute_force(rng, n, m, block_bytes):
+    query = rng.standard_normal((n, 16), dtype=np.float32)
+    big = rng.standard_normal((m, 16), dtype=np.float32)
+    score, ix = search(query, big, block_bytes=block_bytes)
+    expected_score, expected_ix = brute_force(query, big, 8)
+    assert score.dtype == np.float32 and ix.dtype == np.int64
+    np.testing.assert_array_equal(ix, expected_ix)
+    np.testing.assert_allclose(score, expected_score, rtol=1e-4, atol=1e-4)
+
+
+def test_numpy_search_pads_like_faiss_when_k_exceeds_index(rng):
+    query = rng.standard_normal((5, 16), dtype=np.float32)
+    big = rng.standard_normal((3, 16), dtype=np.float32)
+    score, ix = search(query, big, k=8)
+    expected_score, expected_ix = brute_force(query, big, 3)
+    assert score.shape == ix.shape == (5, 8)
+    np.testing.assert_array_equal(ix[:, :3], expected_ix)
+    np.testing.assert_allclose(score[:, :3], expected_score, rtol=1e-4, atol=1e-4)
+    assert (ix[:, 3:] == -1).all()
+    assert np.isinf(score[:, 3:]).all()
+
+
+def test_numpy_search_without_frames(rng):
+    score, ix = search(np.empty((0, 16), dtype=np.float32), rng.standard_normal((10, 16)).astype(np.float32))
+    assert score.shape == ix.shape == (0, 8)
+
+
+@pytest.mark.parametrize("block_bytes", [pipeline.SEARCH_BLOCK_BYTES, 4096, 1])
+@pytest.mark.parametrize("n, m", [(1, 50), (37, 500), (300, 64)])
+def test_torch_search_matches_numpy_search(rng, n, m, block_bytes):
+    query = rng.standard_normal((n, 16), dtype=np.float32)
+    big = rng.standard_normal((m, 16), dtype=np.float32)
+    score, ix = torch_search(query, big, block_bytes=block_bytes)
+    expected_score, expected_ix = search(query, big)
+    np.testing.assert_array_equal(ix, expected_ix)
+    np.testing.assert_allclose(score, expected_score, rtol=1e-4, atol=1e-4)
+
+
+def test_torch_search_uses_cached_norms(rng):
+    query = rng.standard_normal((20, 16), dtype=np.float32)
+    big = rng.standard_normal((100, 16), dtype=np.float32)
+    big_sq = torch.from_numpy(np.einsum("ij,ij->i", big, big))
+    score, ix = torch_search(query, big, big_sq=big_sq)
+    expected_score, expected_ix = torch_search(query, big)
+    np.testing.assert_array_equal(ix, expected_ix)
+    np.testing.assert_allclose(score, expected_score, rtol=1e-5, atol=1e-5)
+
+
+def test_torch_search_pads_like_numpy_search(rng):
+    query = rng.standard_normal((5, 16), dtype=np.float32)
+    big = rng.standard_normal((3, 16), dtype=np.float32)
+    score, ix = torch_search(query, big)
+    expected_score, expected_ix = search(query, big)
+    np.testing.assert_array_equal(ix, expected_ix)
+    np.testing.assert_allclose(score, expected_score, rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("m", [500, 5])
+def test_device_blend_matches_host_blend(rng, m):
+    converter = pipeline.Pipeline.__new__(pipeline.Pipeline)
+    converter.device = "cpu"
+    feats = rng.standard_normal((1, 40, 16), dtype=np.float32)
+    big = rng.standard_normal((m, 16), dtype=np.float32)
+    big_sq = np.einsum("ij,ij->i", big, big)
+
+    on_device = converter._retrieve_speaker_embeddings(
+        torch.from_numpy(feats), None, torch.from_numpy(big), torch.from_numpy(big_sq), 0.75
+    )
+    on_host = converter._retrieve_speaker_embeddings(
+        torch.from_numpy(feats), BruteForceIndex(big), big, big_sq, 0.75
+    )
+
+    score, ix = brute_force(feats[0], big, min(8, m))
+    weight = 1 / np.square(score)
+    weight /= weight.sum(axis=1, keepdims=True)
+    expected = 0.75 * (weight[:, :, None] * big[ix]).sum(axis=1) + 0.25 * feats[0]
+    for blended in (on_device, on_host):
+        assert tuple(blended.shape) == (1, 40, 16)
+        assert blended.dtype == torch.float32
+        np.testing.assert_allclose(blended.numpy()[0], expected, rtol=1e-4, atol=1e-4)
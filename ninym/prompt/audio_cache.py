@@ -0,0 +1,184 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Iterator
+
+CHUNK_SIZE = 64 * 1024
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def iter_chunks(data, chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start : start + chunk_size]
+
+
+class AudioCache:
+    """
+    Content-addressed cache for synthesized audio.
+
+    Entries are keyed by a hash of the normalized text, the voice and the
+    synthesis parameters. Recently used entries stay in memory up to
+    `memory_bytes`; every entry is also written to `directory`, where hits
+    are memory-mapped instead of read, and the least recently used files are
+    removed once the directory exceeds `disk_bytes`. Only entries of up to
+    `promote_bytes` are copied into memory; larger ones are always served
+    from their mapped file, so a hit never reads a whole file up front.
+
+    get() and put() touch the disk, so async callers should run them in a
+    thread.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        memory_bytes: int = 64 * 1024 * 1024,
+        disk_bytes: int | None = 1024 * 1024 * 1024,
+        promote_bytes: int = 256 * 1024,
+    ):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.promote_bytes = promote_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_used = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def key(text: str, voice: str, **params) -> str:
+        payload = json.dumps(
+            {"text": normalize_text(text), "voice": voice, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns the cached audio as bytes or a read-only mmap, or None.
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+            if key not in self._disk:
+                self.misses += 1
+                return None
+            self._disk.move_to_end(key)
+
+        try:
+            with open(self._path(key), "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Removed by another process or truncated on disk
+            with self._lock:
+                self._forget_disk(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if not data:
+            return
+
+        path = self._path(key)
+        # Unique across the processes and threads that may share the directory
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._forget_disk(key)
+            self._disk[key] = len(data)
+            self._disk_used += len(data)
+            self._evict_disk()
+            self._remember(key, data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_bytes": self._memory_used,
+                "disk_bytes": self._disk_used,
+                "entries": len(self._disk),
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.bin")
+
+    def _scan(self) -> None:
+        entries = []
+        # Only the two-level layout _path writes, so caches kept in
+        # subdirectories of this one are left alone
+        for prefix in os.listdir(self.directory):
+            root = os.path.join(self.directory, prefix)
+            if len(prefix) != 2 or not os.path.isdir(root):
+                continue
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    os.remove(path)
+                elif name.endswith(".bin"):
+                    stat = os.stat(path)
+                    entries.append((stat.st_atime, name[:-4], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_used += size
+        self._evict_disk()
+
+    def _remember(self, key: str, data) -> None:
+        size = len(data)
+        if size > min(self.memory_bytes, self.promote_bytes):
+            return
+        if key in self._memory:
+            self._memory_used -= len(self._memory.pop(key))
+        self._memory[key] = bytes(data)
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def _forget_disk(self, key: str) -> None:
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_used -= size
+
+    def _evict_disk(self) -> None:
+        if self.disk_bytes is None:
+            return
+        while self._disk_used > self.disk_bytes and len(self._disk) > 1:
+            key, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
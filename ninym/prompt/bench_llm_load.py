@@ -0,0 +1,183 @@
+"""
+Load test for time to first token as concurrent chat sessions go from 1 to 32.
+
+    python bench_llm_load.py
+    python bench_llm_load.py --sessions 1,8,32 --turns 20
+    python bench_llm_load.py --limit 8
+
+No Ollama server is needed. ChatStreamer is given a stub AsyncClient that
+answers after a fixed prompt-eval delay and then streams tokens at a fixed
+rate, as a server with enough parallel slots would. Each session runs
+`--turns` chats, pausing a random think time before each one. Latency is
+measured from when the chat was due to start, so time a session spends
+waiting for a blocked event loop counts against it.
+
+ChatStreamer lets `--limit` generations per model run at once, 4 by default
+like NINYM_LLM_MAX_CONCURRENCY, and queues the rest. For every concurrency
+level the report splits the p50/p99 time to first token into the queue wait,
+from when the chat was due until the stub was called, and what follows it.
+Fairness is reported per session: the mean time to first token of the
+slowest session over that of the fastest, and Jain's index of the sessions'
+means, which is 1 when every session waits the same.
+
+The "blocking" mode replays the old handler, which iterated the synchronous
+ollama.chat stream inside an async generator. Each token read holds the event
+loop, so one session's stream delays every other session's first token.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import llm
+from llm import ChatStreamer
+
+
+def make_chunk(content: str, done: bool = False):
+    return SimpleNamespace(message=SimpleNamespace(content=content), done=done)
+
+
+class StubAsyncClient:
+    def __init__(self, host=None, prompt_eval: float = 0.05, token_interval: float = 0.01, tokens: int = 20):
+        self.prompt_eval = prompt_eval
+        self.token_interval = token_interval
+        self.tokens = tokens
+
+    async def chat(self, model, messages, stream=True, on_start=None, **kwargs):
+        if on_start is not None:
+            on_start()
+
+        async def generate():
+            await asyncio.sleep(self.prompt_eval)
+            for i in range(self.tokens):
+                if i:
+                    await asyncio.sleep(self.token_interval)
+                yield make_chunk(f"token{i} ")
+            yield make_chunk("", done=True)
+
+        return generate()
+
+
+class StubClient(StubAsyncClient):
+    """The same timings through a blocking generator, like ollama.chat."""
+
+    def chat(self, model, messages, stream=True, on_start=None, **kwargs):
+        if on_start is not None:
+            on_start()
+        time.sleep(self.prompt_eval)
+        for i in range(self.tokens):
+            if i:
+                time.sleep(self.token_interval)
+            yield make_chunk(f"token{i} ")
+        yield make_chunk("", done=True)
+
+
+async def arrive(think: float) -> float:
+    """Sleeps a random think time and returns when the chat was due."""
+    delay = random.uniform(0, 2 * think)
+    due = time.perf_counter() + delay
+    await asyncio.sleep(delay)
+    return due
+
+
+class Turn:
+    """Queue wait and time to first token of one chat, from when it was due."""
+
+    def __init__(self, due: float):
+        self.due = due
+        self.wait = 0.0
+        self.first = None
+
+    def started(self) -> None:
+        self.wait = time.perf_counter() - self.due
+
+
+async def async_session(streamer: ChatStreamer, turns: int, think: float, results: list[Turn]) -> None:
+    for _ in range(turns):
+        turn = Turn(await arrive(think))
+        async for chunk in streamer.stream(model="ninym", messages=[], on_start=turn.started):
+            if turn.first is None and chunk.message.content:
+                turn.first = time.perf_counter() - turn.due
+        results.append(turn)
+
+
+async def blocking_session(client: StubClient, turns: int, think: float, results: list[Turn]) -> None:
+    for _ in range(turns):
+        turn = Turn(await arrive(think))
+        for chunk in client.chat(model="ninym", messages=[], stream=True, on_start=turn.started):
+            if turn.first is None and chunk.message.content:
+                turn.first = time.perf_counter() - turn.due
+            # StreamingResponse hands control back to the loop between chunks
+            await asyncio.sleep(0)
+        results.append(turn)
+
+
+async def run_level(mode: str, sessions: int, turns: int, think: float, limit: int, stub: dict) -> list[list[Turn]]:
+    results: list[list[Turn]] = [[] for _ in range(sessions)]
+    if mode == "async":
+        original = llm.AsyncClient
+        llm.AsyncClient = lambda host=None: StubAsyncClient(host, **stub)
+        try:
+            streamer = ChatStreamer(max_concurrent_per_model=limit)
+        finally:
+            llm.AsyncClient = original
+        runs = [async_session(streamer, turns, think, session) for session in results]
+    else:
+        client = StubClient(**stub)
+        runs = [blocking_session(client, turns, think, session) for session in results]
+    await asyncio.gather(*runs)
+    return results
+
+
+def percentile(values: list[float], q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def jain_index(values: list[float]) -> float:
+    return sum(values) ** 2 / (len(values) * sum(value * value for value in values))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time to first token under concurrent sessions")
+    parser.add_argument("--sessions", default="1,2,4,8,16,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--turns", type=int, default=5, help="Chats per session")
+    parser.add_argument("--prompt-eval", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="Seconds between tokens")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens per reply")
+    parser.add_argument("--think", type=float, default=0.5, help="Mean seconds between a session's chats")
+    parser.add_argument("--limit", type=int, default=4, help="Concurrent generations per model")
+    parser.add_argument("--mode", choices=["async", "blocking", "both"], default="both")
+    args = parser.parse_args()
+
+    stub = {"prompt_eval": args.prompt_eval, "token_interval": args.token_interval, "tokens": args.tokens}
+    modes = ["async", "blocking"] if args.mode == "both" else [args.mode]
+    levels = [int(level) for level in args.sessions.split(",")]
+
+    print(f"limit of {args.limit} concurrent generations per model (async mode)")
+    print(
+        f"{'mode':<10}{'sessions':>9}{'ttft p50':>10}{'ttft p99':>10}"
+        f"{'wait p50':>10}{'wait p99':>10}{'slowest/fastest':>17}{'jain':>7}"
+    )
+    for mode in modes:
+        for sessions in levels:
+            results = asyncio.run(run_level(mode, sessions, args.turns, args.think, args.limit, stub))
+            turns = [turn for session in results for turn in session]
+            firsts = [turn.first for turn in turns]
+            waits = [turn.wait for turn in turns]
+            means = [statistics.fmean(turn.first for turn in session) for session in results]
+            print(
+                f"{mode:<10}{sessions:>9}"
+                f"{percentile(firsts, 50) * 1000:>10.1f}{percentile(firsts, 99) * 1000:>10.1f}"
+                f"{percentile(waits, 50) * 1000:>10.1f}{percentile(waits, 99) * 1000:>10.1f}"
+                f"{max(means) / min(means):>17.2f}{jain_index(means):>7.3f}"
+            )
+    print("times in ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark for SqliteMessageStore against InMemoryMessageStore.
+
+    python bench_message_store.py
+    python bench_message_store.py --sessions 10000 --turns 5 --reads 20000
+
+Appends one user/assistant turn at a time across `--sessions` sessions, then
+reads random sessions back, and reports the throughput of each. The SQLite
+store runs on a temporary database with its usual background flush; its
+append time includes the final flush, so every message is on disk.
+
+A second table reads a single session as its history grows. SQLite reads
+only the replayed window, so read time should stay flat however long the
+session gets.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from stores.in_memory_store import InMemoryMessageStore
+from stores.sqlite_store import SqliteMessageStore
+
+
+def turn(i: int, size: int) -> list[dict]:
+    return [
+        {"role": "user", "content": f"question {i} ".ljust(size // 4, "q")},
+        {"role": "assistant", "content": f"answer {i} ".ljust(size, "a")},
+    ]
+
+
+def bench_appends(store, session_ids: list[str], turns: int, size: int) -> float:
+    start = time.perf_counter()
+    for i in range(turns):
+        for session_id in session_ids:
+            store.add_messages(session_id, turn(i, size))
+    if hasattr(store, "flush"):
+        store.flush()
+    return time.perf_counter() - start
+
+
+def bench_reads(store, session_ids: list[str], reads: int, rng: random.Random) -> float:
+    picks = [rng.choice(session_ids) for _ in range(reads)]
+    start = time.perf_counter()
+    for session_id in picks:
+        store.get_messages(session_id)
+    return time.perf_counter() - start
+
+
+def bench_depth(store, depths: list[int], reads: int, size: int) -> list[tuple[int, float]]:
+    results = []
+    added = 0
+    for depth in depths:
+        while added < depth:
+            store.add_messages("deep", turn(added, size))
+            added += 2
+        if hasattr(store, "flush"):
+            store.flush()
+        start = time.perf_counter()
+        for _ in range(reads):
+            store.get_messages("deep")
+        results.append((depth, (time.perf_counter() - start) / reads))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the message stores")
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--turns", type=int, default=5, help="Turns appended per session")
+    parser.add_argument("--reads", type=int, default=20_000)
+    parser.add_argument("--size", type=int, default=400, help="Characters per assistant reply")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    session_ids = [f"session-{i}" for i in range(args.sessions)]
+    messages = args.sessions * args.turns * 2
+
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {
+            "in-memory": InMemoryMessageStore(),
+            "sqlite": SqliteMessageStore(os.path.join(directory, "messages.db")),
+        }
+
+        print(f"{args.sessions} sessions, {messages} messages")
+        print(f"{'store':<11}{'appends/s':>12}{'reads/s':>12}")
+        for name, store in stores.items():
+            append_time = bench_appends(store, session_ids, args.turns, args.size)
+            read_time = bench_reads(store, session_ids, args.reads, random.Random(args.seed))
+            print(f"{name:<11}{messages / append_time:>12.0f}{args.reads / read_time:>12.0f}")
+
+        depths = [10, 100, 1_000, 10_000]
+        print()
+        print(f"{'store':<11}" + "".join(f"{f'{depth} msgs (us)':>18}" for depth in depths))
+        for name, store in stores.items():
+            results = bench_depth(store, depths, 200, args.size)
+            print(f"{name:<11}" + "".join(f"{seconds * 1e6:>18.1f}" for _, seconds in results))
+
+        stores["sqlite"].close()
+
+
+if __name__ == "__main__":
+    main()
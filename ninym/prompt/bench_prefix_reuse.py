@@ -0,0 +1,203 @@
+"""
+Replays a 50-turn conversation with prompt-prefix reuse on and off.
+
+    python bench_prefix_reuse.py
+    python bench_prefix_reuse.py --turns 100 --instances 1 --prompt-rate 2000
+
+No Ollama server is needed. Each instance is a stub runner that keeps the
+tokens of its last request in a KV cache, like an Ollama runner: a new
+prompt only pays prompt evaluation for the tokens after the longest prefix
+it shares with the cache, at `--prompt-rate` tokens per second. The stub
+reports prompt_eval_count and prompt_eval_duration on the final chunk the
+way Ollama does, and the turns go through ChatStreamer, SessionTracker and
+SqliteMessageStore as in the server.
+
+"on" is the server as it is: the SQLite store moves its window start in
+half-limit steps and the session stays pinned to one instance. "off" is how
+it behaved before: the window slides by one message every turn once the
+history is full, and turns are spread round-robin across instances. Time to
+first token is measured from reading the history to the first streamed
+token. keep_alive is not modelled; it only matters after an idle gap longer
+than Ollama's default of five minutes.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+import llm
+from llm import ChatStreamer, GenerationStats
+from sessions import SessionTracker
+from stores.sqlite_store import SqliteMessageStore
+
+WORDS = (
+    "the voice model runs on a small GPU and streams audio back while the reply "
+    "is still being written so every turn adds a little more context to replay"
+).split()
+
+
+class SlidingWindowStore(SqliteMessageStore):
+    """The replay window before prefix reuse: the last `history_limit` messages."""
+
+    def _window_size(self, total: int) -> int:
+        return min(total, self.history_limit)
+
+
+def tokenize(messages: list[dict], system_tokens: int) -> list[str]:
+    tokens = [f"<system{i}>" for i in range(system_tokens)]
+    for message in messages:
+        tokens.append(f"<{message['role']}>")
+        tokens.extend(message["content"].split())
+    return tokens
+
+
+class StubRunner:
+    """One Ollama instance with a single cache slot."""
+
+    def __init__(self, prompt_rate: float, token_interval: float, reply_words: int, system_tokens: int):
+        self.prompt_rate = prompt_rate
+        self.token_interval = token_interval
+        self.reply_words = reply_words
+        self.system_tokens = system_tokens
+        self.cached: list[str] = []
+        self.rng = random.Random(0)
+
+    async def chat(self, model, messages, stream=True, **kwargs):
+        tokens = tokenize(messages, self.system_tokens)
+        reused = 0
+        for cached, token in zip(self.cached, tokens):
+            if cached != token:
+                break
+            reused += 1
+        # The last prompt token is always evaluated to start generating
+        evaluated = max(1, len(tokens) - reused)
+        prompt_eval = evaluated / self.prompt_rate
+        reply = [self.rng.choice(WORDS) for _ in range(self.reply_words)]
+        self.cached = tokens + ["<assistant>"] + reply
+
+        async def generate():
+            await asyncio.sleep(prompt_eval)
+            for i, word in enumerate(reply):
+                if i:
+                    await asyncio.sleep(self.token_interval)
+                yield SimpleNamespace(message=SimpleNamespace(content=word + " "), done=False)
+            yield SimpleNamespace(
+                message=SimpleNamespace(content=""),
+                done=True,
+                prompt_eval_count=evaluated,
+                prompt_eval_duration=prompt_eval * 1e9,
+                eval_count=len(reply),
+                eval_duration=self.token_interval * len(reply) * 1e9,
+            )
+
+        return generate()
+
+
+async def replay(reuse: bool, args, directory: str) -> list[tuple[float, GenerationStats]]:
+    runners = {
+        f"stub{i}": StubRunner(args.prompt_rate, args.token_interval, args.reply_words, args.system_tokens)
+        for i in range(args.instances)
+    }
+    original = llm.AsyncClient
+    llm.AsyncClient = lambda host=None: runners[host]
+    try:
+        streamer = ChatStreamer(hosts=list(runners))
+    finally:
+        llm.AsyncClient = original
+
+    store_class = SqliteMessageStore if reuse else SlidingWindowStore
+    store = store_class(
+        os.path.join(directory, f"reuse-{reuse}.db"), history_limit=args.history_limit
+    )
+    tracker = SessionTracker(instances=args.instances)
+    rng = random.Random(args.seed)
+    results = []
+    try:
+        for turn in range(args.turns):
+            prompt = " ".join(rng.choice(WORDS) for _ in range(args.prompt_words))
+            start = time.perf_counter()
+            messages = store.get_messages("replay")
+            instance = tracker.get("replay").instance if reuse else turn
+            first = None
+            parts = []
+            stats = GenerationStats()
+            async for chunk in streamer.stream(
+                model="ninym",
+                messages=messages + [{"role": "user", "content": prompt}],
+                instance=instance,
+            ):
+                if chunk.message.content:
+                    if first is None:
+                        first = time.perf_counter() - start
+                    parts.append(chunk.message.content)
+                if chunk.done:
+                    stats = GenerationStats.from_chunk(chunk)
+            store.add_messages(
+                "replay",
+                [
+                    {"role": "user", "content": prompt},
+                    {"role": "assistant", "content": "".join(parts).strip()},
+                ],
+            )
+            results.append((first, stats))
+    finally:
+        store.close()
+    return results
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a conversation with prefix reuse on and off")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--instances", type=int, default=2, help="Ollama instances (OLLAMA_HOSTS)")
+    parser.add_argument("--history-limit", type=int, default=50, help="Messages replayed per turn")
+    parser.add_argument("--prompt-rate", type=float, default=4000, help="Prompt tokens evaluated per second")
+    parser.add_argument("--token-interval", type=float, default=0.001, help="Seconds between reply tokens")
+    parser.add_argument("--system-tokens", type=int, default=300, help="Tokens in the modelfile system prompt")
+    parser.add_argument("--prompt-words", type=int, default=15)
+    parser.add_argument("--reply-words", type=int, default=40)
+    parser.add_argument("--every", type=int, default=5, help="Print every Nth turn")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        runs = {
+            "off": asyncio.run(replay(False, args, directory)),
+            "on": asyncio.run(replay(True, args, directory)),
+        }
+
+    print(f"{args.turns} turns, {args.instances} instance(s), window of {args.history_limit} messages")
+    print(f"{'turn':>6}" + "".join(f"{f'{mode} evald':>12}{f'{mode} ttft (ms)':>16}" for mode in runs))
+    for turn in range(args.turns):
+        if (turn + 1) % args.every and turn + 1 != args.turns:
+            continue
+        row = f"{turn + 1:>6}"
+        for results in runs.values():
+            first, stats = results[turn]
+            row += f"{stats.prompt_eval_count:>12}{first * 1000:>16.1f}"
+        print(row)
+
+    print()
+    print(
+        f"{'reuse':<7}{'prompt tokens':>15}{'prompt eval (s)':>17}"
+        f"{'ttft p50 (ms)':>15}{'ttft p99 (ms)':>15}"
+    )
+    for mode, results in runs.items():
+        firsts = [first for first, _ in results]
+        print(
+            f"{mode:<7}{sum(stats.prompt_eval_count for _, stats in results):>15}"
+            f"{sum(stats.prompt_eval_duration for _, stats in results):>17.2f}"
+            f"{percentile(firsts, 50) * 1000:>15.1f}{percentile(firsts, 99) * 1000:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
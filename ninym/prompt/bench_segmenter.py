@@ -0,0 +1,111 @@
+"""
+Micro-benchmark for SentenceSegmenter on 10k-token streamed responses.
+
+    python bench_segmenter.py
+    python bench_segmenter.py --tokens 50000 --repeat 5
+
+Each response is fed token by token, the way the voice reader receives it
+from Ollama, and compared with the loop the reader used before: append the
+token to a buffer, then SENTENCE_END.search and a full finditer over the
+whole buffer, with the reply built by string concatenation.
+
+"prose" has a sentence end every few tokens. "run-on" has none for
+thousands of tokens (long lists, code), which is where rescanning the
+buffer on every token turns quadratic.
+"""
+
+import argparse
+import random
+import re
+import time
+
+from segmenter import SentenceSegmenter
+
+SENTENCE_END = re.compile(r"[.!?]+")
+
+PROSE_WORDS = (
+    "the voice model runs on a small GPU and streams audio back while the reply "
+    "is still being written by the language model"
+).split()
+SENTENCE_ENDS = [". ", "! ", "? "]
+
+
+def prose_tokens(count: int, rng: random.Random) -> list[str]:
+    tokens = []
+    while len(tokens) < count:
+        sentence = rng.choices(PROSE_WORDS, k=rng.randint(6, 24))
+        for word in sentence[:-1]:
+            tokens.append(word + " ")
+        if rng.random() < 0.1:
+            tokens += ["Dr. ", "Smith ", "measured ", "3.14 ", "seconds"]
+        tokens.append(sentence[-1] + rng.choice(SENTENCE_ENDS))
+    return tokens[:count]
+
+
+def run_on_tokens(count: int, rng: random.Random) -> list[str]:
+    return [rng.choice(PROSE_WORDS) + rng.choice([", ", " "]) for _ in range(count)]
+
+
+def old_loop(tokens: list[str]) -> int:
+    sentences = 0
+    sentence_buffer = ""
+    assistant_content = ""
+    for content in tokens:
+        assistant_content += content
+        sentence_buffer += content
+        if SENTENCE_END.search(sentence_buffer):
+            matches = list(SENTENCE_END.finditer(sentence_buffer))
+            if matches:
+                sentence_buffer = sentence_buffer[matches[-1].end() :]
+                sentences += 1
+    if sentence_buffer.strip():
+        sentences += 1
+    return sentences
+
+
+def segmenter_loop(tokens: list[str]) -> int:
+    segments = []
+    parts = []
+    segmenter = SentenceSegmenter(segments.append)
+    for content in tokens:
+        parts.append(content)
+        segmenter.feed(content)
+    segmenter.flush()
+    assistant_content = "".join(parts)
+    return len(segments)
+
+
+def best_of(fn, tokens: list[str], repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(tokens)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the sentence segmenter")
+    parser.add_argument("--tokens", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = {
+        "prose": prose_tokens(args.tokens, rng),
+        "run-on": run_on_tokens(args.tokens, rng),
+    }
+
+    print(f"{'case':<8}{'impl':<11}{'total (ms)':>12}{'per token (us)':>16}{'segments':>10}")
+    for name, tokens in cases.items():
+        for impl, fn in (("old", old_loop), ("segmenter", segmenter_loop)):
+            seconds, segments = best_of(fn, tokens, args.repeat)
+            print(
+                f"{name:<8}{impl:<11}{seconds * 1000:>12.2f}"
+                f"{seconds / len(tokens) * 1e6:>16.2f}{segments:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
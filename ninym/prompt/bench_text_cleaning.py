@@ -0,0 +1,148 @@
+"""
+Benchmark for clean_text_for_tts on large markdown-heavy responses.
+
+    python bench_text_cleaning.py
+    python bench_text_cleaning.py --size 200000 --repeat 10
+
+The shared cleaner compiles its patterns once, removes emojis in one pass
+and strips all markdown in another. It is compared with the function it
+replaced (copied below), which compiled the emoji regex on every call and
+made about 15 re.sub passes. Both are run over whole responses and over
+sentence-sized segments.
+
+"streamed" is the voice path: it used to clean each segment the segmenter
+produced, and now runs StreamingTextCleaner over the tokens as they arrive
+(4 characters each here). Its calls column counts tokens.
+"""
+
+import argparse
+import random
+import re
+import time
+import unicodedata
+
+from text_cleaning import StreamingTextCleaner, clean_text_for_tts
+
+BLOCKS = [
+    "## Setting up the server\n\n",
+    "The **voice model** runs on the *GPU* and streams `PCM` frames back. ",
+    "See [the docs](https://example.com/docs) for details. ",
+    "- first item with __bold__ text\n- second item with ~~old~~ new text\n",
+    "1. Install the package\n2. Start the server\n3. Open the page\n",
+    "> Quoted advice that goes on for a while.\n",
+    "```python\nfor i in range(10):\n    print(i)\n```\n",
+    "That works well 😀🚀 and keeps latency low. ",
+    "\n---\n",
+    "Plain sentences make up most of a reply, so they matter most. ",
+]
+
+
+def old_clean_text_for_tts(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+
+    emoji_pattern = re.compile(
+        "["
+        "\U0001f600-\U0001f64f"  # emoticons
+        "\U0001f300-\U0001f5ff"  # symbols & pictographs
+        "\U0001f680-\U0001f6ff"  # transport & map symbols
+        "\U0001f1e0-\U0001f1ff"  # flags
+        "\U00002702-\U000027b0"  # dingbats
+        "\U000024c2-\U0001f251"  # enclosed characters
+        "\U0001f926-\U0001f937"  # additional emoticons
+        "\U00010000-\U0010ffff"  # additional unicode
+        "\u2640-\u2642"  # gender symbols
+        "\u2600-\u2b55"  # misc symbols
+        "\u200d"  # zero width joiner
+        "\u23cf"  # eject symbol
+        "\u23e9"  # fast forward
+        "\u231a"  # watch
+        "\ufe0f"  # dingbats
+        "\u3030"  # wavy dash
+        "]+",
+        flags=re.UNICODE,
+    )
+    text = emoji_pattern.sub("", text)
+
+    text = re.sub(r"\*\*(.+?)\*\*", r"\1", text)
+    text = re.sub(r"\*(.+?)\*", r"\1", text)
+    text = re.sub(r"__(.+?)__", r"\1", text)
+    text = re.sub(r"_(.+?)_", r"\1", text)
+    text = re.sub(r"~~(.+?)~~", r"\1", text)
+    text = re.sub(r"`(.+?)`", r"\1", text)
+
+    text = re.sub(r"^#{1,6}\s+", "", text, flags=re.MULTILINE)
+
+    text = re.sub(r"^[-*+]\s+", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^\d+\.\s+", "", text, flags=re.MULTILINE)
+
+    text = re.sub(r"^>\s+", "", text, flags=re.MULTILINE)
+
+    text = re.sub(r"```[\s\S]*?```", "", text)
+    text = re.sub(r"```.*", "", text)
+
+    text = re.sub(r"\[([^\]]+)\]\([^\)]+\)", r"\1", text)
+
+    text = re.sub(r"^\s*[-*_]{3,}\s*$", "", text, flags=re.MULTILINE)
+
+    text = re.sub(r"\s+", " ", text)
+
+    text = text.strip()
+
+    return text
+
+
+def make_response(size: int, rng: random.Random) -> str:
+    parts = []
+    length = 0
+    while length < size:
+        block = rng.choice(BLOCKS)
+        parts.append(block)
+        length += len(block)
+    return "".join(parts)
+
+
+def clean_streamed(text: str) -> None:
+    cleaner = StreamingTextCleaner()
+    for i in range(0, len(text), 4):
+        cleaner.feed(text[i : i + 4])
+    cleaner.flush()
+
+
+def best_of(fn, inputs: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in inputs:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark clean_text_for_tts")
+    parser.add_argument("--size", type=int, default=50_000, help="Characters per response")
+    parser.add_argument("--responses", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    responses = [make_response(args.size, rng) for _ in range(args.responses)]
+    # The voice path cleans one segment at a time
+    segments = [block for text in responses for block in text.split("\n\n") if block]
+    cases = {"responses": responses, "segments": segments}
+
+    print(f"{'case':<11}{'calls':>8}{'old (ms)':>12}{'new (ms)':>12}{'speedup':>10}")
+    for name, inputs in cases.items():
+        old = best_of(old_clean_text_for_tts, inputs, args.repeat)
+        new = best_of(clean_text_for_tts, inputs, args.repeat)
+        print(f"{name:<11}{len(inputs):>8}{old * 1000:>12.1f}{new * 1000:>12.1f}{old / new:>9.1f}x")
+
+    old = best_of(old_clean_text_for_tts, segments, args.repeat)
+    new = best_of(clean_streamed, responses, args.repeat)
+    tokens = sum(-(-len(text) // 4) for text in responses)
+    print(f"{'streamed':<11}{tokens:>8}{old * 1000:>12.1f}{new * 1000:>12.1f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
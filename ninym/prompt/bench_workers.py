@@ -0,0 +1,236 @@
+"""
+Throughput of the prompt server as the number of worker processes grows.
+
+    python bench_workers.py
+    python bench_workers.py --workers 1,2,4 --clients 32 --duration 30
+    python bench_workers.py --endpoint prompt --ollama http://gpu-box:11434
+
+Run from this directory with the server requirements and the Piper voices
+installed. For every worker count, serve.py is started on `--port` (one
+worker runs main.py directly, more run behind router.py), `--clients`
+concurrent sessions send prompts back to back for `--duration` seconds, and
+requests per second and p50/p99 latency are reported. Latency runs from
+sending the request to the last byte of the response, and every client keeps
+its own sessionId, so the router spreads sessions over the workers as it
+would for real users.
+
+By default Ollama is replaced by a stub HTTP server in its own process that
+answers /api/chat after `--prompt-eval` seconds and streams `--reply-words`
+words at `--token-interval`, with unlimited parallel slots. What is left is
+the work the prompt server does itself: the message store, text cleaning,
+segmenting and, on voicePrompt, Piper synthesis, which is what more workers
+are meant to spread over more cores. NINYM_LLM_MAX_CONCURRENCY is raised to
+the number of clients so the per-worker LLM limit does not cap the single
+worker run. The audio cache is switched off because the stub repeats its
+replies. Pass `--ollama` to measure against a real server instead.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WORDS = (
+    "the voice model runs on a small GPU and streams audio back while the reply "
+    "is still being written. every sentence is cleaned, split and synthesized "
+    "on the prompt server, which is the part that more workers should spread out."
+).split()
+
+
+def run_stub_ollama(port: int, prompt_eval: float, token_interval: float, reply_words: int) -> None:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            rng = random.Random()
+            time.sleep(prompt_eval)
+            for i in range(reply_words):
+                if i:
+                    time.sleep(token_interval)
+                self.send_chunk(body["model"], rng.choice(WORDS) + " ", done=False)
+            self.send_chunk(body["model"], "", done=True)
+            self.wfile.write(b"0\r\n\r\n")
+
+        def send_chunk(self, model: str, content: str, done: bool) -> None:
+            chunk = {
+                "model": model,
+                "created_at": "1970-01-01T00:00:00Z",
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+            }
+            if done:
+                chunk.update(
+                    done_reason="stop",
+                    prompt_eval_count=1,
+                    prompt_eval_duration=int(prompt_eval * 1e9),
+                    eval_count=reply_words,
+                    eval_duration=int(token_interval * reply_words * 1e9),
+                )
+            line = json.dumps(chunk).encode() + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+
+    ThreadingHTTPServer.daemon_threads = True
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(server: subprocess.Popen, url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError(f"serve.py exited during startup with code {server.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("Timed out waiting for serve.py to start")
+        time.sleep(0.2)
+
+
+def stop(server: subprocess.Popen) -> None:
+    server.terminate()
+    try:
+        server.wait(timeout=20)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def client(http: httpx.AsyncClient, args, deadline: float, latencies: list[float], errors: list[int]) -> None:
+    session_id = str(uuid.uuid4())
+    rng = random.Random(session_id)
+    while time.perf_counter() < deadline:
+        body = {"prompt": " ".join(rng.choice(WORDS) for _ in range(12)), "sessionId": session_id}
+        start = time.perf_counter()
+        try:
+            async with http.stream("POST", f"/api/chat/{args.endpoint}", json=body) as response:
+                async for _ in response.aiter_bytes():
+                    pass
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+                    continue
+        except httpx.HTTPError:
+            errors.append(0)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def load(args) -> tuple[list[float], list[int], float]:
+    latencies: list[float] = []
+    errors: list[int] = []
+    limits = httpx.Limits(max_connections=args.clients)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=120
+    ) as http:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(client(http, args, start + args.duration, latencies, errors) for _ in range(args.clients))
+        )
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure prompt server throughput against worker count")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent sessions")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load per worker count")
+    parser.add_argument("--endpoint", choices=["voicePrompt", "prompt"], default="voicePrompt")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ollama", help="Use this Ollama server instead of the stub")
+    parser.add_argument("--prompt-eval", type=float, default=0.05, help="Stub seconds before the first token")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="Stub seconds between tokens")
+    parser.add_argument("--reply-words", type=int, default=60, help="Stub words per reply")
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    args = parser.parse_args()
+
+    stub = None
+    ollama = args.ollama
+    if ollama is None:
+        stub_port = free_port()
+        stub = multiprocessing.Process(
+            target=run_stub_ollama,
+            args=(stub_port, args.prompt_eval, args.token_interval, args.reply_words),
+            daemon=True,
+        )
+        stub.start()
+        ollama = f"http://127.0.0.1:{stub_port}"
+
+    data_dir = tempfile.mkdtemp(prefix="ninym-bench-")
+    print(f"{args.clients} clients on /api/chat/{args.endpoint} for {args.duration:g}s per run")
+    print(f"{'workers':>8}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 (ms)':>11}{'p99 (ms)':>11}")
+    try:
+        for workers in [int(n) for n in args.workers.split(",")]:
+            env = dict(
+                os.environ,
+                OLLAMA_HOST=ollama,
+                OLLAMA_HOSTS="",
+                NINYM_MESSAGE_STORE="sqlite",
+                NINYM_SQLITE_PATH=os.path.join(data_dir, f"messages-{workers}.db"),
+                NINYM_AUDIO_CACHE_DIR="",
+                NINYM_LLM_MAX_CONCURRENCY=str(args.clients),
+                NINYM_LOG_LEVEL="WARNING",
+            )
+            server = subprocess.Popen(
+                [sys.executable, "serve.py", "--workers", str(workers), "--host", "127.0.0.1",
+                 "--port", str(args.port)],
+                cwd=BASE_DIR,
+                env=env,
+            )
+            try:
+                wait_until_ready(
+                    server, f"http://127.0.0.1:{args.port}/api/chat/voices", args.startup_timeout
+                )
+                latencies, errors, elapsed = asyncio.run(load(args))
+            finally:
+                stop(server)
+
+            p50 = f"{percentile(latencies, 50) * 1000:.0f}" if len(latencies) > 1 else "-"
+            p99 = f"{percentile(latencies, 99) * 1000:.0f}" if len(latencies) > 1 else "-"
+            print(
+                f"{workers:>8}{len(latencies):>10}{len(errors):>8}"
+                f"{len(latencies) / elapsed:>9.1f}{p50:>11}{p99:>11}"
+            )
+    finally:
+        if stub is not None:
+            stub.terminate()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import asyncio
+from contextlib import suppress
+from typing import AsyncIterator, Awaitable, TypeVar
+
+from fastapi import Request
+
+T = TypeVar("T")
+
+POLL_INTERVAL = 0.25
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def wait_for_disconnect(request: Request, poll_interval: float = POLL_INTERVAL) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_interval)
+
+
+async def until_disconnected(
+    request: Request, source: AsyncIterator[T], poll_interval: float = POLL_INTERVAL
+) -> AsyncIterator[T]:
+    """
+    Yields from `source` until it is exhausted or the client goes away.
+
+    On disconnect the pending step of `source` is cancelled, so whatever it
+    was awaiting (an Ollama chunk, a TTS job) is abandoned immediately, and
+    `source` is closed so its cleanup runs.
+    """
+    watcher = asyncio.create_task(wait_for_disconnect(request, poll_interval))
+    step = None
+    try:
+        while True:
+            step = asyncio.ensure_future(source.__anext__())
+            await asyncio.wait({step, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                return
+            try:
+                item = step.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        watcher.cancel()
+        if step is not None and not step.done():
+            step.cancel()
+            with suppress(asyncio.CancelledError, StopAsyncIteration):
+                await step
+        await source.aclose()
+
+
+async def run_until_disconnected(
+    request: Request, awaitable: Awaitable[T], poll_interval: float = POLL_INTERVAL
+) -> T:
+    """
+    Awaits `awaitable`, cancelling it and raising ClientDisconnected if the
+    client goes away first.
+    """
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.create_task(wait_for_disconnect(request, poll_interval))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+            raise ClientDisconnected()
+        return task.result()
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
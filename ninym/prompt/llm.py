@@ -0,0 +1,95 @@
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from ollama import AsyncClient
+
+
+@dataclass
+class GenerationStats:
+    """Timings Ollama reports on the final chunk of a chat stream."""
+
+    prompt_eval_count: int = 0
+    prompt_eval_duration: float = 0.0
+    eval_count: int = 0
+    eval_duration: float = 0.0
+    load_duration: float = 0.0
+    total_duration: float = 0.0
+
+    @classmethod
+    def from_chunk(cls, chunk) -> "GenerationStats":
+        # Durations come in nanoseconds; fields are missing on cancelled runs
+        return cls(
+            prompt_eval_count=getattr(chunk, "prompt_eval_count", None) or 0,
+            prompt_eval_duration=(getattr(chunk, "prompt_eval_duration", None) or 0) / 1e9,
+            eval_count=getattr(chunk, "eval_count", None) or 0,
+            eval_duration=(getattr(chunk, "eval_duration", None) or 0) / 1e9,
+            load_duration=(getattr(chunk, "load_duration", None) or 0) / 1e9,
+            total_duration=(getattr(chunk, "total_duration", None) or 0) / 1e9,
+        )
+
+
+class ChatStreamer:
+    """
+    Streams Ollama chat completions without blocking the event loop.
+
+    Every model gets its own FIFO semaphore, so at most
+    `max_concurrent_per_model` generations run against it at once and the rest
+    wait their turn in arrival order instead of starving each other.
+
+    Requests always carry the same `keep_alive` and `options`, so Ollama keeps
+    a single runner loaded per model and can reuse its cached prompt prefix
+    across turns. With several `hosts`, callers pick one through `instance`
+    and should keep a session on the same host for the same reason.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_per_model: int = 4,
+        hosts: list[str | None] | None = None,
+        keep_alive: str | None = "30m",
+        options: dict | None = None,
+    ):
+        self._clients = [AsyncClient(host=host) for host in hosts or [None]]
+        self.max_concurrent_per_model = max_concurrent_per_model
+        self.keep_alive = keep_alive
+        self.options = options
+        self._limits: dict[tuple[int, str], asyncio.Semaphore] = {}
+        self._waiting: dict[str, int] = {}
+
+    @property
+    def instances(self) -> int:
+        return len(self._clients)
+
+    def _limit(self, instance: int, model: str) -> asyncio.Semaphore:
+        key = (instance, model)
+        if key not in self._limits:
+            self._limits[key] = asyncio.Semaphore(self.max_concurrent_per_model)
+        return self._limits[key]
+
+    def waiting(self) -> dict[str, int]:
+        return dict(self._waiting)
+
+    async def stream(
+        self, model: str, messages: list[dict], instance: int = 0, **kwargs
+    ) -> AsyncIterator:
+        instance %= len(self._clients)
+        limit = self._limit(instance, model)
+        self._waiting[model] = self._waiting.get(model, 0) + 1
+        try:
+            await limit.acquire()
+        finally:
+            self._waiting[model] -= 1
+
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        if self.options is not None:
+            kwargs.setdefault("options", self.options)
+
+        try:
+            stream = await self._clients[instance].chat(
+                model=model, messages=messages, stream=True, **kwargs
+            )
+            async for chunk in stream:
+                yield chunk
+        finally:
+            limit.release()
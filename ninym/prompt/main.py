@@ -1,78 +1,182 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import ollama
 import json
 import wave
-import re
 import uuid
-from piper import PiperVoice, SynthesisConfig
+from piper import SynthesisConfig
 import io
 import asyncio
+from contextlib import asynccontextmanager, suppress
+from concurrent.futures import ThreadPoolExecutor
 import time
-import unicodedata
-
-
-def clean_text_for_tts(text: str) -> str:
-    text = unicodedata.normalize("NFKC", text)
-
-    emoji_pattern = re.compile(
-        "["
-        "\U0001f600-\U0001f64f"  # emoticons
-        "\U0001f300-\U0001f5ff"  # symbols & pictographs
-        "\U0001f680-\U0001f6ff"  # transport & map symbols
-        "\U0001f1e0-\U0001f1ff"  # flags
-        "\U00002702-\U000027b0"  # dingbats
-        "\U000024c2-\U0001f251"  # enclosed characters
-        "\U0001f926-\U0001f937"  # additional emoticons
-        "\U00010000-\U0010ffff"  # additional unicode
-        "\u2640-\u2642"  # gender symbols
-        "\u2600-\u2b55"  # misc symbols
-        "\u200d"  # zero width joiner
-        "\u23cf"  # eject symbol
-        "\u23e9"  # fast forward
-        "\u231a"  # watch
-        "\ufe0f"  # dingbats
-        "\u3030"  # wavy dash
-        "]+",
-        flags=re.UNICODE,
+import os
+import logging
+
+
+from storage import AsyncMessageStore, MessageStore
+from stores.bounded_memory_store import BoundedMessageStore
+from stores.sqlite_store import SqliteMessageStore
+from stores.async_adapter import SyncStoreAdapter
+from voices import VOICES, VoiceRegistry, UnknownVoiceError
+from llm import ChatStreamer, GenerationStats
+from sessions import SessionTracker
+from synthesis import SentencePipeline, busy_time, streaming_wav_header
+from segmenter import SentenceSegmenter
+from text_cleaning import StreamingTextCleaner
+from audio_cache import AudioCache
+from disconnect import until_disconnected
+import metrics
+
+logging.basicConfig(
+    level=os.environ.get("NINYM_LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger("ninym.prompt")
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Every worker loads its voices before taking traffic, so no request pays
+    # for the ONNX load
+    preload = [
+        voice_id
+        for voice_id in os.environ.get("NINYM_PRELOAD_VOICES", "").split(",")
+        if voice_id
+    ]
+    await asyncio.to_thread(voice_registry.preload, preload or None)
+    yield
+    tts_executor.shutdown(wait=False, cancel_futures=True)
+    if hasattr(store, "close"):
+        store.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(metrics.router)
+
+store: MessageStore
+if os.environ.get("NINYM_MESSAGE_STORE") == "sqlite":
+    store = SqliteMessageStore(os.environ.get("NINYM_SQLITE_PATH", "messages.db"))
+else:
+    store = BoundedMessageStore(
+        max_sessions=int(os.environ.get("NINYM_MAX_SESSIONS", "1000")),
+        session_ttl=float(os.environ.get("NINYM_SESSION_TTL", "3600")),
+        context_token_budget=int(os.environ.get("NINYM_CONTEXT_TOKENS", "4096")),
     )
-    text = emoji_pattern.sub("", text)
-
-    text = re.sub(r"\*\*(.+?)\*\*", r"\1", text)
-    text = re.sub(r"\*(.+?)\*", r"\1", text)
-    text = re.sub(r"__(.+?)__", r"\1", text)
-    text = re.sub(r"_(.+?)_", r"\1", text)
-    text = re.sub(r"~~(.+?)~~", r"\1", text)
-    text = re.sub(r"`(.+?)`", r"\1", text)
-
-    text = re.sub(r"^#{1,6}\s+", "", text, flags=re.MULTILINE)
-
-    text = re.sub(r"^[-*+]\s+", "", text, flags=re.MULTILINE)
-    text = re.sub(r"^\d+\.\s+", "", text, flags=re.MULTILINE)
 
-    text = re.sub(r"^>\s+", "", text, flags=re.MULTILINE)
+message_store: AsyncMessageStore = SyncStoreAdapter(
+    store, offload=isinstance(store, SqliteMessageStore)
+)
 
-    text = re.sub(r"```[\s\S]*?```", "", text)
-    text = re.sub(r"```.*", "", text)
+voice_registry = VoiceRegistry(
+    VOICES,
+    memory_budget_bytes=int(os.environ.get("NINYM_VOICE_MEMORY_MB", "512")) * 1024 * 1024,
+)
 
-    text = re.sub(r"\[([^\]]+)\]\([^\)]+\)", r"\1", text)
+# "wav" sends one complete WAV file per sentence, "wav-stream" sends a single
+# streaming header followed by raw frames, "pcm" sends headerless s16le frames.
+# audio/L16 is big-endian (RFC 2586), so "pcm" goes out as plain bytes and the
+# format is described in X-Sample-Rate, X-Sample-Format and X-Channels.
+AUDIO_FORMATS = {
+    "wav": "audio/wav",
+    "wav-stream": "audio/wav",
+    "pcm": "application/octet-stream",
+}
+
+# The first segment goes out at the first sentence end; later ones are batched
+SEGMENT_FIRST_MIN_LENGTH = int(os.environ.get("NINYM_SEGMENT_FIRST_MIN_LENGTH", "0"))
+SEGMENT_MIN_LENGTH = int(os.environ.get("NINYM_SEGMENT_MIN_LENGTH", "60"))
+SEGMENT_MAX_LENGTH = int(os.environ.get("NINYM_SEGMENT_MAX_LENGTH", "400"))
+
+TTS_MAX_PENDING = int(os.environ.get("NINYM_TTS_MAX_PENDING", "4"))
+tts_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("NINYM_TTS_WORKERS", "2")),
+    thread_name_prefix="piper",
+)
 
-    text = re.sub(r"^\s*[-*_]{3,}\s*$", "", text, flags=re.MULTILINE)
+# Set NINYM_AUDIO_CACHE_DIR to an empty string to disable the sentence cache
+AUDIO_CACHE_DIR = os.environ.get("NINYM_AUDIO_CACHE_DIR", "audio_cache")
+audio_cache = (
+    AudioCache(
+        AUDIO_CACHE_DIR,
+        memory_bytes=int(os.environ.get("NINYM_AUDIO_CACHE_MB", "64")) * 1024 * 1024,
+        disk_bytes=int(os.environ.get("NINYM_AUDIO_CACHE_DISK_MB", "1024")) * 1024 * 1024,
+    )
+    if AUDIO_CACHE_DIR
+    else None
+)
 
-    text = re.sub(r"\s+", " ", text)
+# Comma-separated list of Ollama servers; sessions are pinned to one of them
+OLLAMA_HOSTS = [
+    host
+    for host in (os.environ.get("OLLAMA_HOSTS") or os.environ.get("OLLAMA_HOST") or "").split(",")
+    if host
+]
+
+chat_streamer = ChatStreamer(
+    max_concurrent_per_model=int(os.environ.get("NINYM_LLM_MAX_CONCURRENCY", "4")),
+    hosts=OLLAMA_HOSTS or None,
+    keep_alive=os.environ.get("NINYM_LLM_KEEP_ALIVE", "30m"),
+)
 
-    text = text.strip()
+# Models behind the text endpoint and the voice endpoints
+TEXT_MODEL = "qwen3"
+VOICE_MODEL = "ninym"
+
+session_tracker = SessionTracker(instances=chat_streamer.instances)
+
+
+def _observe_llm_waiting() -> None:
+    for model, waiting in chat_streamer.waiting().items():
+        metrics.llm_waiting.labels(model=model).set(waiting)
+
+
+metrics.on_scrape(_observe_llm_waiting)
+if hasattr(store, "stats"):
+    metrics.on_scrape(lambda: metrics.observe_store(store.stats()))
+if audio_cache is not None:
+    metrics.on_scrape(lambda: metrics.observe_audio_cache(audio_cache.stats()))
+
+
+def report_generation(
+    session_id: str, model: str, stats: GenerationStats, ttft: float
+) -> None:
+    state = session_tracker.record(session_id, stats)
+    turn = state.turns if state else 0
+    metrics.llm_time_to_first_token.labels(model=model).observe(ttft)
+    metrics.llm_prompt_eval_tokens.labels(model=model).observe(stats.prompt_eval_count)
+    logger.info(
+        "[%s] turn %d: time to first token %.3fs, prompt eval %d tokens in %.3fs, "
+        "eval %d tokens in %.3fs, load %.3fs",
+        session_id,
+        turn,
+        ttft,
+        stats.prompt_eval_count,
+        stats.prompt_eval_duration,
+        stats.eval_count,
+        stats.eval_duration,
+        stats.load_duration,
+    )
 
-    return text
+# Writes still running after their response was cancelled
+_pending_saves: set[asyncio.Task] = set()
 
 
-from storage import MessageStore
-from stores.in_memory_store import InMemoryMessageStore
+async def record_turn(session_id: str, prompt: str, reply: str) -> None:
+    """
+    Stores a finished or interrupted turn. The write runs as its own task,
+    so it completes even when the response it belongs to is being cancelled.
+    """
+    turn = [{"role": "user", "content": prompt}]
+    if reply:
+        turn.append({"role": "assistant", "content": reply})
 
-app = FastAPI()
+    save = asyncio.ensure_future(message_store.add_messages(session_id, turn))
+    _pending_saves.add(save)
+    save.add_done_callback(_pending_saves.discard)
+    await asyncio.shield(save)
 
-message_store: MessageStore = InMemoryMessageStore()
 
 app.add_middleware(
     CORSMiddleware,
@@ -95,25 +199,41 @@ async def chat_prompt(request: Request):
     if not session_id:
         session_id = str(uuid.uuid4())
 
-    messages = message_store.get_messages(session_id)
+    messages = await message_store.get_messages(session_id)
 
-    message_store.add_message(session_id, "user", prompt)
+    session = session_tracker.get(session_id)
 
-    async def generate():
-        assistant_content = ""
-        stream = ollama.chat(
-            model="qwen3",
+    assistant_parts = []
+
+    async def stream_reply():
+        start_time = time.time()
+        ttft = 0.0
+        stream = chat_streamer.stream(
+            model=TEXT_MODEL,
             messages=messages + [{"role": "user", "content": prompt}],
-            stream=True,
+            instance=session.instance,
         )
 
-        for chunk in stream:
+        async for chunk in stream:
             content = chunk.message.content
             if content:
-                assistant_content += content
+                if not assistant_parts:
+                    ttft = time.time() - start_time
+                assistant_parts.append(content)
                 yield content
+            if chunk.done:
+                report_generation(
+                    session_id, TEXT_MODEL, GenerationStats.from_chunk(chunk), ttft
+                )
 
-        message_store.add_message(session_id, "assistant", assistant_content)
+    async def generate():
+        # Stops pulling tokens from Ollama as soon as the client goes away and
+        # keeps whatever was generated up to that point
+        try:
+            async for content in until_disconnected(request, stream_reply()):
+                yield content
+        finally:
+            await record_turn(session_id, prompt, "".join(assistant_parts))
 
     response = StreamingResponse(generate(), media_type="text/plain; charset=utf-8")
     response.headers["X-Session-Id"] = session_id
@@ -122,170 +242,457 @@ async def chat_prompt(request: Request):
 
 @app.post("/api/chat/voicePrompt")
 async def chat_voice_prompt(request: Request):
-    print("\n=== voicePrompt API called ===")
+    logger.debug("voicePrompt API called")
     body = await request.json()
     prompt = body.get("prompt")
     session_id = body.get("sessionId")
+    voice_id = body.get("voice")
+    audio_format = body.get("audioFormat", "wav")
 
-    print(
-        f"Received prompt: {prompt[:50]}..."
-        if prompt and len(prompt) > 50
-        else f"Received prompt: {prompt}"
+    logger.debug(
+        "Received prompt: %s",
+        f"{prompt[:50]}..." if prompt and len(prompt) > 50 else prompt,
     )
 
     if not prompt:
-        print("Error: Missing prompt")
+        logger.warning("Missing prompt")
         return {"success": False, "message": "Missing required fields"}, 400
 
+    if audio_format not in AUDIO_FORMATS:
+        logger.warning("Unknown audio format %s", audio_format)
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "message": f"Unknown audio format: {audio_format}"},
+        )
+
+    try:
+        voice = await asyncio.to_thread(voice_registry.get, voice_id)
+    except UnknownVoiceError:
+        logger.warning("Unknown voice %s", voice_id)
+        return JSONResponse(
+            status_code=400, content={"success": False, "message": f"Unknown voice: {voice_id}"}
+        )
+
     if not session_id:
         session_id = str(uuid.uuid4())
 
-    messages = message_store.get_messages(session_id)
-    message_store.add_message(session_id, "user", prompt)
-
-    print("Loading PiperVoice model...")
-    voice = PiperVoice.load("./en_US-hfc_female-medium.onnx")
-    # voice = PiperVoice.load("./otherModels/alexa.onnx")
-    # voice = PiperVoice.load("./otherModels/cortana.onnx")
-    # voice = PiperVoice.load("./otherModels/glados.onnx")
-    # voice = PiperVoice.load("./otherModels/google_assistant.onnx")
-    # voice = PiperVoice.load("./otherModels/zarvox.onnx")
-    # voice = PiperVoice.load("./otherModels/jarvis-high.onnx")
-    sample_rate = voice.config.sample_rate
-    print(f"Model loaded successfully. Sample rate: {sample_rate} Hz")
+    messages = await message_store.get_messages(session_id)
+    session = session_tracker.get(session_id)
 
-    SENTENCE_END = re.compile(r"[.!?]+")
+    sample_rate = voice.config.sample_rate
+    voice_label = voice_id or voice_registry.default_voice
 
     total_start_time = time.time()
-    llm_times = []
+    llm_time = 0.0
     tts_times = []
+    tts_intervals = []
     total_audio_bytes = 0
     total_chars = 0
-    sentence_count = 0
-
-    async def generate():
-        nonlocal tts_times, total_audio_bytes, total_chars, sentence_count
-        sentence_buffer = ""
-        sentence_count = 0
-        assistant_content = ""
-
-        print("Starting Ollama chat stream...")
-        stream = ollama.chat(
-            model="ninym",
-            messages=messages + [{"role": "user", "content": prompt}],
-            stream=True,
+    assistant_parts = []
+    first_token_time = 0.0
+    first_audio_time = None
+    audio_complete = False
+    llm_stats = GenerationStats()
+
+    def wrap_wav(raw_audio: bytes) -> bytes:
+        wav_buffer = io.BytesIO()
+        with wave.open(wav_buffer, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)  # 16-bit
+            wf.setframerate(sample_rate)
+            wf.writeframes(raw_audio)
+        return wav_buffer.getvalue()
+
+    async def read_llm(pipeline: SentencePipeline):
+        nonlocal llm_time, first_token_time, llm_stats
+        segments = []
+        # Markdown is stripped as tokens arrive, so segments are ready to speak
+        cleaner = StreamingTextCleaner()
+        segmenter = SentenceSegmenter(
+            segments.append,
+            first_min_length=SEGMENT_FIRST_MIN_LENGTH,
+            min_length=SEGMENT_MIN_LENGTH,
+            max_length=SEGMENT_MAX_LENGTH,
         )
 
-        for chunk in stream:
-            content = chunk.message.content
-            if content:
-                assistant_content += content
-                sentence_buffer += content
-                print(f"Received chunk from Ollama: {content}")
-
-                if SENTENCE_END.search(sentence_buffer):
-                    matches = list(SENTENCE_END.finditer(sentence_buffer))
-                    if matches:
-                        last_match = matches[-1]
-                        text_to_synth = sentence_buffer[: last_match.end()]
-                        sentence_buffer = sentence_buffer[last_match.end() :]
-                        sentence_count += 1
-
-                        print(
-                            f"\n--- Synthesizing sentence {sentence_count}: {text_to_synth} ---"
-                        )
-
-                        tts_start = time.time()
-                        # Collect ALL PCM chunks for this sentence
-                        raw_audio = b""
-                        for audio_chunk in voice.synthesize(text_to_synth):
-                            raw_audio += audio_chunk.audio_int16_bytes
-
-                        tts_time = time.time() - tts_start
-                        tts_times.append(tts_time)
-
-                        print(f"Collected {len(raw_audio)} bytes of PCM")
-
-                        # Wrap in WAV format
-                        wav_buffer = io.BytesIO()
-                        with wave.open(wav_buffer, "wb") as wf:
-                            wf.setnchannels(1)
-                            wf.setsampwidth(2)  # 16-bit
-                            wf.setframerate(sample_rate)
-                            wf.writeframes(raw_audio)
-
-                        wav_data = wav_buffer.getvalue()
-                        print(
-                            f"Yielding complete WAV ({len(wav_data)} bytes) for sentence {sentence_count}"
-                        )
-                        total_audio_bytes += len(wav_data)
-                        total_chars += len(text_to_synth)
-                        yield wav_data
-
-        # Handle remaining buffer
-        if sentence_buffer.strip():
-            sentence_count += 1
-            print(
-                f"\n--- Synthesizing final sentence {sentence_count}: {sentence_buffer} ---"
-            )
-
-            tts_start = time.time()
-            raw_audio = b""
-            for audio_chunk in voice.synthesize(sentence_buffer):
-                raw_audio += audio_chunk.audio_int16_bytes
-
-            tts_time = time.time() - tts_start
-            tts_times.append(tts_time)
-
-            print(f"Collected {len(raw_audio)} bytes of PCM")
-
-            wav_buffer = io.BytesIO()
-            with wave.open(wav_buffer, "wb") as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)
-                wf.setframerate(sample_rate)
-                wf.writeframes(raw_audio)
-
-            wav_data = wav_buffer.getvalue()
-            print(
-                f"Yielding final WAV ({len(wav_data)} bytes) for sentence {sentence_count}"
+        async def submit_segments():
+            for segment in segments:
+                logger.debug("Queueing segment: %s", segment)
+                await pipeline.submit(segment)
+            segments.clear()
+
+        try:
+            logger.debug("Starting Ollama chat stream")
+            stream = chat_streamer.stream(
+                model=VOICE_MODEL,
+                messages=messages + [{"role": "user", "content": prompt}],
+                instance=session.instance,
             )
-            total_audio_bytes += len(wav_data)
-            total_chars += len(sentence_buffer)
-            yield wav_data
 
+            async for chunk in stream:
+                content = chunk.message.content
+                if content:
+                    if not assistant_parts:
+                        first_token_time = time.time() - total_start_time
+                    assistant_parts.append(content)
+                    logger.debug("Received chunk from Ollama: %r", content)
+                    segmenter.feed(cleaner.feed(content))
+                    await submit_segments()
+                if chunk.done:
+                    llm_stats = GenerationStats.from_chunk(chunk)
+                    report_generation(session_id, VOICE_MODEL, llm_stats, first_token_time)
+
+            # Handle remaining buffer
+            segmenter.feed(cleaner.flush())
+            segmenter.flush()
+            await submit_segments()
+
+            llm_time = time.time() - total_start_time
+        finally:
+            pipeline.close()
+
+    async def stream_audio(pipeline: SentencePipeline):
+        nonlocal total_audio_bytes, total_chars, first_audio_time, audio_complete
+        if audio_format == "wav-stream":
+            yield streaming_wav_header(sample_rate)
+
+        async for job in pipeline.results():
+            if audio_format == "wav":
+                # One complete WAV file per sentence
+                raw_audio = await job.read()
+                logger.debug("Collected %d bytes of PCM", len(raw_audio))
+
+                wav_data = wrap_wav(raw_audio)
+                logger.debug(
+                    "Yielding complete WAV (%d bytes) for sentence %d",
+                    len(wav_data),
+                    len(tts_times) + 1,
+                )
+                if first_audio_time is None:
+                    first_audio_time = time.time() - total_start_time
+                    metrics.time_to_first_audio.labels(format=audio_format).observe(
+                        first_audio_time
+                    )
+                total_audio_bytes += len(wav_data)
+                yield wav_data
+            else:
+                # Raw frames straight from Piper, as soon as each chunk exists
+                async for chunk in job.chunks():
+                    if first_audio_time is None:
+                        first_audio_time = time.time() - total_start_time
+                        metrics.time_to_first_audio.labels(
+                            format=audio_format
+                        ).observe(first_audio_time)
+                    total_audio_bytes += len(chunk)
+                    yield chunk
+
+            tts_times.append(job.tts_time)
+            if job.started_at is not None:
+                tts_intervals.append((job.started_at, job.finished_at))
+            if not job.cached:
+                metrics.tts_sentence_seconds.labels(voice=voice_label).observe(
+                    job.tts_time
+                )
+            total_chars += len(job.text)
+
+        audio_complete = True
+
+    def report_voice_response():
         total_time = time.time() - total_start_time
-        avg_tts = sum(tts_times) / len(tts_times) if tts_times else 0
+        tts_time = sum(tts_times)
+        avg_tts = tts_time / len(tts_times) if tts_times else 0
         audio_duration = total_audio_bytes / (sample_rate * 2)
         rtf = total_time / audio_duration if audio_duration > 0 else 0
-
-        print(f"\n{'=' * 50}")
-        print(f"BENCHMARK SUMMARY")
-        print(f"{'=' * 50}")
-        print(f"Total sentences:     {sentence_count}")
-        print(f"Total characters:    {total_chars}")
-        print(
-            f"Total audio bytes:   {total_audio_bytes} ({total_audio_bytes / 1024:.1f} KB)"
+        # Parallel workers overlap each other, so TTS time is measured as the
+        # wall-clock time at least one sentence was being synthesized
+        tts_busy = busy_time(tts_intervals)
+        overlap = busy_time(
+            tts_intervals, total_start_time, total_start_time + llm_time
         )
-        print(f"Audio duration:      {audio_duration:.2f}s")
-        print(f"Total time:          {total_time:.2f}s")
-        print(f"Avg TTS time/sentence: {avg_tts:.3f}s")
-        print(f"Real-time factor:    {rtf:.2f}x")
-        print(f"{'=' * 50}\n")
+        max_overlap = min(llm_time, tts_busy)
+        overlap_ratio = overlap / max_overlap if max_overlap > 0 else 0
+
+        if audio_duration > 0:
+            metrics.real_time_factor.observe(rtf)
+
+        if logger.isEnabledFor(logging.INFO):
+            summary = [
+                "=" * 50,
+                "BENCHMARK SUMMARY",
+                "=" * 50,
+                f"Total sentences:     {len(tts_times)}",
+                f"Total characters:    {total_chars}",
+                f"Total audio bytes:   {total_audio_bytes} ({total_audio_bytes / 1024:.1f} KB)",
+                f"Audio duration:      {audio_duration:.2f}s",
+                f"LLM time:            {llm_time:.2f}s",
+                f"Time to first token: {first_token_time:.2f}s",
+                f"Prompt eval:         {llm_stats.prompt_eval_count} tokens in {llm_stats.prompt_eval_duration:.2f}s",
+                f"TTS time (summed):   {tts_time:.2f}s",
+                f"TTS busy (wall):     {tts_busy:.2f}s",
+                f"Total time:          {total_time:.2f}s",
+            ]
+            if first_audio_time is not None:
+                summary.append(f"Time to first audio: {first_audio_time:.2f}s")
+            summary += [
+                f"LLM/TTS overlap:     {overlap:.2f}s ({overlap_ratio:.0%} of possible)",
+                f"Avg TTS time/sentence: {avg_tts:.3f}s",
+                f"Real-time factor:    {rtf:.2f}x",
+                "=" * 50,
+            ]
+            logger.info("\n%s", "\n".join(summary))
 
-        message_store.add_message(session_id, "assistant", assistant_content)
+    async def generate():
+        pipeline = SentencePipeline(
+            voice,
+            tts_executor,
+            max_pending=TTS_MAX_PENDING,
+            cache=audio_cache,
+            cache_params={"voice": voice_label, "sample_rate": sample_rate},
+        )
+        reader = asyncio.create_task(read_llm(pipeline))
+        outcome = "cancelled"
+
+        try:
+            async for data in until_disconnected(request, stream_audio(pipeline)):
+                yield data
+            if audio_complete:
+                await reader
+                outcome = "ok"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            # On disconnect this stops the Ollama stream and drops queued TTS
+            reader.cancel()
+            pipeline.cancel()
+            metrics.voice_responses.labels(outcome=outcome).inc()
+            if outcome == "ok":
+                report_voice_response()
+            elif outcome == "cancelled":
+                logger.info("[%s] client disconnected, response cancelled", session_id)
+            await record_turn(session_id, prompt, "".join(assistant_parts))
 
     response = StreamingResponse(
         generate(),
-        media_type="audio/wav",
+        media_type=AUDIO_FORMATS[audio_format],
     )
     response.headers["X-Session-Id"] = session_id
+    response.headers["X-Sample-Rate"] = str(sample_rate)
+    if audio_format == "pcm":
+        response.headers["X-Sample-Format"] = "s16le"
+        response.headers["X-Channels"] = "1"
     return response
 
 
+@app.websocket("/api/chat/ws")
+async def chat_ws(websocket: WebSocket):
+    """
+    One generation streamed as both text and audio.
+
+    The client sends JSON messages: `{"type": "prompt", "prompt", "sessionId",
+    "voice"}` starts a turn and `{"type": "cancel"}` stops it. Any message
+    that arrives while a turn is running cancels that turn first, so the
+    user can barge in mid-sentence.
+
+    For each turn the server sends JSON frames:
+    - `start`, with the session id, voice and sample rate
+    - `text`, with each LLM delta
+    - `sentence` before the audio of a sentence, and `sentence_end` after it
+    - `timing`, for the first token and the first audio
+    - `done`, with the outcome and the turn timings
+    - `error`
+
+    Audio goes out as binary frames of headerless s16le mono PCM.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    current: asyncio.Task | None = None
+
+    async def send_json(data: dict) -> None:
+        async with send_lock:
+            await websocket.send_json(data)
+
+    async def send_bytes(data) -> None:
+        async with send_lock:
+            await websocket.send_bytes(bytes(data))
+
+    async def run_turn(message: dict) -> None:
+        prompt = message.get("prompt")
+        session_id = message.get("sessionId") or str(uuid.uuid4())
+        voice_id = message.get("voice")
+
+        if not prompt:
+            await send_json({"type": "error", "message": "Missing required fields"})
+            return
+
+        try:
+            voice = await asyncio.to_thread(voice_registry.get, voice_id)
+        except UnknownVoiceError:
+            await send_json({"type": "error", "message": f"Unknown voice: {voice_id}"})
+            return
+
+        messages = await message_store.get_messages(session_id)
+        session = session_tracker.get(session_id)
+        sample_rate = voice.config.sample_rate
+        voice_label = voice_id or voice_registry.default_voice
+
+        start_time = time.time()
+        timings: dict[str, float] = {}
+        assistant_parts = []
+
+        async def mark(event: str) -> None:
+            timings[event] = time.time() - start_time
+            await send_json({"type": "timing", "event": event, "seconds": timings[event]})
+
+        async def read_llm(pipeline: SentencePipeline):
+            segments = []
+            cleaner = StreamingTextCleaner()
+            segmenter = SentenceSegmenter(
+                segments.append,
+                first_min_length=SEGMENT_FIRST_MIN_LENGTH,
+                min_length=SEGMENT_MIN_LENGTH,
+                max_length=SEGMENT_MAX_LENGTH,
+            )
+
+            async def submit_segments():
+                for segment in segments:
+                    await pipeline.submit(segment)
+                segments.clear()
+
+            try:
+                stream = chat_streamer.stream(
+                    model=VOICE_MODEL,
+                    messages=messages + [{"role": "user", "content": prompt}],
+                    instance=session.instance,
+                )
+
+                async for chunk in stream:
+                    content = chunk.message.content
+                    if content:
+                        if not assistant_parts:
+                            await mark("first_token")
+                        assistant_parts.append(content)
+                        await send_json({"type": "text", "delta": content})
+                        segmenter.feed(cleaner.feed(content))
+                        await submit_segments()
+                    if chunk.done:
+                        report_generation(
+                            session_id,
+                            VOICE_MODEL,
+                            GenerationStats.from_chunk(chunk),
+                            timings.get("first_token", 0.0),
+                        )
+
+                segmenter.feed(cleaner.flush())
+                segmenter.flush()
+                await submit_segments()
+                timings["llm"] = time.time() - start_time
+            finally:
+                pipeline.close()
+
+        await send_json(
+            {
+                "type": "start",
+                "sessionId": session_id,
+                "voice": voice_label,
+                "sampleRate": sample_rate,
+            }
+        )
+
+        pipeline = SentencePipeline(
+            voice,
+            tts_executor,
+            max_pending=TTS_MAX_PENDING,
+            cache=audio_cache,
+            cache_params={"voice": voice_label, "sample_rate": sample_rate},
+        )
+        reader = asyncio.create_task(read_llm(pipeline))
+        outcome = "cancelled"
+
+        try:
+            index = 0
+            async for job in pipeline.results():
+                await send_json({"type": "sentence", "index": index, "text": job.text})
+                async for chunk in job.chunks():
+                    if "first_audio" not in timings:
+                        await mark("first_audio")
+                        metrics.time_to_first_audio.labels(format="ws").observe(
+                            timings["first_audio"]
+                        )
+                    await send_bytes(chunk)
+                await send_json({"type": "sentence_end", "index": index})
+                if not job.cached:
+                    metrics.tts_sentence_seconds.labels(voice=voice_label).observe(
+                        job.tts_time
+                    )
+                index += 1
+
+            await reader
+            outcome = "ok"
+        except Exception as error:
+            outcome = "error"
+            logger.exception("[%s] voice turn failed", session_id)
+            with suppress(Exception):
+                await send_json({"type": "error", "message": str(error)})
+        finally:
+            reader.cancel()
+            pipeline.cancel()
+            metrics.voice_responses.labels(outcome=outcome).inc()
+            await record_turn(session_id, prompt, "".join(assistant_parts))
+
+            timings["total"] = time.time() - start_time
+            with suppress(Exception):
+                await send_json({"type": "done", "outcome": outcome, "timings": timings})
+
+    async def stop_turn() -> None:
+        if current is not None and not current.done():
+            current.cancel()
+            with suppress(asyncio.CancelledError):
+                await current
+
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except KeyError:
+                # receive_json reads the frame's text, which a binary frame
+                # does not have
+                await send_json({"type": "error", "message": "Expected a text frame"})
+                continue
+            except ValueError:
+                await send_json({"type": "error", "message": "Invalid JSON"})
+                continue
+            if not isinstance(message, dict):
+                await send_json({"type": "error", "message": "Expected a JSON object"})
+                continue
+
+            # Barge-in: whatever the client says interrupts the current turn
+            await stop_turn()
+
+            kind = message.get("type")
+            if kind == "prompt":
+                current = asyncio.create_task(run_turn(message))
+            elif kind != "cancel":
+                await send_json({"type": "error", "message": f"Unknown message type: {kind}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await stop_turn()
+
+
+@app.get("/api/chat/voices")
+async def list_voices():
+    return {
+        "success": True,
+        "voices": voice_registry.voice_ids,
+        "default": voice_registry.default_voice,
+    }
+
+
 @app.delete("/api/chat/session/{session_id}")
 async def clear_session(session_id: str):
-    message_store.clear_session(session_id)
+    await message_store.clear_session(session_id)
+    session_tracker.forget(session_id)
     return {"success": True, "message": "Session cleared"}
 
 
@@ -0,0 +1,106 @@
+from typing import Callable
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 13, 20, 30)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5)
+
+llm_time_to_first_token = Histogram(
+    "ninym_llm_time_to_first_token_seconds",
+    "Time from request to the first LLM token",
+    ["model"],
+    buckets=LATENCY_BUCKETS,
+)
+llm_prompt_eval_tokens = Histogram(
+    "ninym_llm_prompt_eval_tokens",
+    "Prompt tokens Ollama had to evaluate (cached prefix excluded)",
+    ["model"],
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+llm_waiting = Gauge(
+    "ninym_llm_waiting_requests",
+    "Chats waiting for a per-model concurrency slot",
+    ["model"],
+)
+tts_sentence_seconds = Histogram(
+    "ninym_tts_sentence_seconds",
+    "Piper synthesis time per segment",
+    ["voice"],
+    buckets=LATENCY_BUCKETS,
+)
+time_to_first_audio = Histogram(
+    "ninym_time_to_first_audio_byte_seconds",
+    "Time from request to the first audio byte sent",
+    ["format"],
+    buckets=LATENCY_BUCKETS,
+)
+real_time_factor = Histogram(
+    "ninym_voice_real_time_factor",
+    "Wall time divided by audio duration per voice response",
+    buckets=RTF_BUCKETS,
+)
+tts_queue_depth = Gauge(
+    "ninym_tts_queue_depth",
+    "Segments queued or being synthesized across all voice responses",
+)
+voice_responses = Counter(
+    "ninym_voice_responses_total",
+    "Voice responses by outcome",
+    ["outcome"],
+)
+
+store_sessions = Gauge("ninym_store_sessions", "Sessions held by the message store")
+store_bytes = Gauge("ninym_store_bytes", "Message content bytes held by the message store")
+store_evictions = Gauge(
+    "ninym_store_evictions", "Sessions evicted from the message store since start"
+)
+
+audio_cache_lookups = Gauge(
+    "ninym_audio_cache_lookups",
+    "Audio cache lookups since start by result",
+    ["result"],
+)
+audio_cache_hit_ratio = Gauge(
+    "ninym_audio_cache_hit_ratio", "Fraction of audio cache lookups served from the cache"
+)
+audio_cache_bytes = Gauge(
+    "ninym_audio_cache_bytes", "Audio held by the cache", ["tier"]
+)
+
+router = APIRouter()
+
+# Callbacks that refresh pull-style gauges right before a scrape
+_scrape_hooks: list[Callable[[], None]] = []
+
+
+def on_scrape(hook: Callable[[], None]) -> None:
+    _scrape_hooks.append(hook)
+
+
+def observe_store(stats: dict) -> None:
+    store_sessions.set(stats.get("sessions", 0))
+    store_bytes.set(stats.get("bytes", 0))
+    store_evictions.set(stats.get("evictions", 0))
+
+
+def observe_audio_cache(stats: dict) -> None:
+    audio_cache_lookups.labels(result="memory_hit").set(stats["memory_hits"])
+    audio_cache_lookups.labels(result="disk_hit").set(stats["disk_hits"])
+    audio_cache_lookups.labels(result="miss").set(stats["misses"])
+    audio_cache_hit_ratio.set(stats["hit_ratio"])
+    audio_cache_bytes.labels(tier="memory").set(stats["memory_bytes"])
+    audio_cache_bytes.labels(tier="disk").set(stats["disk_bytes"])
+
+
+@router.get("/metrics")
+async def metrics():
+    for hook in _scrape_hooks:
+        hook()
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+import json
+import os
+import uuid
+import zlib
+from contextlib import asynccontextmanager, suppress
+
+import httpx
+import websockets
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import StreamingResponse
+
+# Headers that describe a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+    "content-length",
+}
+
+
+class WorkerRouter:
+    """
+    Front for several prompt-server workers listening on Unix sockets.
+
+    Every session is hashed to one worker, so its pinned Ollama instance,
+    cached audio and message-store buffers stay on the process that warmed
+    them. Requests that arrive without a session get a new id here, which
+    keeps their follow-ups on the same worker as well.
+    """
+
+    def __init__(self, sockets: list[str]):
+        self.sockets = sockets
+        self._clients = [
+            httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=path),
+                base_url="http://worker",
+                timeout=None,
+            )
+            for path in sockets
+        ]
+        self._next_worker = itertools.cycle(range(len(sockets)))
+
+    def worker_for(self, session_id: str | None) -> int:
+        if not session_id:
+            return next(self._next_worker)
+        return zlib.crc32(session_id.encode("utf-8")) % len(self.sockets)
+
+    def client(self, worker: int) -> httpx.AsyncClient:
+        return self._clients[worker]
+
+    async def close(self) -> None:
+        for client in self._clients:
+            await client.aclose()
+
+
+router = WorkerRouter(
+    [path for path in os.environ.get("NINYM_WORKER_SOCKETS", "").split(",") if path]
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await router.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def _forward_headers(headers) -> dict:
+    return {
+        name: value
+        for name, value in headers.items()
+        if name.lower() not in HOP_BY_HOP_HEADERS
+    }
+
+
+def _route_body(body: bytes) -> tuple[str | None, bytes]:
+    """
+    Returns the session id of a JSON chat request, assigning one if missing.
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None, body
+    if not isinstance(payload, dict):
+        return None, body
+
+    if not payload.get("sessionId"):
+        payload["sessionId"] = str(uuid.uuid4())
+        body = json.dumps(payload).encode("utf-8")
+    return payload["sessionId"], body
+
+
+@app.websocket("/api/chat/ws")
+async def proxy_ws(websocket: WebSocket):
+    # A connection is pinned as a whole; clients pass ?sessionId= for affinity
+    worker = router.worker_for(websocket.query_params.get("sessionId"))
+    uri = f"ws://worker{websocket.url.path}"
+    if websocket.url.query:
+        uri += f"?{websocket.url.query}"
+    await websocket.accept()
+
+    async with websockets.unix_connect(router.sockets[worker], uri) as upstream:
+
+        async def client_to_worker():
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes") is not None:
+                    await upstream.send(message["bytes"])
+                elif message.get("text") is not None:
+                    await upstream.send(message["text"])
+
+        async def worker_to_client():
+            async for message in upstream:
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+
+        tasks = [
+            asyncio.create_task(client_to_worker()),
+            asyncio.create_task(worker_to_client()),
+        ]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in tasks:
+            task.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await task
+
+    with suppress(RuntimeError):
+        await websocket.close()
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
+async def proxy(request: Request, path: str):
+    body = await request.body()
+    session_id = None
+
+    if path.startswith("api/chat/session/"):
+        session_id = path.rsplit("/", 1)[-1]
+    elif request.method == "POST" and path.startswith("api/chat/") and body:
+        session_id, body = _route_body(body)
+
+    if path == "metrics":
+        # Every worker keeps its own registry; scrape each with ?worker=<n>
+        worker = int(request.query_params.get("worker", 0)) % len(router.sockets)
+    else:
+        worker = router.worker_for(session_id)
+
+    client = router.client(worker)
+    upstream = await client.send(
+        client.build_request(
+            request.method,
+            f"/{path}",
+            params=request.query_params,
+            headers=_forward_headers(request.headers),
+            content=body,
+        ),
+        stream=True,
+    )
+
+    async def stream():
+        # Closing the upstream response when the client goes away lets the
+        # worker notice the disconnect and cancel its generation
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.aclose()
+
+    return StreamingResponse(
+        stream(),
+        status_code=upstream.status_code,
+        headers=_forward_headers(upstream.headers),
+    )
@@ -0,0 +1,178 @@
+import re
+from typing import Callable
+
+# Positions worth looking at; everything else is skipped by the regex engine
+_CANDIDATE = re.compile(r"[.!?…\n`]")
+_WORD_BEFORE = re.compile(r"([\w.]+)$")
+
+_TERMINATORS = ".!?…"
+# Characters that may trail a terminator and still belong to the sentence
+_CLOSERS = _TERMINATORS + "\"')]*_”’"
+
+ABBREVIATIONS = frozenset(
+    {
+        "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "etc",
+        "eg", "ie", "e.g", "i.e", "approx", "dept", "est", "fig", "inc", "ltd",
+        "co", "no", "vol", "jan", "feb", "mar", "apr", "jun", "jul", "aug",
+        "sep", "sept", "oct", "nov", "dec",
+    }
+)
+
+_WAIT = -1
+
+
+class SentenceSegmenter:
+    """
+    Splits streamed LLM text into speakable segments.
+
+    Only text appended since the previous `feed` is scanned, and the buffer
+    never holds more than one pending segment, so a whole response costs O(n).
+    Sentence ends are `.`, `!`, `?`, ellipses and newlines, except for
+    abbreviations, initials, numbered list markers, decimals and anything
+    inside a ``` code fence.
+
+    The first segment is emitted at the first boundary past
+    `first_min_length` to get audio started quickly. Later sentences are
+    batched until they reach `min_length`, and text without a usable boundary
+    is force-split once it exceeds `max_length`.
+    """
+
+    def __init__(
+        self,
+        on_segment: Callable[[str], None],
+        first_min_length: int = 0,
+        min_length: int = 60,
+        max_length: int = 400,
+    ):
+        self.on_segment = on_segment
+        self.first_min_length = first_min_length
+        self.min_length = min_length
+        self.max_length = max_length
+        self.segment_count = 0
+        self._buffer = ""
+        self._scan = 0
+        self._last_boundary = 0
+        self._in_fence = False
+
+    def feed(self, text: str) -> None:
+        if not text:
+            return
+        self._buffer += text
+
+        while True:
+            match = _CANDIDATE.search(self._buffer, self._scan)
+            if match is None:
+                self._scan = len(self._buffer)
+                break
+
+            i = match.start()
+            end, next_scan = self._check(i)
+            if end == _WAIT:
+                self._scan = i
+                break
+
+            self._scan = next_scan
+            if end:
+                self._boundary(end)
+
+        if not self._in_fence:
+            while len(self._buffer) > self.max_length:
+                self._force_split()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._emit(len(self._buffer))
+        self._scan = 0
+        self._last_boundary = 0
+        self._in_fence = False
+
+    def _check(self, i: int) -> tuple[int, int]:
+        """
+        Classifies the candidate at `i`. Returns the end of the sentence (0 if
+        `i` is not a boundary, `_WAIT` if more text is needed to decide) and
+        the position to resume scanning from.
+        """
+        buffer = self._buffer
+        ch = buffer[i]
+
+        if ch == "`":
+            j = i
+            while j < len(buffer) and buffer[j] == "`":
+                j += 1
+            if j == len(buffer):
+                return _WAIT, i
+            if j - i >= 3:
+                self._in_fence = not self._in_fence
+            return 0, j
+
+        if self._in_fence:
+            return 0, i + 1
+
+        if ch == "\n":
+            return i + 1, i + 1
+
+        j = i
+        while j < len(buffer) and buffer[j] in _CLOSERS:
+            j += 1
+        if j == len(buffer):
+            return _WAIT, i
+        if not buffer[j].isspace():
+            # Decimals, domains, "e.g." and the like
+            return 0, j
+
+        run = buffer[i:j]
+        if "!" in run or "?" in run:
+            return j, j
+
+        if "…" in run or ".." in run:
+            # An ellipsis only ends a sentence if the next word starts one
+            k = j
+            while k < len(buffer) and buffer[k].isspace():
+                k += 1
+            if k == len(buffer):
+                return _WAIT, i
+            return (0 if buffer[k].islower() else j), j
+
+        word = _WORD_BEFORE.search(buffer, max(0, i - 12), i)
+        if word is not None:
+            token = word.group(1).strip(".")
+            if token.lower() in ABBREVIATIONS:
+                return 0, j
+            if len(token) == 1 and token.isalpha() and token.isupper():
+                return 0, j
+            line_start = buffer.rfind("\n", 0, word.start()) + 1
+            if token.isdigit() and not buffer[line_start : word.start()].strip():
+                return 0, j
+
+        return j, j
+
+    def _boundary(self, end: int) -> None:
+        length = len(self._buffer[:end].strip())
+        threshold = self.first_min_length if self.segment_count == 0 else self.min_length
+        if length >= threshold and length > 0:
+            self._emit(end)
+        else:
+            self._last_boundary = end
+
+    def _force_split(self) -> None:
+        if self._last_boundary:
+            self._emit(self._last_boundary)
+            return
+
+        limit = min(self.max_length, self._scan) or self.max_length
+        window = self._buffer[:limit]
+        for separators in (",;:", " \t"):
+            cut = max(window.rfind(sep) for sep in separators)
+            if cut > 0:
+                self._emit(cut + 1)
+                return
+        self._emit(limit)
+
+    def _emit(self, end: int) -> None:
+        segment = self._buffer[:end].strip()
+        self._buffer = self._buffer[end:]
+        self._scan = max(0, self._scan - end)
+        self._last_boundary = 0
+        if segment:
+            self.segment_count += 1
+            self.on_segment(segment)
@@ -0,0 +1,103 @@
+"""
+Runs the prompt server, optionally as several worker processes.
+
+    python serve.py --workers 4 --port 8000
+
+With one worker this is the same as running main.py. With more, every worker
+listens on its own Unix socket and router.py serves the public port, pinning
+each session to one worker. Workers do not share memory, so the message store
+defaults to SQLite, which all of them open (NINYM_SQLITE_PATH). Each worker
+keeps its sentence audio cache in its own subdirectory of
+NINYM_AUDIO_CACHE_DIR, with an equal share of NINYM_AUDIO_CACHE_DISK_MB.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import uvicorn
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def wait_for_sockets(sockets: list[str], workers: list[subprocess.Popen], timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while not all(os.path.exists(path) for path in sockets):
+        for worker in workers:
+            if worker.poll() is not None:
+                raise RuntimeError(f"Worker exited during startup with code {worker.returncode}")
+        if time.monotonic() > deadline:
+            raise RuntimeError("Timed out waiting for workers to start")
+        time.sleep(0.1)
+
+
+def worker_env(index: int, workers: int) -> dict[str, str]:
+    """
+    Environment for worker `index`. Each worker indexes and evicts its audio
+    cache on its own, so it gets a subdirectory of NINYM_AUDIO_CACHE_DIR and
+    an equal share of NINYM_AUDIO_CACHE_DISK_MB rather than the whole budget
+    on a shared directory.
+    """
+    env = dict(os.environ)
+    cache_dir = env.get("NINYM_AUDIO_CACHE_DIR", "audio_cache")
+    if cache_dir:
+        disk_mb = int(env.get("NINYM_AUDIO_CACHE_DISK_MB", "1024"))
+        env["NINYM_AUDIO_CACHE_DIR"] = os.path.join(cache_dir, f"worker-{index}")
+        env["NINYM_AUDIO_CACHE_DISK_MB"] = str(max(1, disk_mb // workers))
+    return env
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the Ninym prompt server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=int(os.environ.get("NINYM_WORKERS", "1"))
+    )
+    parser.add_argument(
+        "--startup-timeout",
+        type=float,
+        default=120,
+        help="Seconds to wait for workers to preload their voices",
+    )
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    if args.workers <= 1:
+        uvicorn.run("main:app", host=args.host, port=args.port)
+        return
+
+    os.environ.setdefault("NINYM_MESSAGE_STORE", "sqlite")
+    socket_dir = tempfile.mkdtemp(prefix="ninym-")
+    sockets = [os.path.join(socket_dir, f"worker-{i}.sock") for i in range(args.workers)]
+
+    workers = []
+    try:
+        for index, path in enumerate(sockets):
+            workers.append(
+                subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "main:app", "--uds", path],
+                    env=worker_env(index, args.workers),
+                )
+            )
+        wait_for_sockets(sockets, workers, args.startup_timeout)
+
+        os.environ["NINYM_WORKER_SOCKETS"] = ",".join(sockets)
+        uvicorn.run("router:app", host=args.host, port=args.port)
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            try:
+                worker.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
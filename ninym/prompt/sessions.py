@@ -0,0 +1,55 @@
+import itertools
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from llm import GenerationStats
+
+
+@dataclass
+class SessionState:
+    instance: int
+    turns: int = 0
+    last_stats: GenerationStats = field(default_factory=GenerationStats)
+
+
+class SessionTracker:
+    """
+    Per-session generation state for prompt-prefix reuse.
+
+    A session is pinned to the Ollama instance of its first turn, whichever
+    model its later turns use, so every follow-up lands on the runners that
+    already hold its prefixes. New sessions are spread round-robin across
+    instances. Only the most recent `max_sessions` are tracked.
+    """
+
+    def __init__(self, instances: int = 1, max_sessions: int = 1000):
+        self.instances = instances
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, SessionState] = OrderedDict()
+        self._next_instance = itertools.cycle(range(instances))
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> SessionState:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = SessionState(instance=next(self._next_instance))
+                self._sessions[session_id] = state
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def record(self, session_id: str, stats: GenerationStats) -> SessionState | None:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return None
+            state.turns += 1
+            state.last_stats = stats
+            return state
+
+    def forget(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -13,3 +13,38 @@ class MessageStore(ABC):
     @abstractmethod
     def clear_session(self, session_id: str) -> None:
         pass
+
+    def add_messages(self, session_id: str, messages: list[dict]) -> list[dict]:
+        """
+        Appends several messages to a session. Stores that can do so should
+        override this to make the append atomic.
+        """
+        result = self.get_messages(session_id)
+        for message in messages:
+            result = self.add_message(session_id, message["role"], message["content"])
+        return result
+
+    def get_many(self, session_ids: list[str]) -> dict[str, list[dict]]:
+        return {session_id: self.get_messages(session_id) for session_id in session_ids}
+
+
+class AsyncMessageStore(ABC):
+    @abstractmethod
+    async def get_messages(self, session_id: str) -> list[dict]:
+        pass
+
+    @abstractmethod
+    async def add_message(self, session_id: str, role: str, content: str) -> list[dict]:
+        pass
+
+    @abstractmethod
+    async def add_messages(self, session_id: str, messages: list[dict]) -> list[dict]:
+        pass
+
+    @abstractmethod
+    async def get_many(self, session_ids: list[str]) -> dict[str, list[dict]]:
+        pass
+
+    @abstractmethod
+    async def clear_session(self, session_id: str) -> None:
+        pass
@@ -0,0 +1,37 @@
+import asyncio
+
+from storage import AsyncMessageStore, MessageStore
+
+
+class SyncStoreAdapter(AsyncMessageStore):
+    """
+    Exposes a synchronous MessageStore to async handlers.
+
+    Stores that do real I/O should be wrapped with `offload=True`, which runs
+    each call on a worker thread so the event loop never waits on the backend.
+    Purely in-memory stores are cheaper to call inline.
+    """
+
+    def __init__(self, store: MessageStore, offload: bool = False):
+        self.store = store
+        self.offload = offload
+
+    async def _call(self, method, *args):
+        if self.offload:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get_messages(self, session_id: str) -> list[dict]:
+        return await self._call(self.store.get_messages, session_id)
+
+    async def add_message(self, session_id: str, role: str, content: str) -> list[dict]:
+        return await self._call(self.store.add_message, session_id, role, content)
+
+    async def add_messages(self, session_id: str, messages: list[dict]) -> list[dict]:
+        return await self._call(self.store.add_messages, session_id, messages)
+
+    async def get_many(self, session_ids: list[str]) -> dict[str, list[dict]]:
+        return await self._call(self.store.get_many, session_ids)
+
+    async def clear_session(self, session_id: str) -> None:
+        await self._call(self.store.clear_session, session_id)
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable
+
+from storage import MessageStore
+
+
+def estimate_tokens(content: str) -> int:
+    # Roughly four characters per token, plus the chat template overhead
+    return len(content) // 4 + 4
+
+
+class _Session:
+    __slots__ = ("messages", "tokens", "window_tokens", "bytes", "last_access")
+
+    def __init__(self):
+        self.messages: deque[dict] = deque()
+        self.tokens: deque[int] = deque()
+        self.window_tokens = 0
+        self.bytes = 0
+        self.last_access = time.monotonic()
+
+
+class BoundedMessageStore(MessageStore):
+    """
+    In-memory store with bounded growth.
+
+    Sessions idle for longer than `session_ttl` seconds expire, and at most
+    `max_sessions` are kept, evicting the least recently used. `get_messages`
+    returns only the most recent messages that fit `context_token_budget`;
+    the window's token count is updated on every append, and messages that
+    fall out of it are dropped since they will never be replayed. Messages
+    are dropped a whole user/assistant turn at a time.
+
+    Once the budget is exceeded the window is trimmed down to
+    `trim_ratio` of it in one step rather than by one message per turn, so
+    the replayed prefix stays identical for many turns and Ollama can keep
+    reusing its cached evaluation of it.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        session_ttl: float = 3600,
+        context_token_budget: int = 4096,
+        trim_ratio: float = 0.5,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+    ):
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.context_token_budget = context_token_budget
+        self.trim_ratio = trim_ratio
+        self.count_tokens = count_tokens
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_messages(self, session_id: str) -> list[dict]:
+        with self._lock:
+            self._expire()
+            session = self._touch(session_id)
+            return list(session.messages) if session else []
+
+    def add_message(self, session_id: str, role: str, content: str) -> list[dict]:
+        return self.add_messages(session_id, [{"role": role, "content": content}])
+
+    def add_messages(self, session_id: str, messages: list[dict]) -> list[dict]:
+        with self._lock:
+            self._expire()
+            session = self._touch(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session()
+                self._evict()
+
+            for message in messages:
+                self._append(session, message["role"], message["content"])
+            return list(session.messages)
+
+    def get_many(self, session_ids: list[str]) -> dict[str, list[dict]]:
+        with self._lock:
+            self._expire()
+            result = {}
+            for session_id in session_ids:
+                session = self._touch(session_id)
+                result[session_id] = list(session.messages) if session else []
+            return result
+
+    def clear_session(self, session_id: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._bytes -= session.bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _append(self, session: _Session, role: str, content: str) -> None:
+        tokens = self.count_tokens(content)
+        size = len(content.encode("utf-8"))
+        session.messages.append({"role": role, "content": content})
+        session.tokens.append(tokens)
+        session.window_tokens += tokens
+        session.bytes += size
+        self._bytes += size
+
+        if session.window_tokens <= self.context_token_budget:
+            return
+
+        # Slide the window forward a whole turn (a user message and the replies
+        # to it) at a time, so it never opens with a reply whose prompt was
+        # dropped. The newest turn is always kept.
+        target = self.context_token_budget * self.trim_ratio
+        while session.window_tokens > target:
+            turn_end = 1
+            while (
+                turn_end < len(session.messages)
+                and session.messages[turn_end]["role"] != "user"
+            ):
+                turn_end += 1
+            if turn_end == len(session.messages):
+                break
+            for _ in range(turn_end):
+                dropped = session.messages.popleft()
+                session.window_tokens -= session.tokens.popleft()
+                dropped_size = len(dropped["content"].encode("utf-8"))
+                session.bytes -= dropped_size
+                self._bytes -= dropped_size
+
+    def _touch(self, session_id: str) -> _Session | None:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _expire(self) -> None:
+        # Sessions are kept in access order, so expired ones are at the front
+        deadline = time.monotonic() - self.session_ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_access > deadline:
+                break
+            self._sessions.popitem(last=False)
+            self._bytes -= session.bytes
+            self.expirations += 1
+
+    def _evict(self) -> None:
+        while len(self._sessions) > self.max_sessions:
+            _, session = self._sessions.popitem(last=False)
+            self._bytes -= session.bytes
+            self.evictions += 1
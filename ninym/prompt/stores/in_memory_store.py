@@ -16,5 +16,13 @@ class InMemoryMessageStore(MessageStore):
 
         return self._sessions[session_id]
 
+    def add_messages(self, session_id: str, messages: list[dict]) -> list[dict]:
+        session = self._sessions.setdefault(session_id, [])
+        session.extend(
+            {"role": message["role"], "content": message["content"]}
+            for message in messages
+        )
+        return session
+
     def clear_session(self, session_id: str) -> None:
         self._sessions.pop(session_id, None)
@@ -0,0 +1,263 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from storage import MessageStore
+
+logger = logging.getLogger("ninym.stores.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_id TEXT NOT NULL UNIQUE,
+    session_id TEXT NOT NULL,
+    session_ordinal INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_session_seq ON messages (session_id, seq);
+CREATE TABLE IF NOT EXISTS session_counts (
+    session_id TEXT PRIMARY KEY,
+    message_count INTEGER NOT NULL
+);
+"""
+
+class SqliteMessageStore(MessageStore):
+    """
+    Persistent store backed by a SQLite database in WAL mode.
+
+    Appends are buffered and written by a background thread every
+    `flush_interval` seconds, so messages from many sessions share a single
+    transaction. Reads see buffered messages immediately; each message carries
+    a unique id so one that is committed while a read is in progress is not
+    returned twice. `get_messages` returns at most the last `history_limit`
+    messages of a session, read through the (session_id, seq) index.
+
+    Each message is numbered within its session (`session_ordinal`) and every
+    session's message count is kept in `session_counts`, so the start of the
+    replayed window is known from one primary-key lookup and only the rows
+    inside it are read.
+    """
+
+    def __init__(
+        self,
+        path: str = "messages.db",
+        pool_size: int = 4,
+        flush_interval: float = 0.05,
+        history_limit: int = 50,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.history_limit = history_limit
+        self._pool: queue.Queue[sqlite3.Connection] = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+        self._pending: list[tuple[str, str, str, str, float]] = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="sqlite-flush", daemon=True
+        )
+        self._flusher.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def get_messages(self, session_id: str) -> list[dict]:
+        # Snapshot the buffer before reading, so a message flushed in between
+        # shows up in both and is deduplicated rather than missed
+        with self._pending_lock:
+            pending = [p for p in self._pending if p[1] == session_id]
+
+        with self._connection() as conn:
+            # One read transaction, so the count and rows agree
+            conn.execute("BEGIN")
+            try:
+                row = conn.execute(
+                    "SELECT message_count FROM session_counts WHERE session_id = ?",
+                    (session_id,),
+                ).fetchone()
+                return self._read_window(conn, session_id, row[0] if row else 0, pending)
+            finally:
+                conn.commit()
+
+    def add_message(self, session_id: str, role: str, content: str) -> list[dict]:
+        return self.add_messages(session_id, [{"role": role, "content": content}])
+
+    def add_messages(self, session_id: str, messages: list[dict]) -> list[dict]:
+        # Buffered together, so the same flush transaction writes all of them
+        now = time.time()
+        with self._pending_lock:
+            self._pending.extend(
+                (uuid.uuid4().hex, session_id, message["role"], message["content"], now)
+                for message in messages
+            )
+        return self.get_messages(session_id)
+
+    def get_many(self, session_ids: list[str]) -> dict[str, list[dict]]:
+        wanted = set(session_ids)
+        if not wanted:
+            return {}
+
+        with self._pending_lock:
+            pending = [p for p in self._pending if p[1] in wanted]
+
+        placeholders = ",".join("?" * len(wanted))
+        with self._connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                counts = dict(
+                    conn.execute(
+                        "SELECT session_id, message_count FROM session_counts"
+                        f" WHERE session_id IN ({placeholders})",
+                        tuple(wanted),
+                    ).fetchall()
+                )
+                return {
+                    session_id: self._read_window(
+                        conn,
+                        session_id,
+                        counts.get(session_id, 0),
+                        [p for p in pending if p[1] == session_id],
+                    )
+                    for session_id in session_ids
+                }
+            finally:
+                conn.commit()
+
+    def _read_window(
+        self, conn: sqlite3.Connection, session_id: str, count: int, pending: list[tuple]
+    ) -> list[dict]:
+        """
+        Returns the replayed window of a session with `count` committed
+        messages and the buffered messages `pending`, reading only the
+        committed rows inside the window.
+        """
+        unflushed = {message_id for message_id, *_ in pending}
+        if count and unflushed:
+            # Buffered messages flushed since the snapshot are already counted
+            placeholders = ",".join("?" * len(unflushed))
+            flushed = conn.execute(
+                f"SELECT message_id FROM messages WHERE message_id IN ({placeholders})",
+                tuple(unflushed),
+            ).fetchall()
+            unflushed -= {message_id for (message_id,) in flushed}
+
+        total = count + len(unflushed)
+        start = total - self._window_size(total)
+        messages = []
+        if start < count:
+            rows = conn.execute(
+                "SELECT role, content FROM messages"
+                " WHERE session_id = ? AND session_ordinal > ?"
+                " ORDER BY seq DESC LIMIT ?",
+                (session_id, start, count - start),
+            ).fetchall()
+            messages = [{"role": role, "content": content} for role, content in reversed(rows)]
+        messages.extend(
+            {"role": role, "content": content}
+            for message_id, _, role, content, _ in pending
+            if message_id in unflushed
+        )
+        return messages[len(messages) - self._window_size(total) :]
+
+    def _window_size(self, total: int) -> int:
+        """
+        Number of trailing messages to replay for a session of `total`
+        messages. The window start only advances in steps of half the limit,
+        so the replayed prefix stays identical between steps and Ollama can
+        reuse its cached evaluation of it.
+        """
+        if total <= self.history_limit:
+            return total
+        step = max(1, self.history_limit // 2)
+        start = -(-(total - self.history_limit) // step) * step
+        return total - start
+
+    def clear_session(self, session_id: str) -> None:
+        with self._write_lock:
+            with self._pending_lock:
+                self._pending = [p for p in self._pending if p[1] != session_id]
+            with self._connection() as conn:
+                with conn:
+                    conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                    conn.execute(
+                        "DELETE FROM session_counts WHERE session_id = ?", (session_id,)
+                    )
+
+    def flush(self) -> None:
+        with self._write_lock:
+            with self._pending_lock:
+                batch = list(self._pending)
+            if not batch:
+                return
+            added: dict[str, int] = {}
+            for _, session_id, _, _, _ in batch:
+                added[session_id] = added.get(session_id, 0) + 1
+
+            with self._connection() as conn:
+                with conn:
+                    # Number the new messages after the ones already stored,
+                    # in the same transaction that bumps the session's count
+                    ordinals = {}
+                    for session_id, count in added.items():
+                        conn.execute(
+                            "INSERT INTO session_counts (session_id, message_count)"
+                            " VALUES (?, ?) ON CONFLICT (session_id) DO UPDATE"
+                            " SET message_count = message_count + excluded.message_count",
+                            (session_id, count),
+                        )
+                        (total,) = conn.execute(
+                            "SELECT message_count FROM session_counts WHERE session_id = ?",
+                            (session_id,),
+                        ).fetchone()
+                        ordinals[session_id] = total - count
+
+                    rows = []
+                    for message in batch:
+                        ordinals[message[1]] += 1
+                        rows.append((*message, ordinals[message[1]]))
+                    conn.executemany(
+                        "INSERT INTO messages"
+                        " (message_id, session_id, role, content, created_at, session_ordinal)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+            # Only drop what was written; appends made meanwhile stay buffered
+            with self._pending_lock:
+                del self._pending[: len(batch)]
+
+    def close(self) -> None:
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception("Flushing messages to SQLite failed")
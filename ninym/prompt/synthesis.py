@@ -0,0 +1,218 @@
+import asyncio
+import struct
+import threading
+import time
+from concurrent.futures import Executor
+from typing import AsyncIterator
+
+from piper import PiperVoice
+
+from audio_cache import AudioCache, iter_chunks
+from metrics import tts_queue_depth
+
+# RIFF and data chunk sizes are unknown while streaming; 0xFFFFFFFF is the
+# conventional "until end of stream" value that browsers and ffmpeg accept.
+STREAMING_SIZE = 0xFFFFFFFF
+
+
+def streaming_wav_header(sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    byte_rate = sample_rate * channels * sample_width
+    return (
+        b"RIFF"
+        + struct.pack("<I", STREAMING_SIZE)
+        + b"WAVEfmt "
+        + struct.pack(
+            "<IHHIIHH",
+            16,
+            1,  # PCM
+            channels,
+            sample_rate,
+            byte_rate,
+            channels * sample_width,
+            sample_width * 8,
+        )
+        + b"data"
+        + struct.pack("<I", STREAMING_SIZE)
+    )
+
+
+def busy_time(
+    intervals: list[tuple[float, float]],
+    start: float = float("-inf"),
+    end: float = float("inf"),
+) -> float:
+    """
+    Wall-clock time covered by at least one of `intervals`, counting only the
+    part that falls between `start` and `end`. Overlapping jobs on different
+    workers are counted once.
+    """
+    total = 0.0
+    covered_until = start
+    for interval_start, interval_end in sorted(intervals):
+        interval_start = max(interval_start, covered_until)
+        interval_end = min(interval_end, end)
+        if interval_end > interval_start:
+            total += interval_end - interval_start
+            covered_until = interval_end
+    return total
+
+
+class SentenceJob:
+    """
+    One sentence queued for synthesis. PCM chunks are published by the worker
+    thread as Piper emits them, so `chunks` can be consumed before the whole
+    sentence has been synthesized.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tts_time = 0.0
+        # Wall-clock span the worker spent on this sentence
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.cached = False
+        self._audio: asyncio.Queue = asyncio.Queue()
+        self._future: asyncio.Future | None = None
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def from_cache(cls, text: str, audio) -> "SentenceJob":
+        job = cls(text)
+        job.cached = True
+        for chunk in iter_chunks(audio):
+            job._audio.put_nowait(chunk)
+        job._audio.put_nowait(None)
+        job._future = asyncio.get_running_loop().create_future()
+        job._future.set_result(None)
+        return job
+
+    def _run(
+        self,
+        voice: PiperVoice,
+        loop: asyncio.AbstractEventLoop,
+        cache: AudioCache | None = None,
+        cache_key: str | None = None,
+    ) -> None:
+        tts_start = self.started_at = time.time()
+        audio = []
+        try:
+            for audio_chunk in voice.synthesize(self.text):
+                if self._cancelled.is_set():
+                    return
+                audio.append(audio_chunk.audio_int16_bytes)
+                loop.call_soon_threadsafe(
+                    self._audio.put_nowait, audio_chunk.audio_int16_bytes
+                )
+            if cache is not None:
+                cache.put(cache_key, b"".join(audio))
+        finally:
+            self.finished_at = time.time()
+            self.tts_time = self.finished_at - tts_start
+            loop.call_soon_threadsafe(self._audio.put_nowait, None)
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await self._audio.get()
+            if chunk is None:
+                break
+            yield chunk
+        # Surfaces any exception raised by Piper in the worker thread
+        await self._future
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.chunks()])
+
+    def cancel(self) -> None:
+        # Jobs still waiting for a worker never start; a running one stops
+        # at Piper's next chunk
+        self._cancelled.set()
+        if self._future is not None:
+            self._future.cancel()
+
+
+class SentencePipeline:
+    """
+    Overlaps sentence synthesis with LLM token generation.
+
+    The LLM reader hands finished sentences to `submit`, which starts Piper on
+    the shared executor right away and queues the pending job. `results` yields
+    the jobs in submission order while later sentences are still being
+    generated or synthesized. At most `max_pending` sentences may be in
+    flight; beyond that `submit` waits until one has been consumed, which
+    throttles the reader.
+
+    With a `cache`, sentences already synthesized with the same
+    `cache_params` (the voice and its synthesis settings) are served from it
+    without touching Piper, and new ones are added to it once complete.
+    """
+
+    def __init__(
+        self,
+        voice: PiperVoice,
+        executor: Executor,
+        max_pending: int = 4,
+        cache: AudioCache | None = None,
+        cache_params: dict | None = None,
+    ):
+        self.voice = voice
+        self.executor = executor
+        self.cache = cache
+        self.cache_params = cache_params or {}
+        self._slots = asyncio.Semaphore(max_pending)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._active: set[SentenceJob] = set()
+
+    async def submit(self, text: str) -> None:
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(text, **self.cache_params)
+            audio = await asyncio.to_thread(self.cache.get, cache_key)
+            if audio is not None:
+                self._enqueue(SentenceJob.from_cache(text, audio))
+                return
+
+        job = SentenceJob(text)
+        job._future = loop.run_in_executor(
+            self.executor, job._run, self.voice, loop, self.cache, cache_key
+        )
+        self._enqueue(job)
+
+    def _enqueue(self, job: SentenceJob) -> None:
+        self._active.add(job)
+        self._queue.put_nowait(job)
+        tts_queue_depth.inc()
+
+    def close(self) -> None:
+        self._queue.put_nowait(None)
+
+    def cancel(self) -> None:
+        """
+        Drops every queued sentence and stops the ones being synthesized,
+        for when nobody is listening anymore.
+        """
+        for job in self._active:
+            job.cancel()
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if job is not None:
+                self._active.discard(job)
+                self._slots.release()
+                tts_queue_depth.dec()
+        self.close()
+
+    async def results(self) -> AsyncIterator[SentenceJob]:
+        while True:
+            job = await self._queue.get()
+            if job is None:
+                return
+            try:
+                yield job
+                # Make sure the job has finished even if the consumer did not
+                # drain it, so its slot is only handed back once it is idle.
+                await job._future
+            finally:
+                self._active.discard(job)
+                self._slots.release()
+                tts_queue_depth.dec()
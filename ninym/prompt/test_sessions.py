@@ -0,0 +1,25 @@
+import pytest
+
+sessions = pytest.importorskip("sessions")
+
+
+def test_session_keeps_its_instance_across_models():
+    tracker = sessions.SessionTracker(instances=3)
+    first = tracker.get("a").instance
+    tracker.get("b")
+    # A text turn and a voice turn of one session go to the same instance
+    assert tracker.get("a").instance == first
+    assert tracker.get("a") is tracker.get("a")
+
+
+def test_new_sessions_are_spread_round_robin():
+    tracker = sessions.SessionTracker(instances=2)
+    assert [tracker.get(name).instance for name in "abcd"] == [0, 1, 0, 1]
+
+
+def test_forgotten_session_is_pinned_again():
+    tracker = sessions.SessionTracker(instances=2)
+    tracker.get("a")
+    tracker.forget("a")
+    tracker.get("b")
+    assert tracker.get("a").instance == 0
@@ -0,0 +1,111 @@
+import pytest
+
+from text_cleaning import MAX_HELD_BACK, StreamingTextCleaner, clean_text_for_tts
+
+RESPONSE = (
+    "## Setting up\n\n"
+    "The **voice model** runs on the *GPU* and streams `PCM` back.\n"
+    "See [the docs](https://example.com/docs) for __details__ and ~~old~~ notes.\n"
+    "- first item with a_b names\n"
+    "1. Install the package\n"
+    "> Quoted advice 😀\n"
+    "```python\nfor i in range(10):\n    print(i)\n```\n"
+    "---\n"
+    "Rate it 5* stars, 2 * 3 is 6 and **bold with *nested* text** ends here."
+)
+
+
+def stream(text: str, size: int) -> str:
+    cleaner = StreamingTextCleaner()
+    parts = [cleaner.feed(text[i : i + size]) for i in range(0, len(text), size)]
+    parts.append(cleaner.flush())
+    return "".join(parts)
+
+
+# Behaviour that differs from the cleaner this module replaced, which ran one
+# re.sub per construct
+
+
+def test_intraword_underscores_are_kept():
+    # The old `_(.+?)_` pass paired underscores across words: "Use ab and cd"
+    assert clean_text_for_tts("Use a_b and c_d") == "Use a_b and c_d"
+    assert clean_text_for_tts("call snake_case_name()") == "call snake_case_name()"
+
+
+def test_asterisks_between_spaces_are_kept():
+    # The old `\*(.+?)\*` pass read this as emphasis: "2 3 4"
+    assert clean_text_for_tts("2 * 3 * 4") == "2 * 3 * 4"
+
+
+def test_fenced_block_on_its_own_lines_is_dropped():
+    # The inline code pass ran first and ate the fence, so the old cleaner
+    # read the code aloud: "Here: `python print(1) ` Done"
+    assert clean_text_for_tts("Here:\n```python\nprint(1)\n```\nDone") == "Here: Done"
+
+
+def test_triple_backticks_inside_a_sentence_are_a_code_span():
+    # The old cleaner left a stray backtick: "Run `ls -la` now"
+    assert clean_text_for_tts("Run ```ls -la``` now") == "Run ls -la now"
+
+
+def test_code_span_content_is_literal():
+    # The old cleaner stripped markers inside code as well: "kw"
+    assert clean_text_for_tts("type `**kw**` here") == "type **kw** here"
+
+
+# Behaviour kept from the old cleaner
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("5* stars", "5* stars"),
+        ("*unclosed", "*unclosed"),
+        ("**bold** and *it*", "bold and it"),
+        ("__init__ method", "init method"),
+        ("~~old~~ new", "old new"),
+        ("[docs](http://x) ok", "docs ok"),
+        ("# Title\n- item\n2. step\n> quote", "Title item step quote"),
+        ("a\n***\nb", "a b"),
+        ("Nice 😀🚀 work", "Nice work"),
+    ],
+)
+def test_clean_text_for_tts(text, expected):
+    assert clean_text_for_tts(text) == expected
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(RESPONSE)])
+def test_streaming_matches_batch(size):
+    assert " ".join(stream(RESPONSE, size).split()) == clean_text_for_tts(RESPONSE)
+
+
+def test_streaming_keeps_line_breaks():
+    assert stream("- one\n- two\n\n\nthree", 2) == "one\ntwo\nthree"
+
+
+def test_streaming_holds_unclosed_bold():
+    cleaner = StreamingTextCleaner()
+    assert cleaner.feed("Say **hel") == "Say"
+    assert cleaner.feed("lo** now ") == " hello now"
+    assert cleaner.flush() == ""
+
+
+def test_streaming_holds_open_code_span():
+    cleaner = StreamingTextCleaner()
+    assert cleaner.feed("Run `ls") == "Run"
+    assert cleaner.feed(" -la` now.") == " ls -la now."
+
+
+def test_streaming_drops_fence_split_across_chunks():
+    cleaner = StreamingTextCleaner()
+    out = cleaner.feed("Code:\n``")
+    out += cleaner.feed("`py\nx = 1\n`")
+    out += cleaner.feed("``\nDone.")
+    out += cleaner.flush()
+    assert out == "Code:\nDone."
+
+
+def test_streaming_releases_emphasis_left_open():
+    cleaner = StreamingTextCleaner()
+    out = cleaner.feed("a *b " + "word " * MAX_HELD_BACK)
+    assert out.startswith("a *b word")
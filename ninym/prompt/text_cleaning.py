@@ -0,0 +1,235 @@
+import re
+import unicodedata
+
+EMOJI_CLASS = (
+    "["
+    "\U0001f600-\U0001f64f"  # emoticons
+    "\U0001f300-\U0001f5ff"  # symbols & pictographs
+    "\U0001f680-\U0001f6ff"  # transport & map symbols
+    "\U0001f1e0-\U0001f1ff"  # flags
+    "\U00002702-\U000027b0"  # dingbats
+    "\U000024c2-\U0001f251"  # enclosed characters
+    "\U0001f926-\U0001f937"  # additional emoticons
+    "\U00010000-\U0010ffff"  # additional unicode
+    "\u2640-\u2642"  # gender symbols
+    "\u2600-\u2b55"  # misc symbols
+    "\u200d"  # zero width joiner
+    "\u23cf"  # eject symbol
+    "\u23e9"  # fast forward
+    "\u231a"  # watch
+    "\ufe0f"  # dingbats
+    "\u3030"  # wavy dash
+    "]+"
+)
+
+EMOJI_PATTERN = re.compile(EMOJI_CLASS)
+
+# Every markdown construct we strip, as one alternation so the text is walked
+# once. Order matters: fences before rules before line prefixes, and `**`
+# before `*`. Every alternative starts with a literal character so the regex
+# engine can skip straight to candidates; line-start constructs match the
+# "\n" before them, which is why the text gets one prepended. Emojis are a
+# character class and would break that, so EMOJI_PATTERN runs first.
+#
+# A fence only opens at the start of a line; ``` inside a sentence is an
+# inline code span. Emphasis, strikethrough and code spans are only stripped
+# when they open and close on the same line, and an opener must be followed
+# by a non-space, so "5* stars" or "2 * 3" keep their asterisks. An
+# underscore inside a word never counts, so "snake_case" is left alone.
+MARKDOWN_PATTERN = re.compile(
+    r"\n(?P<fence>[ \t]*```[\s\S]*?(?:```|\Z))"
+    r"|\n(?P<rule>[ \t]*[-*_]{3,}[ \t]*(?=\n|\Z))"
+    r"|\n(?P<prefix>[ \t]*(?:(?:\#{1,6}|[-*+>]|\d+\.)[ \t]+)+)"
+    r"|\[(?P<link>[^\]\n]+)\]\([^)\n]+\)"
+    r"|(?P<ticks>`+)(?P<code>[^\n]*?[^`\n])(?P=ticks)(?!`)"
+    r"|(?P<mark>\*\*|~~|\*)(?=\S)(?P<emphasis>[^\n]*?\S)(?P=mark)"
+    r"|_(?<!\w_)(?P<under>_?)(?=\S)(?P<underlined>[^\n]*?\S)_(?P=under)(?!\w)"
+)
+
+# Characters that can start an inline construct
+_MARKUP_CHARS = re.compile(r"[*_~`\[]")
+
+# Positions on an unfinished line where a construct may still open once
+# more text arrives
+_OPENER = re.compile(r"[*~](?!\s)|_(?<!\w_)(?!\s)|[`\[]")
+
+# The start of a line that may still turn into a heading, list or quote
+# prefix, a horizontal rule or a code fence
+_LINE_START = re.compile(r"\n[ \t]*(?:(?:\#{1,6}|[-*+>]|\d+\.)[ \t]+)*(?:\#*|\d*\.?|[+>]|[-*_]*[ \t]*)")
+
+_FENCE_OPEN = re.compile(r"\n[ \t]*```")
+
+_WHITESPACE = re.compile(r"(\s+)")
+
+# Upper bound on held-back text so a stray "[" cannot stall the stream
+MAX_HELD_BACK = 256
+
+
+def _replace(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind == "link":
+        return _strip_inline(match.group("link"))
+    if kind in ("emphasis", "underlined"):
+        return _strip_inline(match.group(kind))
+    if kind == "code":
+        return match.group("code")
+    # Fences, rules and line prefixes replace the line break they start with
+    return "\n"
+
+
+def _strip_inline(text: str) -> str:
+    if _MARKUP_CHARS.search(text) is None:
+        return text
+    return MARKDOWN_PATTERN.sub(_replace, text)
+
+
+def _normalize(text: str) -> str:
+    # ASCII is already NFKC and has no emojis, and most tokens are ASCII
+    if text.isascii():
+        return text
+    return EMOJI_PATTERN.sub("", unicodedata.normalize("NFKC", text))
+
+
+def clean_text_for_tts(text: str) -> str:
+    # Whitespace runs are collapsed by str.split, which is far cheaper than
+    # routing every space through the replacement callback
+    return " ".join(MARKDOWN_PATTERN.sub(_replace, "\n" + _normalize(text)).split())
+
+
+class StreamingTextCleaner:
+    """
+    Incremental counterpart of `clean_text_for_tts` for token streams.
+
+    `feed` returns whatever cleaned text is final so far and `flush` returns
+    the rest. Joined, the output has the same words as `clean_text_for_tts`
+    on the whole text, but line breaks are kept as single newlines, so a
+    SentenceSegmenter downstream can still split on them.
+
+    Content inside an open code fence is dropped until the fence closes. On
+    the line still being written, text from the first `**`, `*`, `~~`, `_`,
+    backtick or `[` that has not closed yet is held back, as is a line start
+    that may still become a heading, list item or rule. A marker or `[` left
+    open for more than MAX_HELD_BACK characters is kept as a literal
+    character, where the whole text would have paired it with a later one.
+    """
+
+    def __init__(self):
+        self._pending = "\n"
+        self._in_fence = False
+        self._started = False
+        self._separator = ""
+
+    def feed(self, chunk: str) -> str:
+        self._pending += _normalize(chunk)
+        return self._drain(final=False)
+
+    def flush(self) -> str:
+        cleaned = self._drain(final=True)
+        self._pending = "\n"
+        self._in_fence = False
+        return cleaned
+
+    def _drain(self, final: bool) -> str:
+        out = []
+        while self._pending:
+            if self._in_fence:
+                end = self._pending.find("```")
+                if end == -1:
+                    # Keep a possible partial closing fence
+                    self._pending = "" if final else self._pending[-2:]
+                    break
+                self._pending = self._pending[end + 3 :]
+                self._in_fence = False
+                self._separator = "\n"
+                continue
+
+            fence = _FENCE_OPEN.search(self._pending)
+            if fence is not None:
+                out.append(self._clean(self._pending[: fence.start()]))
+                self._pending = self._pending[fence.end() :]
+                self._in_fence = True
+                continue
+
+            if final:
+                out.append(self._clean(self._pending))
+                self._pending = ""
+                break
+
+            cut = self._settled(self._pending)
+            while len(self._pending) - cut > MAX_HELD_BACK:
+                # Whatever was left open this long is taken literally, and
+                # the text after it is looked at afresh
+                out.append(self._clean(self._pending[: cut + 1]))
+                self._pending = self._pending[cut + 1 :]
+                cut = self._settled(self._pending)
+            if cut > 0:
+                out.append(self._clean(self._pending[:cut]))
+                self._pending = self._pending[cut:]
+            break
+
+        return "".join(out)
+
+    @staticmethod
+    def _settled(text: str) -> int:
+        """
+        Returns how much of `text` cleans the same whatever follows it.
+        """
+        # Lines before the last are complete, and no inline construct spans
+        # a line break
+        start = text.rfind("\n")
+        pos = max(start, 0)
+        cut = len(text)
+        for match in MARKDOWN_PATTERN.finditer(text, pos):
+            opener = _OPENER.search(text, pos)
+            if opener is not None and opener.start() < match.start():
+                cut = opener.start()
+                break
+            if match.end() == len(text) or _may_grow(match):
+                cut = match.start()
+                break
+            pos = match.end()
+        else:
+            opener = _OPENER.search(text, pos)
+            if opener is not None:
+                cut = opener.start()
+            else:
+                # The next chunk may continue the last word, for instance
+                # with an "_" that only counts given what comes before it
+                while cut > pos and (text[cut - 1].isalnum() or text[cut - 1] == "_"):
+                    cut -= 1
+
+        if start != -1 and _LINE_START.fullmatch(text, start, cut):
+            return start
+        return cut
+
+    def _clean(self, text: str) -> str:
+        out = []
+        for i, part in enumerate(_WHITESPACE.split(MARKDOWN_PATTERN.sub(_replace, text))):
+            if i % 2:
+                # Whitespace is collapsed across chunk boundaries: a separator
+                # is only emitted once more text follows it
+                self._separator = "\n" if "\n" in part or self._separator == "\n" else " "
+            elif part:
+                if self._started and self._separator:
+                    out.append(self._separator)
+                out.append(part)
+                self._separator = ""
+                self._started = True
+        return "".join(out)
+
+
+def _may_grow(match: re.Match) -> bool:
+    """
+    Whether a longer marker at the same place may still match once its
+    closer arrives, so `*` may turn out to have been `**`.
+    """
+    start = match.start()
+    text = match.string
+    if match.lastgroup == "emphasis":
+        return match.group("mark") == "*" and text.startswith("**", start)
+    if match.lastgroup == "underlined":
+        return not match.group("under") and text.startswith("__", start)
+    if match.lastgroup == "code":
+        ticks = len(match.group("ticks"))
+        return text.startswith("`" * (ticks + 1), start)
+    return False
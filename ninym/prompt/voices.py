@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from piper import PiperVoice
+
+logger = logging.getLogger("ninym.voices")
+
+DEFAULT_VOICE = "hfc_female"
+
+VOICES: dict[str, str] = {
+    "hfc_female": "./en_US-hfc_female-medium.onnx",
+    "alexa": "./otherModels/alexa.onnx",
+    "cortana": "./otherModels/cortana.onnx",
+    "glados": "./otherModels/glados.onnx",
+    "google_assistant": "./otherModels/google_assistant.onnx",
+    "zarvox": "./otherModels/zarvox.onnx",
+    "jarvis": "./otherModels/jarvis-high.onnx",
+}
+
+# ONNX Runtime keeps the weights plus its own arena allocations resident, so a
+# warm session costs noticeably more than the model file on disk.
+SESSION_MEMORY_FACTOR = 1.5
+
+
+class UnknownVoiceError(KeyError):
+    pass
+
+
+class VoiceRegistry:
+    """
+    Process-wide cache of loaded Piper voices.
+
+    Each voice is loaded once, on first use or through `preload`, and its ONNX
+    session is kept warm until the estimated memory of all loaded voices
+    exceeds `memory_budget_bytes`. Least recently used voices are evicted first;
+    the voice being requested is never evicted by its own load.
+    """
+
+    def __init__(
+        self,
+        voices: dict[str, str],
+        default_voice: str = DEFAULT_VOICE,
+        memory_budget_bytes: int | None = None,
+    ):
+        self._paths = dict(voices)
+        self.default_voice = default_voice
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loaded: OrderedDict[str, tuple[PiperVoice, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    @property
+    def voice_ids(self) -> list[str]:
+        return list(self._paths)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(size for _, size in self._loaded.values())
+
+    def get(self, voice_id: str | None = None) -> PiperVoice:
+        voice_id = voice_id or self.default_voice
+        if voice_id not in self._paths:
+            raise UnknownVoiceError(voice_id)
+
+        with self._lock:
+            entry = self._loaded.get(voice_id)
+            if entry is not None:
+                self._loaded.move_to_end(voice_id)
+                return entry[0]
+            load_lock = self._load_locks.setdefault(voice_id, threading.Lock())
+
+        # Only requests for this voice wait on its load; warm voices are
+        # still served from the registry meanwhile
+        with load_lock:
+            with self._lock:
+                entry = self._loaded.get(voice_id)
+                if entry is not None:
+                    self._loaded.move_to_end(voice_id)
+                    return entry[0]
+
+            path = self._paths[voice_id]
+            logger.info("Loading PiperVoice model '%s' from %s", voice_id, path)
+            voice = PiperVoice.load(path)
+            size = int(os.path.getsize(path) * SESSION_MEMORY_FACTOR)
+
+            with self._lock:
+                self._loaded[voice_id] = (voice, size)
+                self.loads += 1
+                self._evict(keep=voice_id)
+            logger.info(
+                "Model '%s' loaded. Sample rate: %d Hz", voice_id, voice.config.sample_rate
+            )
+            return voice
+
+    def preload(self, voice_ids: list[str] | None = None) -> None:
+        for voice_id in voice_ids or [self.default_voice]:
+            self.get(voice_id)
+
+    def unload(self, voice_id: str) -> None:
+        with self._lock:
+            self._loaded.pop(voice_id, None)
+
+    def _evict(self, keep: str) -> None:
+        if self.memory_budget_bytes is None:
+            return
+
+        while self.memory_bytes > self.memory_budget_bytes and len(self._loaded) > 1:
+            voice_id = next(iter(self._loaded))
+            if voice_id == keep:
+                self._loaded.move_to_end(voice_id)
+                continue
+            self._loaded.pop(voice_id)
+            self.evictions += 1
+            logger.info("Evicted PiperVoice model '%s'", voice_id)